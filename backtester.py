@@ -4,15 +4,19 @@
 import pandas as pd
 import numpy as np
 
+import instrumentation
+from hedge_engine import hedge_state_path, hedge_state_matrix, hedged_equity_matrix
+
 class EventDrivenBacktester:
     """
     Esegue un backtest basato su un ciclo (event-driven) che permette
     l'implementazione di logiche complesse come lo stop loss, 
     rispecchiando esattamente la logica del Bot e della Dashboard Live.
     """
+    @instrumentation.instrumented('backtest.run')
     def run_backtest(self, data: pd.DataFrame, strategy_signal: pd.Series, 
                      initial_capital: float, hedge_ratio: float, 
-                     stop_loss_perc: float) -> dict:
+                     stop_loss_perc: float, engine: str = 'fast') -> dict:
         """
         Esegue il backtest.
         
@@ -20,7 +24,50 @@ class EventDrivenBacktester:
         - I segnali vengono calcolati sul Close della candela 'i'.
         - Se Signal[i] == -1 (Short), si assume entrata al Close[i].
         - Pertanto, la posizione per il giorno 'i+1' sarà Hedged.
+
+        Motori disponibili ('engine'):
+        - 'fast': macchina a stati su array NumPy (compilata con Numba se installato).
+        - 'loop': ciclo pandas di riferimento, barra per barra.
+        Entrambi producono posizioni e curve di equity identiche.
+        """
+        positions = self.compute_positions(data, strategy_signal, stop_loss_perc, engine=engine)
+        return self.compute_equity(data, strategy_signal, positions, initial_capital, hedge_ratio)
+
+    @instrumentation.instrumented('backtest.positions')
+    def compute_positions(self, data: pd.DataFrame, strategy_signal: pd.Series,
+                          stop_loss_perc: float, engine: str = 'fast') -> pd.Series:
+        """
+        Prima fase del backtest: la serie delle posizioni (1 = Long, 0 = Hedged).
+        Dipende solo da prezzi, segnale e Stop Loss, non da capitale e hedge ratio.
+        """
+        # Usiamo adj_close per coerenza con i ritorni e il grafico
+        price_col = 'adj_close' 
+
+        if engine == 'fast':
+            return self._positions_fast(data[price_col], strategy_signal, stop_loss_perc)
+        if engine == 'loop':
+            return self._positions_loop(data, strategy_signal, stop_loss_perc, price_col)
+        raise ValueError(f"Motore di backtest sconosciuto: {engine}")
+
+    @staticmethod
+    def _positions_fast(prices: pd.Series, strategy_signal: pd.Series, stop_loss_perc: float) -> pd.Series:
         """
+        Versione su array della macchina a stati di '_positions_loop'.
+        La decisione presa sulla barra i-1 determina la posizione della barra i.
+        """
+        close = prices.to_numpy(dtype=np.float64)
+        signal = strategy_signal.to_numpy()
+
+        hedged = hedge_state_path(close[:-1], signal[:-1] == -1, signal[:-1] == 0, stop_loss_perc)
+
+        positions = np.ones(len(close), dtype=np.float64)
+        positions[1:][hedged] = 0.0
+        return pd.Series(positions, index=prices.index)
+
+    @staticmethod
+    def _positions_loop(data: pd.DataFrame, strategy_signal: pd.Series,
+                        stop_loss_perc: float, price_col: str) -> pd.Series:
+        """Ciclo di riferimento barra per barra (lento, usato per le verifiche di coerenza)."""
         # Array posizioni: 1 = Long (Non Hedged), 0 = Hedged (Flat/Short coperto)
         # Iniziamo tutti Long (1)
         positions = pd.Series(1.0, index=data.index)
@@ -28,9 +75,6 @@ class EventDrivenBacktester:
         # Stato del backtest
         is_hedged = False
         entry_price = 0.0
-        
-        # Usiamo adj_close per coerenza con i ritorni e il grafico
-        price_col = 'adj_close' 
 
         # Ciclo principale
         # Partiamo da 1 perché guardiamo indietro a i-1
@@ -66,9 +110,23 @@ class EventDrivenBacktester:
             else:
                 positions.iloc[i] = 1.0 # Long Only
 
+        return positions
+
+    @staticmethod
+    @instrumentation.instrumented('backtest.equity')
+    def compute_equity(data: pd.DataFrame, strategy_signal: pd.Series, positions: pd.Series,
+                       initial_capital: float, hedge_ratio: float) -> dict:
+        """
+        Seconda fase del backtest: rendimenti e curve di equity a partire dalle posizioni.
+        Restituisce lo stesso dizionario di 'run_backtest'.
+        """
         # --- Calcolo Finanziario Vettorizzato ---
         # returns[i] è il rendimento da (i-1) a (i).
-        returns = data['adj_close'].pct_change().fillna(0)
+        # I prezzi compatti (float32, dati intraday) vengono promossi: l'equity si accumula in float64
+        prices = data['adj_close']
+        if prices.dtype != np.float64:
+            prices = prices.astype(np.float64)
+        returns = prices.pct_change().fillna(0)
 
         # La posizione che influenza il returns[i] è quella decisa a [i-1]?
         # No, nel loop sopra 'positions[i]' rappresenta lo stato del portafoglio DURANTE il giorno i.
@@ -106,6 +164,234 @@ class EventDrivenBacktester:
             'long_only': long_only_equity.dropna(),
             'hedged': hedged_equity.dropna(),
             'hedge_only_returns': hedge_only_returns.dropna(),
-            'signal': strategy_signal
+            'signal': strategy_signal,
+            'positions': positions
         }
         return results
+
+    @instrumentation.instrumented('backtest.stop_loss_sweep')
+    def run_stop_loss_sweep(self, data: pd.DataFrame, strategy_signals, initial_capital: float,
+                            hedge_ratio: float, stop_loss_levels, engine: str = 'auto') -> dict:
+        """
+        Backtest di molti livelli di Stop Loss (ed eventualmente molti segnali) in
+        un solo passaggio sui prezzi: posizioni con 'compute_positions_batch',
+        curve di equity con 'compute_equity_batch'. Le matrici risultanti possono
+        essere valutate direttamente con PerformanceAnalyzer.batch_kpis.
+
+        Returns:
+            dict: Come 'compute_equity_batch', più 'signal'.
+        """
+        positions = self.compute_positions_batch(data, strategy_signals, stop_loss_levels, engine=engine)
+        results = self.compute_equity_batch(data, positions, initial_capital, hedge_ratio, engine=engine)
+        results['signal'] = strategy_signals
+        return results
+
+    @staticmethod
+    @instrumentation.instrumented('backtest.positions_batch')
+    def compute_positions_batch(data: pd.DataFrame, strategy_signals, stop_loss_levels,
+                                engine: str = 'auto') -> pd.DataFrame:
+        """
+        Versione batch di 'compute_positions': una macchina a stati per ogni
+        combinazione di segnale e livello di Stop Loss, fatte avanzare insieme
+        da 'hedge_state_matrix' su una matrice (barre x varianti). Ogni colonna
+        coincide con 'compute_positions' per lo stesso segnale e Stop Loss.
+
+        Args:
+            data (pd.DataFrame): Dati con 'adj_close'.
+            strategy_signals (pd.Series | pd.DataFrame): Un segnale, oppure più segnali (uno per colonna).
+            stop_loss_levels (array-like): Livelli di Stop Loss (es. 0.05 per il 5%).
+            engine (str): Motore di 'hedge_state_matrix' ('numba', 'numpy' o 'auto').
+
+        Returns:
+            pd.DataFrame: Posizioni (1 = Long, 0 = Hedged). Le colonne sono i livelli di
+                          Stop Loss ('stop_loss_perc') con un solo segnale, altrimenti le
+                          coppie (segnale, stop_loss_perc).
+        """
+        levels = np.atleast_1d(np.asarray(stop_loss_levels, dtype=np.float64))
+        if isinstance(strategy_signals, pd.DataFrame):
+            signals = strategy_signals.to_numpy()
+            columns = pd.MultiIndex.from_product([strategy_signals.columns, levels],
+                                                 names=[strategy_signals.columns.name or 'signal', 'stop_loss_perc'])
+        else:
+            signals = strategy_signals.to_numpy()[:, None]
+            columns = pd.Index(levels, name='stop_loss_perc')
+        instrumentation.annotate(rows=len(data), variants=len(columns))
+
+        # Colonna j = segnale j // len(levels) con Stop Loss levels[j % len(levels)];
+        # i prezzi restano un vettore condiviso da tutte le colonne
+        close = data['adj_close'].to_numpy(dtype=np.float64)
+        enter = np.repeat(signals[:-1] == -1, len(levels), axis=1)
+        leave = np.repeat(signals[:-1] == 0, len(levels), axis=1)
+        hedged = hedge_state_matrix(close[:-1], enter, leave, np.tile(levels, signals.shape[1]), engine=engine)
+
+        # Stessa convenzione di '_positions_fast': la decisione alla barra i-1 vale per la barra i
+        positions = np.ones((len(close), len(columns)), dtype=np.float64)
+        positions[1:][hedged] = 0.0
+        return pd.DataFrame(positions, index=data.index, columns=columns, copy=False)
+
+    @staticmethod
+    @instrumentation.instrumented('backtest.equity_batch')
+    def compute_equity_batch(data: pd.DataFrame, positions: pd.DataFrame, initial_capital: float,
+                             hedge_ratio, engine: str = 'auto') -> dict:
+        """
+        Versione di 'compute_equity' per una matrice di posizioni (barre x varianti),
+        con le stesse operazioni colonna per colonna ('engine' come in 'hedged_equity_matrix').
+        'hedge_ratio' è unico oppure uno per colonna.
+
+        Returns:
+            dict: 'hedged', 'hedge_only_returns' e 'positions' (DataFrame con le colonne
+                  di 'positions') e 'long_only' (Series, comune a tutte le varianti).
+        """
+        prices = data['adj_close']
+        if prices.dtype != np.float64:
+            prices = prices.astype(np.float64)
+        returns = prices.pct_change().fillna(0)
+        r = returns.to_numpy()[:, None]
+        pos = positions.to_numpy(dtype=np.float64)
+
+        # Esposizione (1 - h) + h * posizione e capitalizzazione, come in 'compute_equity'
+        hedged_equity = hedged_equity_matrix(returns.to_numpy(), pos, hedge_ratio, initial_capital, engine=engine)
+        frame = lambda values: pd.DataFrame(values, index=positions.index, columns=positions.columns, copy=False)
+        return {
+            'long_only': ((1 + returns).cumprod() * initial_capital).dropna(),
+            'hedged': frame(hedged_equity),
+            'hedge_only_returns': frame(r * ((1 - pos) * -1)),
+            'positions': positions
+        }
+
+    @instrumentation.instrumented('backtest.hedge_frontier')
+    def run_hedge_frontier(self, data: pd.DataFrame, strategy_signal: pd.Series, initial_capital: float,
+                           hedge_ratios, stop_loss_perc: float, engine: str = 'fast') -> dict:
+        """
+        Backtest per un intero vettore di hedge ratio: le posizioni vengono calcolate
+        una sola volta (non dipendono dall'hedge ratio) e le curve di equity di tutti
+        i rapporti in un'unica operazione vettoriale con 'compute_equity_frontier'.
+
+        Returns:
+            dict: Come 'compute_equity_frontier', più 'signal'.
+        """
+        positions = self.compute_positions(data, strategy_signal, stop_loss_perc, engine=engine)
+        frontier = self.compute_equity_frontier(data, positions, initial_capital, hedge_ratios)
+        frontier['signal'] = strategy_signal
+        return frontier
+
+    @staticmethod
+    @instrumentation.instrumented('backtest.equity_frontier')
+    def compute_equity_frontier(data: pd.DataFrame, positions: pd.Series, initial_capital: float,
+                                hedge_ratios, engine: str = 'auto') -> dict:
+        """
+        Versione di 'compute_equity' per molti hedge ratio insieme, su una matrice
+        (barre x rapporti). Ogni colonna coincide con la curva 'hedged' di
+        'compute_equity' per lo stesso rapporto.
+
+        Args:
+            data (pd.DataFrame): Dati con 'adj_close'.
+            positions (pd.Series): Posizioni di 'compute_positions'.
+            initial_capital (float): Capitale iniziale.
+            hedge_ratios (array-like): Rapporti di copertura da valutare.
+            engine (str): Motore di 'hedged_equity_matrix' ('numba', 'numpy' o 'auto').
+
+        Returns:
+            dict: 'hedged' (DataFrame, una colonna per hedge ratio), 'long_only',
+                  'hedge_only_returns' e 'positions' (Series, comuni a tutti i rapporti).
+        """
+        prices = data['adj_close']
+        if prices.dtype != np.float64:
+            prices = prices.astype(np.float64)
+        returns = prices.pct_change().fillna(0)
+        ratios = np.asarray(hedge_ratios, dtype=np.float64)
+        instrumentation.annotate(rows=len(returns), ratios=len(ratios))
+
+        # Stesse operazioni di 'compute_equity', per tutti i rapporti su un'unica matrice
+        matrix = hedged_equity_matrix(returns.to_numpy(), positions.to_numpy(), ratios, initial_capital,
+                                      engine=engine)
+        # Rendimenti senza NaN (fillna): la matrice non ha righe da scartare e non viene copiata
+        hedged = pd.DataFrame(matrix, index=returns.index, columns=pd.Index(ratios, name='hedge_ratio'), copy=False)
+        return {
+            'long_only': ((1 + returns).cumprod() * initial_capital).dropna(),
+            'hedged': hedged,
+            'hedge_only_returns': (returns * ((1 - positions) * -1)).dropna(),
+            'positions': positions
+        }
+
+    @instrumentation.instrumented('backtest.basket')
+    def run_basket_backtest(self, data: dict[str, pd.DataFrame], signals: dict[str, pd.Series],
+                            initial_capital: float, hedge_ratio=1.0, stop_loss_perc=0.05,
+                            weights: dict[str, float] | None = None, rebalance: bool = False) -> dict:
+        """
+        Backtest di un paniere: la stessa logica di 'run_backtest' applicata a ogni
+        gamba, con tutte le gambe elaborate insieme su una matrice (tempo x asset).
+
+        Le serie vengono allineate sull'unione dei calendari: i prezzi mancanti sono
+        riportati in avanti (rendimento nullo) e i segnali mantengono l'ultimo valore.
+        Prima della sua prima barra una gamba resta liquida e non viene coperta.
+
+        Args:
+            data (dict): Ticker -> DataFrame OHLCV (almeno 'adj_close').
+            signals (dict): Ticker -> segnale della strategia (-1 copertura, 0 nessuna copertura).
+            initial_capital (float): Capitale iniziale complessivo del paniere.
+            hedge_ratio (float | dict): Quota coperta, unica oppure per ticker.
+            stop_loss_perc (float | dict): Stop Loss, unico oppure per ticker.
+            weights (dict, optional): Pesi delle gambe (default: pesi uguali), normalizzati a 1.
+            rebalance (bool): Se True il paniere viene ribilanciato ai pesi a ogni barra;
+                altrimenti ogni gamba evolve con il proprio capitale iniziale.
+
+        Returns:
+            dict: 'portfolio' e 'portfolio_long_only' (Series), 'leg_hedged' e 'leg_long_only'
+                  (equity per gamba), 'positions', 'hedge_only_returns', 'signal', 'listed'
+                  (DataFrame tempo x ticker) e 'weights' (Series).
+        """
+        tickers = list(data)
+        per_ticker = lambda value: np.array([value[t] if isinstance(value, dict) else value for t in tickers],
+                                            dtype=np.float64)
+        w = per_ticker(weights) if weights is not None else np.ones(len(tickers))
+        w = w / w.sum()
+        h = per_ticker(hedge_ratio)
+        sl = per_ticker(stop_loss_perc)
+
+        # Calendario comune: unione delle date di tutte le gambe
+        prices = pd.concat({t: data[t]['adj_close'] for t in tickers}, axis=1).sort_index()
+        listed = prices.notna().cummax().to_numpy()
+        prices = prices.ffill()
+        signal = pd.concat({t: signals[t] for t in tickers}, axis=1).reindex(prices.index).ffill().fillna(0)
+
+        close = prices.to_numpy(dtype=np.float64)
+        sig = signal.to_numpy()
+        # Stessa convenzione di '_positions_fast': la decisione alla barra i-1 vale per la barra i
+        hedged = hedge_state_matrix(close[:-1], sig[:-1] == -1, sig[:-1] == 0, sl)
+        positions = np.ones_like(close)
+        positions[1:][hedged] = 0.0
+
+        returns = np.zeros_like(close)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            returns[1:] = close[1:] / close[:-1] - 1
+        returns[~listed | np.isnan(returns)] = 0.0
+        exposure = (1 - h) + h * positions
+        hedged_returns = returns * exposure
+
+        if rebalance:
+            # Pesi fissi ribilanciati, ridistribuiti tra le sole gambe già quotate
+            active = np.where(listed, w, 0.0)
+            active_weights = active / np.maximum(active.sum(axis=1, keepdims=True), 1e-12)
+            portfolio = np.cumprod(1 + (hedged_returns * active_weights).sum(axis=1)) * initial_capital
+            portfolio_bh = np.cumprod(1 + (returns * active_weights).sum(axis=1)) * initial_capital
+            leg_hedged = np.cumprod(1 + hedged_returns, axis=0) * (w * initial_capital)
+            leg_bh = np.cumprod(1 + returns, axis=0) * (w * initial_capital)
+        else:
+            leg_hedged = np.cumprod(1 + hedged_returns, axis=0) * (w * initial_capital)
+            leg_bh = np.cumprod(1 + returns, axis=0) * (w * initial_capital)
+            portfolio = leg_hedged.sum(axis=1)
+            portfolio_bh = leg_bh.sum(axis=1)
+
+        frame = lambda values: pd.DataFrame(values, index=prices.index, columns=tickers)
+        return {
+            'portfolio': pd.Series(portfolio, index=prices.index),
+            'portfolio_long_only': pd.Series(portfolio_bh, index=prices.index),
+            'leg_hedged': frame(leg_hedged),
+            'leg_long_only': frame(leg_bh),
+            'positions': frame(positions),
+            'hedge_only_returns': frame(returns * -(1 - positions)),
+            'signal': signal,
+            'listed': frame(listed),
+            'weights': pd.Series(w, index=tickers)
+        }
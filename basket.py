@@ -0,0 +1,110 @@
+# File: basket.py
+# Modulo per il progetto KriterionQuant Hedging App
+#
+# Copertura di un paniere di crypto: indicatori e segnale SMA/ADX per ogni
+# gamba con parametri propri, backtest congiunto e KPI per gamba e di portafoglio.
+
+import argparse
+import configparser
+import json
+
+import numpy as np
+import pandas as pd
+
+from feature_cache import CachedIndicatorCalculator
+from backtester import EventDrivenBacktester
+from performance_analyzer import PerformanceAnalyzer
+
+# Parametri di default di ogni gamba (gli stessi della strategia in produzione su BTC)
+DEFAULT_LEG_PARAMS = {
+    'fast_ma': 25, 'slow_ma': 40, 'adx_period': 14, 'adx_threshold': 15,
+    'stop_loss_perc': 0.05, 'hedge_ratio': 1.0, 'weight': 1.0
+}
+
+DEFAULT_BASKET = ['BTC-USD.CC', 'ETH-USD.CC']
+
+
+def leg_signal(df: pd.DataFrame, params: dict) -> pd.Series:
+    """Segnale SMA/ADX di una gamba (-1 copertura, 0 nessuna copertura), NaN nel warm-up."""
+    calc = CachedIndicatorCalculator()
+    df = df.copy()
+    df = calc.add_moving_average(df, period=params['fast_ma'])
+    df = calc.add_moving_average(df, period=params['slow_ma'])
+    df = calc.add_adx(df, period=params['adx_period'])
+    fast, slow, adx = df[f"sma_{params['fast_ma']}"], df[f"sma_{params['slow_ma']}"], df[f"ADX_{params['adx_period']}"]
+    signal = pd.Series(np.where((fast < slow) & (adx > params['adx_threshold']), -1, 0), index=df.index, dtype=float)
+    # Nel warm-up non c'è segnale: come nel backtest singolo quelle barre non vengono coperte
+    signal[fast.isna() | slow.isna() | adx.isna()] = np.nan
+    return signal
+
+
+def run_basket(data: dict[str, pd.DataFrame], leg_params: dict[str, dict] | None = None,
+               initial_capital: float = 50000, rebalance: bool = False) -> dict:
+    """
+    Esegue il backtest del paniere con parametri per gamba.
+
+    Args:
+        data (dict): Ticker -> DataFrame OHLCV.
+        leg_params (dict, optional): Ticker -> parametri della gamba; le chiavi mancanti
+            prendono i valori di DEFAULT_LEG_PARAMS.
+        initial_capital (float): Capitale complessivo del paniere.
+        rebalance (bool): Ribilanciamento giornaliero ai pesi (vedi run_basket_backtest).
+
+    Returns:
+        dict: Risultati di run_basket_backtest più 'kpis' (per gamba e di portafoglio).
+    """
+    leg_params = leg_params or {}
+    params = {t: {**DEFAULT_LEG_PARAMS, **leg_params.get(t, {})} for t in data}
+    signals = {t: leg_signal(df, params[t]) for t, df in data.items()}
+    # Le barre di warm-up escono dal calendario della gamba, come il dropna del backtest singolo
+    valid = {t: signals[t].notna() for t in data}
+    data = {t: df[valid[t]] for t, df in data.items()}
+    signals = {t: signals[t][valid[t]] for t in signals}
+
+    results = EventDrivenBacktester().run_basket_backtest(
+        data, signals, initial_capital,
+        hedge_ratio={t: p['hedge_ratio'] for t, p in params.items()},
+        stop_loss_perc={t: p['stop_loss_perc'] for t, p in params.items()},
+        weights={t: p['weight'] for t, p in params.items()},
+        rebalance=rebalance
+    )
+    results['kpis'] = PerformanceAnalyzer.basket_kpis(results)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest di copertura su un paniere di crypto.")
+    parser.add_argument('--tickers', default=','.join(DEFAULT_BASKET), help="Ticker separati da virgola")
+    parser.add_argument('--start', default='2018-01-01', help="Data di inizio (YYYY-MM-DD)")
+    parser.add_argument('--capital', type=float, default=50000)
+    parser.add_argument('--params', default=None,
+                        help="File JSON con i parametri per ticker (es. {\"ETH-USD.CC\": {\"fast_ma\": 20}})")
+    parser.add_argument('--rebalance', action='store_true', help="Ribilanciamento giornaliero ai pesi")
+    args = parser.parse_args()
+
+    from data_handler import EODHDClient
+
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    api_key = config.get('EODHD', 'api_key')
+
+    tickers = [t.strip() for t in args.tickers.split(',') if t.strip()]
+    frames = EODHDClient(cache_dir='data_cache').get_many(api_key, tickers, args.start)
+    data = {t: df for t, df in frames.items() if df is not None and not df.empty}
+    missing = sorted(set(tickers) - set(data))
+    if missing:
+        print(f"Dati non disponibili per: {', '.join(missing)}")
+    if not data:
+        return
+
+    leg_params = None
+    if args.params:
+        with open(args.params) as f:
+            leg_params = json.load(f)
+
+    results = run_basket(data, leg_params, initial_capital=args.capital, rebalance=args.rebalance)
+    print(results['kpis'].to_string())
+
+
+if __name__ == '__main__':
+    main()
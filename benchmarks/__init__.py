@@ -0,0 +1,2 @@
+# File: benchmarks/__init__.py
+# Modulo per il progetto KriterionQuant Hedging App
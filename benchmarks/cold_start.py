@@ -0,0 +1,171 @@
+# File: benchmarks/cold_start.py
+# Modulo per il progetto KriterionQuant Hedging App
+#
+# Tempo di avvio a freddo del bot giornaliero (btc_bot_runner.py) nei due
+# runtime, 'pandas' e 'lean', contro il server locale di benchmarks/stub_server.py.
+# Ogni misura è un processo Python nuovo, come un'esecuzione di GitHub Actions:
+# import, primo avvio (ricostruzione dello stato), esecuzione incrementale con
+# una candela nuova ed esecuzione senza candele nuove. Verifica inoltre che i
+# due runtime producano lo stesso checkpoint e lo stesso messaggio.
+#
+# Uso (dalla radice del repository):
+#   python -m benchmarks.cold_start
+#   python -m benchmarks.cold_start --runtimes lean --python /percorso/venv-bot/bin/python
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.run_benchmarks import RESULTS_DIR, PARAMS, environment
+from benchmarks.stub_server import EODHDStubServer
+from bot_state import SignalCheckpoint
+import signal_runtime
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOT_SCRIPT = os.path.join(REPO_DIR, 'btc_bot_runner.py')
+TICKER = 'BTC-USD.CC'
+
+# Budget del runtime snello per l'esecuzione giornaliera tipica (una candela nuova), in secondi
+LEAN_INCREMENTAL_BUDGET = 1.0
+
+SCENARIOS = ('import', 'bootstrap', 'incremental', 'no_new_bar')
+
+CONFIG = f"""[EODHD]
+api_key = bench
+
+[TELEGRAM]
+bot_token = bench
+chat_id = 1001
+
+[STRATEGY]
+ticker = {TICKER}
+fast_ma = {PARAMS['fast_ma']}
+slow_ma = {PARAMS['slow_ma']}
+adx_period = {PARAMS['adx_period']}
+adx_threshold = {PARAMS['adx_threshold']}
+stop_loss_perc = {PARAMS['stop_loss_perc']}
+"""
+
+
+def _checkpoint_path(workdir: str) -> str:
+    return os.path.join(workdir, 'bot_state', f"{TICKER}.json")
+
+
+def _prepare(workdir: str, server: EODHDStubServer, scenario: str):
+    """Cartella di lavoro del bot: config.ini ed eventuale checkpoint già pronto."""
+    with open(os.path.join(workdir, 'config.ini'), 'w') as f:
+        f.write(CONFIG)
+    if scenario not in ('incremental', 'no_new_bar'):
+        return
+    # Checkpoint aggiornato a due giorni fa (una candela nuova) o a ieri (nessuna candela nuova)
+    last_closed = datetime.now(timezone.utc) - timedelta(days=1)
+    until = last_closed - timedelta(days=1) if scenario == 'incremental' else last_closed
+    start = (datetime.now() - timedelta(days=500)).strftime('%Y-%m-%d')
+    with contextlib.redirect_stdout(io.StringIO()):
+        bars = signal_runtime.fetch_bars('bench', TICKER, start, until.strftime('%Y-%m-%d'),
+                                         api_root=server.api_root)
+    params = {k: v for k, v in PARAMS.items() if k != 'hedge_ratio'}
+    checkpoint = SignalCheckpoint(TICKER, **params)
+    checkpoint.process_bars(bars['dates'], bars['high'], bars['low'], bars['close'], bars['adj_close'])
+    checkpoint.save(_checkpoint_path(workdir))
+
+
+def run_once(python: str, server: EODHDStubServer, runtime: str, scenario: str) -> dict:
+    """
+    Un'esecuzione in un processo nuovo, in una cartella di lavoro temporanea.
+
+    Returns:
+        dict: Secondi di orologio, codice di uscita, checkpoint finale e messaggi inviati.
+    """
+    with tempfile.TemporaryDirectory(prefix='kq_cold_') as workdir:
+        _prepare(workdir, server, scenario)
+        if scenario == 'import':
+            command = [python, '-c', f"import sys; sys.path.insert(0, {REPO_DIR!r}); import btc_bot_runner"]
+        else:
+            command = [python, BOT_SCRIPT, '--runtime', runtime]
+        env = {**os.environ, 'EODHD_API_ROOT': server.api_root, 'TELEGRAM_API_ROOT': server.telegram_root}
+        server.reset_stats()
+        start = time.perf_counter()
+        completed = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+        seconds = time.perf_counter() - start
+        if completed.returncode != 0:
+            print(completed.stdout[-2000:], completed.stderr[-2000:], file=sys.stderr)
+        checkpoint = None
+        if os.path.exists(_checkpoint_path(workdir)):
+            with open(_checkpoint_path(workdir)) as f:
+                checkpoint = json.load(f)
+        return {'seconds': seconds, 'returncode': completed.returncode, 'checkpoint': checkpoint,
+                'messages': [m.get('text') for m in server.telegram_messages()]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Avvio a freddo del bot giornaliero nei due runtime.")
+    parser.add_argument('--runtimes', default='lean,pandas', help="Runtime separati da virgola")
+    parser.add_argument('--repeat', type=int, default=5, help="Ripetizioni per scenario (si riporta la mediana)")
+    parser.add_argument('--python', default=sys.executable,
+                        help="Interprete dei processi del bot (es. un ambiente con solo requirements-bot.txt)")
+    parser.add_argument('--budget', type=float, default=LEAN_INCREMENTAL_BUDGET,
+                        help="Budget in secondi del runtime lean nello scenario incrementale")
+    parser.add_argument('--output', default=None, help="File JSON dei risultati")
+    args = parser.parse_args()
+
+    runtimes = args.runtimes.split(',')
+    results, outputs = [], {}
+    print(f"{'runtime':<8} {'scenario':<12} {'mediana':>9} {'min':>9} {'max':>9}")
+    with EODHDStubServer(rows=2000) as server:
+        for runtime in runtimes:
+            for scenario in SCENARIOS:
+                if scenario == 'import' and runtime != runtimes[0]:
+                    continue
+                runs = [run_once(args.python, server, runtime, scenario) for _ in range(args.repeat)]
+                times = [r['seconds'] for r in runs]
+                failed = sum(r['returncode'] != 0 for r in runs)
+                name = 'any' if scenario == 'import' else runtime
+                results.append({'runtime': name, 'scenario': scenario, 'median': statistics.median(times),
+                                'min': min(times), 'max': max(times), 'runs': times, 'failed': failed})
+                outputs[(runtime, scenario)] = runs[-1]
+                print(f"{name:<8} {scenario:<12} {statistics.median(times):>8.3f}s "
+                      f"{min(times):>8.3f}s {max(times):>8.3f}s" + (f"  {failed} ERRORI" if failed else ""))
+
+    # I due runtime devono lasciare lo stesso checkpoint e inviare lo stesso messaggio
+    parity = {}
+    if len(runtimes) > 1:
+        for scenario in ('bootstrap', 'incremental'):
+            a, b = (outputs[(r, scenario)] for r in runtimes[:2])
+            parity[scenario] = (a['checkpoint'] is not None and a['checkpoint'] == b['checkpoint']
+                                and a['messages'] == b['messages'])
+        print(f"\nParità {runtimes[0]}/{runtimes[1]}: "
+              + ", ".join(f"{s} {'OK' if ok else 'DIVERSO'}" for s, ok in parity.items()))
+
+    within_budget = None
+    lean = next((r for r in results if r['runtime'] == 'lean' and r['scenario'] == 'incremental'), None)
+    if lean is not None:
+        within_budget = lean['median'] <= args.budget
+        print(f"Budget lean incrementale: {lean['median']:.3f}s su {args.budget:.3f}s "
+              f"-> {'OK' if within_budget else 'SUPERATO'}")
+
+    report = {'environment': environment(), 'config': vars(args), 'results': results,
+              'parity': parity, 'within_budget': within_budget}
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        tag = report['environment']['commit'] or 'nocommit'
+        output = os.path.join(RESULTS_DIR, f"cold_start_{datetime.now():%Y%m%d_%H%M%S}_{tag}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nRisultati salvati in {output}")
+
+    failed = any(r['failed'] for r in results) or not all(parity.values()) or within_budget is False
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+# File: benchmarks/fetch_benchmark.py
+# Modulo per il progetto KriterionQuant Hedging App
+#
+# Benchmark di throughput di EODHDClient contro il server locale di
+# benchmarks/stub_server.py: concorrenza, tentativi su 429/5xx (adapter della
+# sessione) e su risposte troncate (EODHDClient._get) e cache incrementale,
+# misurati senza rete e senza consumare quota API.
+#
+# Uso (dalla radice del repository):
+#   python -m benchmarks.fetch_benchmark
+#   python -m benchmarks.fetch_benchmark --tickers 200 --workers 1,8,32 --profiles clean,latency,quota --rps 20
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.run_benchmarks import RESULTS_DIR, environment
+from benchmarks.stub_server import EODHDStubServer, FAULT_PROFILES
+from data_handler import EODHDClient
+
+
+def fetch_run(server: EODHDStubServer, tickers: list[str], start_date: str, workers: int,
+              client_kwargs: dict, cache_dir: str | None = None) -> dict:
+    """
+    Scarica tutti i ticker con un client nuovo e restituisce tempi ed esito.
+
+    Args:
+        server (EODHDStubServer): Server locale già avviato.
+        tickers (list[str]): Ticker da scaricare.
+        start_date (str): Data di inizio in formato 'YYYY-MM-DD'.
+        workers (int): Thread di download (max_workers di get_many).
+        client_kwargs (dict): Argomenti di EODHDClient (quota, tentativi, backoff).
+        cache_dir (str, optional): Cartella della cache locale del client.
+
+    Returns:
+        dict: Secondi, ticker scaricati e falliti, statistiche del server.
+    """
+    server.reset_stats()
+    client = EODHDClient(cache_dir=cache_dir, api_root=server.api_root,
+                         pool_size=max(workers, 1), **client_kwargs)
+    # I messaggi per ticker del client renderebbero illeggibile la tabella
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        frames = client.get_many('bench', tickers, start_date, max_workers=workers)
+        seconds = time.perf_counter() - start
+    client.session.close()
+
+    ok = sum(df is not None and not df.empty for df in frames.values())
+    stats = server.stats()
+    return {'seconds': seconds, 'tickers_ok': ok, 'tickers_failed': len(tickers) - ok,
+            'tickers_per_second': ok / seconds if seconds else None,
+            'requests': stats['requests'], 'retries': stats['requests'] - len(tickers),
+            'status': {str(code): n for code, n in sorted(stats['status'].items())},
+            'truncated': stats['truncated'], 'mb_served': stats['bytes'] / 1024 ** 2}
+
+
+def _print_row(scenario: str, profile: str, workers: int, result: dict):
+    print(f"{scenario:<12} {profile:<10} {workers:>7}  {result['seconds']:>8.3f}s  "
+          f"{result['tickers_ok']:>5} ok {result['tickers_failed']:>4} ko  "
+          f"{result['requests']:>6} richieste  {result['mb_served']:>8.2f} MB  {result['status']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput di EODHDClient contro il server EODHD locale.")
+    parser.add_argument('--tickers', type=int, default=50, help="Numero di ticker sintetici")
+    parser.add_argument('--rows', type=int, default=2000, help="Barre giornaliere per ticker")
+    parser.add_argument('--workers', default='1,4,16', help="Livelli di concorrenza separati da virgola")
+    parser.add_argument('--profiles', default=','.join(FAULT_PROFILES),
+                        help="Profili di guasto separati da virgola")
+    parser.add_argument('--rps', type=float, default=1000.0, help="Quota di richieste al secondo del client")
+    parser.add_argument('--retries', type=int, default=5)
+    parser.add_argument('--backoff', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skip-cache', action='store_true', help="Salta lo scenario della cache incrementale")
+    parser.add_argument('--output', default=None, help="File JSON dei risultati")
+    args = parser.parse_args()
+
+    tickers = [f"SYN{i:04d}.CC" for i in range(args.tickers)]
+    start_date = (datetime.now() - timedelta(days=args.rows - 1)).strftime('%Y-%m-%d')
+    levels = [int(w) for w in args.workers.split(',')]
+    client_kwargs = {'requests_per_second': args.rps, 'max_retries': args.retries,
+                     'backoff_factor': args.backoff}
+
+    print(f"{'scenario':<12} {'profilo':<10} {'workers':>7}  {'tempo':>9}  esito")
+    results = []
+    for profile in args.profiles.split(','):
+        with EODHDStubServer.from_profile(profile, rows=args.rows, seed=args.seed) as server:
+            for workers in levels:
+                result = fetch_run(server, tickers, start_date, workers, client_kwargs)
+                results.append({'scenario': 'fetch', 'profile': profile, 'workers': workers, **result})
+                _print_row('fetch', profile, workers, result)
+
+    if not args.skip_cache:
+        # Primo download completo, poi aggiornamento incrementale dalla cache
+        workers = max(levels)
+        with EODHDStubServer(rows=args.rows, seed=args.seed) as server, \
+                tempfile.TemporaryDirectory() as cache_dir:
+            for scenario in ('cache.cold', 'cache.warm'):
+                result = fetch_run(server, tickers, start_date, workers, client_kwargs, cache_dir)
+                results.append({'scenario': scenario, 'profile': 'clean', 'workers': workers, **result})
+                _print_row(scenario, 'clean', workers, result)
+
+    report = {'environment': environment(), 'config': vars(args), 'results': results}
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        tag = report['environment']['commit'] or 'nocommit'
+        output = os.path.join(RESULTS_DIR, f"fetch_{datetime.now():%Y%m%d_%H%M%S}_{tag}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nRisultati salvati in {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,487 @@
+# File: benchmarks/run_benchmarks.py
+# Modulo per il progetto KriterionQuant Hedging App
+#
+# Benchmark riproducibili di ogni fase della pipeline (dati, indicatori,
+# backtest, KPI) e del percorso completo, su dati sintetici con seme fisso.
+# Misura tempo e picco di memoria, verifica che i percorsi ottimizzati
+# coincidano con le implementazioni di riferimento e salva tutto in JSON.
+#
+# Uso (dalla radice del repository):
+#   python -m benchmarks.run_benchmarks
+#   python -m benchmarks.run_benchmarks --sizes 1k,100k,1m,10m --output risultati.json
+#   python -m benchmarks.run_benchmarks --compare benchmarks/results/precedente.json
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import requests
+
+from benchmarks.synthetic import generate_ohlcv, default_freq
+from benchmarks.stub_server import eodhd_payload
+
+from data_cache import LocalOHLCVCache
+from data_handler import EODHDClient
+from mmap_store import MmapPriceStore
+from results_store import ResultsStore
+from indicator_calculator import IndicatorCalculator
+from feature_cache import CachedIndicatorCalculator, IndicatorCache
+from backtester import EventDrivenBacktester
+import performance_analyzer
+from performance_analyzer import PerformanceAnalyzer, _max_drawdown_columns
+from hedge_engine import hedge_state_path, hedge_state_matrix, NUMBA_AVAILABLE
+from online_indicators import OnlineSMA, OnlineRSI, OnlineADX, OnlineBollinger
+import chart_utils
+
+RESULTS_DIR = os.path.join('benchmarks', 'results')
+DEFAULT_SIZES = '1k,10k,100k'
+
+# Parametri della strategia in produzione
+PARAMS = {'fast_ma': 25, 'slow_ma': 40, 'adx_period': 14, 'adx_threshold': 15,
+          'stop_loss_perc': 0.05, 'hedge_ratio': 1.0}
+
+# Oltre queste dimensioni le fasi lente o molto voluminose vengono saltate
+LOOP_MAX_ROWS = 20_000
+PAYLOAD_MAX_ROWS = 1_000_000
+BANK_MAX_ROWS = 1_000_000
+BATCH_MAX_ROWS = 1_000_000
+BATCH_VARIANTS = 32
+FRONTIER_RATIOS = np.arange(0, 201) / 100
+STOP_LOSS_LEVELS = np.arange(0, 51) / 100
+STORE_MAX_ROWS = 1_000_000
+
+
+class _StaticJSONAdapter(requests.adapters.BaseAdapter):
+    """Adapter di trasporto in processo: risponde a ogni GET con lo stesso payload JSON."""
+    def __init__(self, payload: bytes):
+        super().__init__()
+        self.payload = payload
+
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = self.payload
+        response.headers['Content-Type'] = 'application/json'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    factor = {'k': 1_000, 'm': 1_000_000}.get(text[-1], 1)
+    return int(float(text[:-1] if factor > 1 else text) * factor)
+
+
+def measure(fn, repeat: int) -> dict:
+    """
+    Tempo (migliore e mediano su 'repeat' esecuzioni) e picco di memoria di una funzione.
+    Il picco è misurato in un'esecuzione separata, perché tracemalloc rallenta il codice.
+    """
+    fn()  # Riscaldamento: compilazione JIT, cache di import
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'seconds': min(timings), 'median_seconds': float(np.median(timings)),
+            'peak_mb': peak / 1024 ** 2}
+
+
+def add_strategy_indicators(df: pd.DataFrame, calc=IndicatorCalculator) -> pd.DataFrame:
+    df = calc.add_moving_average(df, period=PARAMS['fast_ma'])
+    df = calc.add_moving_average(df, period=PARAMS['slow_ma'])
+    return calc.add_adx(df, period=PARAMS['adx_period'])
+
+
+def strategy_signal(df: pd.DataFrame) -> pd.Series:
+    trend_down = df[f"sma_{PARAMS['fast_ma']}"] < df[f"sma_{PARAMS['slow_ma']}"]
+    strong = df[f"ADX_{PARAMS['adx_period']}"] > PARAMS['adx_threshold']
+    return pd.Series(np.where(trend_down & strong, -1, 0), index=df.index)
+
+
+def build_stages(df: pd.DataFrame, workdir: str) -> dict:
+    """
+    Preparatori delle fasi per una dimensione. Ogni preparatore restituisce la
+    funzione da misurare: la preparazione resta fuori dal tempo misurato e
+    avviene solo per le fasi selezionate, una alla volta, per limitare la memoria.
+    """
+    n = len(df)
+    prices = df[['open', 'high', 'low', 'close', 'adj_close', 'volume']]
+    backtester = EventDrivenBacktester()
+
+    def backtest_inputs():
+        data = add_strategy_indicators(prices.copy()).dropna()
+        return data, strategy_signal(data)
+
+    def run_backtest(data, signal, engine='fast'):
+        return backtester.run_backtest(data, signal, 50000, PARAMS['hedge_ratio'],
+                                       PARAMS['stop_loss_perc'], engine=engine)
+
+    def data_parse():
+        client = EODHDClient(requests_per_second=1e9)
+        client.session.mount('https://', _StaticJSONAdapter(eodhd_payload(prices)))
+        return lambda: client._download('bench', 'SYN', '2017-01-01', '2099-01-01')
+
+    def cache_roundtrip():
+        cache = LocalOHLCVCache(os.path.join(workdir, 'ohlcv'))
+        return lambda: (cache.save('SYN', prices, '2017-01-01'), cache.load('SYN'))
+
+    def mmap_open():
+        # Apertura per memory-map e lettura completa di una colonna (come un worker dell'ottimizzatore)
+        store = MmapPriceStore(os.path.join(workdir, 'mmap'))
+        store.save('SYN', prices)
+        return lambda: store.load('SYN')['adj_close'].to_numpy().sum()
+
+    def indicators_single():
+        return lambda: IndicatorCalculator.add_rsi(
+            IndicatorCalculator.add_bollinger_bands(add_strategy_indicators(prices.copy())))
+
+    def indicators_bank():
+        return lambda: (IndicatorCalculator.moving_average_bank(prices, list(range(10, 105, 5))),
+                        IndicatorCalculator.adx_bank(prices, [10, 14, 20]))
+
+    def indicators_cached_hit():
+        warm_calc = CachedIndicatorCalculator(IndicatorCache(max_bytes=1024 ** 3))
+        add_strategy_indicators(prices.copy(), warm_calc)
+        return lambda: add_strategy_indicators(prices.copy(), warm_calc)
+
+    def backtest(engine):
+        def setup():
+            data, signal = backtest_inputs()
+            return lambda: run_backtest(data, signal, engine)
+        return setup
+
+    def hedge_frontier():
+        # Tutti gli hedge ratio dello slider della dashboard: posizioni una volta, equity e KPI in batch
+        data, signal = backtest_inputs()
+        return lambda: PerformanceAnalyzer.frontier_kpis(
+            backtester.run_hedge_frontier(data, signal, 50000, FRONTIER_RATIOS, PARAMS['stop_loss_perc']))
+
+    def stop_loss_sweep():
+        # Tutti i livelli dello slider dello Stop Loss in un solo passaggio, valutati in batch
+        data, signal = backtest_inputs()
+        def run():
+            sweep = backtester.run_stop_loss_sweep(data, signal, 50000, PARAMS['hedge_ratio'], STOP_LOSS_LEVELS)
+            return PerformanceAnalyzer.batch_kpis(sweep['hedged'], sweep['positions'], sweep['hedge_only_returns'])
+        return run
+
+    def kpis_single():
+        bt = run_backtest(*backtest_inputs())
+        return lambda: PerformanceAnalyzer(bt['hedged'], bt['positions'],
+                                           hedge_only_returns=bt['hedge_only_returns']).calculate_kpis()
+
+    def kpis_batch():
+        equity = run_backtest(*backtest_inputs())['hedged'].to_numpy()
+        noise = np.random.default_rng(0).uniform(0.99, 1.01, (len(equity), BATCH_VARIANTS))
+        matrix = equity[:, None] * noise.cumprod(axis=0)
+        return lambda: PerformanceAnalyzer.batch_kpis(matrix)
+
+    store_state = {}
+
+    def results_store():
+        # Archivio con n esecuzioni sintetiche (una per barra, una su dieci dalla dashboard),
+        # costruito una sola volta per dimensione
+        if 'store' not in store_state:
+            rng = np.random.default_rng(0)
+            store = ResultsStore(os.path.join(workdir, 'results.db'))
+            i = np.arange(n)
+            params = {'fast_ma': 5 + i % 50, 'slow_ma': 10 + (i // 50) % 100, 'adx_period': 10 + (i // 5000) % 4,
+                      'adx_threshold': 10.0 + 5 * ((i // 20000) % 5), 'stop_loss_perc': 0.01 * (1 + (i // 100000) % 20),
+                      'hedge_ratio': np.full(n, 1.0), 'initial_capital': np.full(n, 50000.0)}
+            runs = pd.DataFrame({**params, 'Return on MaxDD': rng.normal(size=n), 'Sharpe Ratio': rng.normal(size=n),
+                                 'Net Profit': rng.normal(size=n), 'Num Trades': rng.integers(0, 300, n)})
+            dashboard = i % 10 == 0
+            for source, subset in (('optimizer', runs[~dashboard]), ('dashboard', runs[dashboard])):
+                for start in range(0, len(subset), 100_000):
+                    store.put_many('SYN', subset.iloc[start:start + 100_000].to_dict('records'), source=source)
+            store_state['store'] = store
+        return store_state['store']
+
+    def store_top():
+        store = results_store()
+        return lambda: store.top('Return on MaxDD', 20, 'SYN', {'stop_loss_perc': ('<=', 0.10)})
+
+    def store_top_selective():
+        # Filtro che seleziona poche righe (0.2%): letto dal suo indice invece che dalla classifica
+        store = results_store()
+        return lambda: store.top('Return on MaxDD', 20, 'SYN', {'fast_ma': 20, 'stop_loss_perc': ('<=', 0.02)})
+
+    def store_top_source():
+        store = results_store()
+        return lambda: store.top('Return on MaxDD', 20, 'SYN', {'source': 'dashboard'})
+
+    def store_heatmap():
+        store = results_store()
+        return lambda: store.heatmap('fast_ma', 'slow_ma', 'Return on MaxDD', 'max', 'SYN',
+                                     {'stop_loss_perc': ('<=', 0.10)})
+
+    def store_heatmap_source():
+        store = results_store()
+        return lambda: store.heatmap('fast_ma', 'slow_ma', 'Return on MaxDD', 'max', 'SYN',
+                                     {'source': 'dashboard', 'stop_loss_perc': ('<=', 0.10)})
+
+    def chart_equity():
+        # Figura dell'equity ricampionata e serializzata come la invia la dashboard
+        equity = run_backtest(*backtest_inputs())['hedged']
+        def run():
+            fig = go.Figure(chart_utils.line_trace(equity.index, equity, 'Hedged'))
+            return fig.to_json()
+        return run
+
+    def end_to_end():
+        def run():
+            data, signal = backtest_inputs()
+            result = run_backtest(data, signal)
+            return PerformanceAnalyzer(result['hedged'], result['positions'],
+                                       hedge_only_returns=result['hedge_only_returns']).calculate_kpis()
+        return run
+
+    stages = {}
+    if n <= PAYLOAD_MAX_ROWS:
+        stages['data.parse'] = data_parse
+    stages['data.cache_roundtrip'] = cache_roundtrip
+    stages['data.mmap_open'] = mmap_open
+    stages['indicators.single'] = indicators_single
+    if n <= BANK_MAX_ROWS:
+        stages['indicators.bank'] = indicators_bank
+    stages['indicators.cached_hit'] = indicators_cached_hit
+    stages['backtest.fast'] = backtest('fast')
+    if n <= LOOP_MAX_ROWS:
+        stages['backtest.loop'] = backtest('loop')
+    stages['backtest.hedge_frontier'] = hedge_frontier
+    stages['backtest.stop_loss_sweep'] = stop_loss_sweep
+    stages['kpis.single'] = kpis_single
+    if n <= BATCH_MAX_ROWS:
+        stages['kpis.batch'] = kpis_batch
+    stages['chart.equity_figure'] = chart_equity
+    if n <= STORE_MAX_ROWS:
+        stages['store.top'] = store_top
+        stages['store.top_selective'] = store_top_selective
+        stages['store.top_source'] = store_top_source
+        stages['store.heatmap'] = store_heatmap
+        stages['store.heatmap_source'] = store_heatmap_source
+    stages['end_to_end'] = end_to_end
+    return stages
+
+
+def _max_diff(a, b) -> float:
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    both_nan = np.isnan(a) & np.isnan(b)
+    if (np.isnan(a) != np.isnan(b)).any():
+        return float('inf')
+    diff = np.abs(np.where(both_nan, 0., a - b))
+    scale = np.maximum(np.abs(np.where(both_nan, 0., b)), 1.0)
+    return float((diff / scale).max()) if diff.size else 0.0
+
+
+def parity_checks(seed: int) -> list[dict]:
+    """
+    Confronta i percorsi ottimizzati con le implementazioni di riferimento.
+    Tolleranza 0 significa uguaglianza esatta; le altre sono differenze relative
+    massime ammesse (somme riordinate nei kernel a blocchi).
+    """
+    df = generate_ohlcv(5_000, 'D', seed=seed)
+    checks = []
+
+    def record(name, diff, tolerance=0.0):
+        checks.append({'check': name, 'max_rel_diff': diff, 'tolerance': tolerance,
+                       'passed': bool(diff <= tolerance)})
+
+    data = add_strategy_indicators(df.copy()).dropna()
+    signal = strategy_signal(data)
+    backtester = EventDrivenBacktester()
+    fast = backtester.run_backtest(data, signal, 50000, 0.7, 0.05, engine='fast')
+    loop = backtester.run_backtest(data, signal, 50000, 0.7, 0.05, engine='loop')
+    record('backtest.positions fast vs loop', _max_diff(fast['positions'], loop['positions']))
+    record('backtest.equity fast vs loop', _max_diff(fast['hedged'], loop['hedged']))
+
+    close = data['adj_close'].to_numpy()
+    enter, leave = signal.to_numpy() == -1, signal.to_numpy() == 0
+    reference = hedge_state_path(close, enter, leave, 0.05, engine='loop')
+    engines = ['numpy'] + (['numba'] if NUMBA_AVAILABLE else [])
+    for engine in engines:
+        record(f'hedge_state {engine} vs loop',
+               _max_diff(hedge_state_path(close, enter, leave, 0.05, engine=engine), reference))
+        matrix = hedge_state_matrix(close, enter, leave, [0.05, 0.05], engine=engine)
+        record(f'hedge_state_matrix {engine} vs loop', _max_diff(matrix[:, 1], reference))
+
+    frontier = backtester.run_hedge_frontier(data, signal, 50000, [0.0, 0.7, 1.5], 0.05)
+    record('backtest.hedge_frontier vs run_backtest', _max_diff(frontier['hedged'][0.7], fast['hedged']))
+    if NUMBA_AVAILABLE:
+        numpy_frontier = backtester.compute_equity_frontier(data, fast['positions'], 50000, [0.0, 0.7, 1.5],
+                                                            engine='numpy')
+        record('hedged_equity numba vs numpy', _max_diff(frontier['hedged'], numpy_frontier['hedged']))
+
+    signals = pd.DataFrame({'base': signal, 'inverse': -1 - signal})
+    sweep = backtester.run_stop_loss_sweep(data, signals, 50000, 0.7, [0.02, 0.05, 0.2])
+    record('backtest.stop_loss_sweep vs run_backtest',
+           max(_max_diff(sweep['hedged'][(name, 0.05)],
+                         backtester.run_backtest(data, signals[name], 50000, 0.7, 0.05)['hedged'])
+               for name in signals))
+
+    # Il downsampling min-max dei grafici conserva esattamente massimo e minimo
+    points = close[chart_utils.downsample_indices(data.index, close, 500, method='minmax')]
+    record('chart.minmax extremes vs full',
+           max(_max_diff(points.max(), close.max()), _max_diff(points.min(), close.min())))
+
+    single = df.copy()
+    for p in (10, 14, 20):
+        IndicatorCalculator.add_adx(single, p)
+        IndicatorCalculator.add_rsi(single, p)
+    IndicatorCalculator.add_moving_average(single, 40)
+    IndicatorCalculator.add_bollinger_bands(single, 20)
+    adx_bank = IndicatorCalculator.adx_bank(df, [10, 14, 20])
+    rsi_bank = IndicatorCalculator.rsi_bank(df, [10, 14, 20])
+    record('indicators.adx_bank vs add_adx', _max_diff(adx_bank.to_numpy(), single[adx_bank.columns].to_numpy()))
+    record('indicators.rsi_bank vs add_rsi', _max_diff(rsi_bank.to_numpy(), single[rsi_bank.columns].to_numpy()))
+    sma_bank = IndicatorCalculator.moving_average_bank(df, [40])
+    record('indicators.sma_bank vs add_moving_average', _max_diff(sma_bank['sma_40'], single['sma_40']), 1e-12)
+    bb_bank = IndicatorCalculator.bollinger_bank(df, [20])
+    record('indicators.bollinger_bank vs add_bollinger_bands',
+           _max_diff(bb_bank.to_numpy(), single[bb_bank.columns].to_numpy()), 1e-9)
+
+    online = {'sma_40': OnlineSMA(40), 'rsi_14': OnlineRSI(14), 'ADX_14': OnlineADX(14)}
+    bands = OnlineBollinger(20)
+    values = {name: [] for name in list(online) + ['BBM_20_2.0']}
+    for high, low, close_, adj in df[['high', 'low', 'close', 'adj_close']].itertuples(index=False):
+        values['sma_40'].append(online['sma_40'].update(adj))
+        values['rsi_14'].append(online['rsi_14'].update(adj))
+        values['ADX_14'].append(online['ADX_14'].update(high, low, close_))
+        values['BBM_20_2.0'].append(bands.update(adj)[0])
+    for name in ('sma_40', 'rsi_14', 'ADX_14'):
+        record(f'online.{name} vs batch', _max_diff(values[name], single[name]))
+    record('online.bollinger vs batch', _max_diff(values['BBM_20_2.0'], single['BBM_20_2.0']), 1e-9)
+
+    kpis_single = PerformanceAnalyzer(fast['hedged'], fast['positions'],
+                                      hedge_only_returns=fast['hedge_only_returns']).calculate_kpis()
+    kpis_batch = PerformanceAnalyzer.batch_kpis(fast['hedged'].to_frame(), fast['positions'].to_frame(),
+                                                fast['hedge_only_returns'].to_frame()).iloc[0]
+    record('kpis.batch vs calculate_kpis',
+           max(_max_diff(kpis_batch[name], value) for name, value in kpis_single.items()), 1e-9)
+    # Max drawdown mobile contro quello di ogni finestra equity[t-w+1 : t+1] ricalcolata da zero
+    equity = fast['hedged'].to_numpy()
+    brute = [_max_drawdown_columns(equity[max(0, t - 251):t + 1, None])[0] for t in range(len(equity))]
+    record('kpis.rolling_maxdd vs window max drawdown',
+           _max_diff(PerformanceAnalyzer.rolling_metrics(fast['hedged'], window=252)['Rolling MaxDD'], brute))
+    if NUMBA_AVAILABLE:
+        hedge = sweep['hedge_only_returns'].to_numpy()
+        first = np.full(hedge.shape[1], 50000.0)
+        record('kpis.short_drawdown numba vs numpy',
+               _max_diff(performance_analyzer._compounded_drawdown_jit(np.ascontiguousarray(hedge), first,
+                                                                       np.empty(hedge.shape[1])),
+                         _max_drawdown_columns(np.cumprod(1 + hedge, axis=0) * first)))
+    return checks
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'numba': NUMBA_AVAILABLE
+    }
+
+
+def compare(results: list[dict], baseline_path: str, threshold: float) -> list[dict]:
+    """Confronta i tempi con un file di risultati precedente e segnala i rallentamenti."""
+    with open(baseline_path) as f:
+        baseline = {(r['stage'], r['rows']): r for r in json.load(f)['results']}
+    regressions = []
+    print(f"\nConfronto con {baseline_path}:")
+    for result in results:
+        old = baseline.get((result['stage'], result['rows']))
+        if old is None:
+            continue
+        ratio = result['seconds'] / old['seconds'] if old['seconds'] else float('inf')
+        flag = "  <-- REGRESSIONE" if ratio > threshold else ""
+        print(f"  {result['stage']:<24} {result['rows']:>10,}  {old['seconds']:.4f}s -> {result['seconds']:.4f}s  x{ratio:.2f}{flag}")
+        if ratio > threshold:
+            regressions.append({**result, 'baseline_seconds': old['seconds'], 'ratio': ratio})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark della pipeline KriterionQuant su dati sintetici.")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help="Dimensioni separate da virgola (es. 1k,10k,100k,1m,10m)")
+    parser.add_argument('--freq', choices=['D', 'h', 'min'], default=None,
+                        help="Frequenza delle barre (default: scelta in base alla dimensione)")
+    parser.add_argument('--stages', default=None, help="Sottoinsieme di fasi separate da virgola")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None, help="File JSON dei risultati")
+    parser.add_argument('--compare', default=None, help="File JSON di un'esecuzione precedente")
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help="Rapporto di tempo oltre il quale una fase è considerata in regressione")
+    parser.add_argument('--skip-parity', action='store_true')
+    args = parser.parse_args()
+
+    selected = set(args.stages.split(',')) if args.stages else None
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in (parse_size(s) for s in args.sizes.split(',')):
+            freq = args.freq or default_freq(rows)
+            df = generate_ohlcv(rows, freq, seed=args.seed)
+            for stage, setup in build_stages(df, workdir).items():
+                if selected and stage not in selected:
+                    continue
+                stats = measure(setup(), args.repeat)
+                results.append({'stage': stage, 'rows': rows, 'freq': freq, **stats,
+                                'rows_per_second': rows / stats['seconds'] if stats['seconds'] else None})
+                print(f"{stage:<24} {rows:>10,} {freq:>4}  {stats['seconds']:.4f}s  "
+                      f"picco {stats['peak_mb']:.1f} MB")
+
+    parity = [] if args.skip_parity else parity_checks(args.seed)
+    for check in parity:
+        status = "OK " if check['passed'] else "KO "
+        print(f"{status} {check['check']} (diff {check['max_rel_diff']:.2e}, tolleranza {check['tolerance']:.0e})")
+
+    report = {'environment': environment(), 'results': results, 'parity': parity}
+    if args.compare:
+        report['regressions'] = compare(results, args.compare, args.threshold)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        tag = report['environment']['commit'] or 'nocommit'
+        output = os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d_%H%M%S}_{tag}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nRisultati salvati in {output}")
+
+    if any(not check['passed'] for check in parity):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,332 @@
+# File: benchmarks/stub_server.py
+# Modulo per il progetto KriterionQuant Hedging App
+#
+# Server HTTP locale che imita l'endpoint /api/eod/{ticker} di EODHD, con dati
+# sintetici o registrati (cartella della cache locale) e iniezione di guasti:
+# latenza, 429, errori 5xx e risposte troncate. Risponde anche a sendMessage di
+# Telegram. Serve a misurare client e bot senza rete e senza consumare quota API.
+#
+# Uso (dalla radice del repository):
+#   python -m benchmarks.stub_server --port 8765 --profile flaky
+#   EODHD_API_ROOT=http://127.0.0.1:8765/api/ TELEGRAM_API_ROOT=http://127.0.0.1:8765 python btc_bot_runner.py
+
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import pandas as pd
+
+from benchmarks.synthetic import generate_ohlcv
+from data_cache import LocalOHLCVCache
+
+# Profili di guasto pronti all'uso (parametri di EODHDStubServer)
+FAULT_PROFILES = {
+    'clean': {},
+    'latency': {'latency': 0.05, 'jitter': 0.02},
+    'throttle': {'throttle_rate': 0.2},
+    'flaky': {'error_rate': 0.1, 'truncate_rate': 0.05},
+    'quota': {'quota_rps': 20},
+}
+
+# Barre giornaliere generate per ogni ticker sintetico
+DEFAULT_ROWS = 2000
+
+
+def eodhd_payload(df: pd.DataFrame) -> bytes:
+    """Serializza un DataFrame OHLCV nel formato JSON restituito da /api/eod/."""
+    records = df.reset_index().rename(columns={'adj_close': 'adjusted_close'})
+    records['date'] = records['date'].dt.strftime('%Y-%m-%d')
+    return records.to_json(orient='records').encode()
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1: le connessioni restano aperte, come con il pool del client
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.stub.handle(self)
+
+    def do_POST(self):
+        self.server.stub.handle_telegram(self)
+
+
+class EODHDStubServer:
+    """
+    Sostituto locale di EODHD in un thread in background.
+
+    Le decisioni sui guasti dipendono solo da seme, URL e numero di tentativi
+    per quell'URL: lo stesso carico produce gli stessi guasti qualunque sia
+    l'ordine dei thread. Fa eccezione 'quota_rps', che per natura dipende dal tempo.
+    """
+    def __init__(self, data: dict[str, pd.DataFrame] | None = None, recorded_dir: str | None = None,
+                 rows: int = DEFAULT_ROWS, host: str = '127.0.0.1', port: int = 0,
+                 latency: float = 0.0, jitter: float = 0.0, throttle_rate: float = 0.0,
+                 error_rate: float = 0.0, truncate_rate: float = 0.0, quota_rps: float | None = None,
+                 retry_after: int | None = None, api_token: str | None = None, seed: int = 0):
+        """
+        Args:
+            data (dict, optional): DataFrame OHLCV per ticker da servire così come sono.
+            recorded_dir (str, optional): Cartella di una LocalOHLCVCache da cui leggere
+                i ticker registrati; i ticker assenti rispondono 404 come l'API reale.
+            rows (int): Barre dei ticker sintetici (usati se il ticker non è in 'data'
+                e non c'è 'recorded_dir'); l'ultima barra è la data odierna.
+            host (str): Indirizzo di ascolto.
+            port (int): Porta di ascolto (0 = scelta dal sistema).
+            latency (float): Ritardo fisso in secondi prima di ogni risposta.
+            jitter (float): Ritardo casuale aggiuntivo massimo in secondi.
+            throttle_rate (float): Probabilità di rispondere 429.
+            error_rate (float): Probabilità di rispondere 500, 502 o 503.
+            truncate_rate (float): Probabilità di chiudere la connessione a metà del corpo.
+            quota_rps (float, optional): Quota di richieste al secondo oltre la quale si risponde 429.
+            retry_after (int, optional): Valore dell'header Retry-After nelle risposte 429.
+            api_token (str, optional): Se indicato, le richieste con un altro token ricevono 401.
+            seed (int): Seme delle decisioni sui guasti e dei dati sintetici.
+        """
+        self.data = dict(data or {})
+        self.recorded = LocalOHLCVCache(recorded_dir) if recorded_dir else None
+        self.rows = rows
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.truncate_rate = truncate_rate
+        self.quota_rps = quota_rps
+        self.retry_after = retry_after
+        self.api_token = api_token
+        self.seed = seed
+
+        self._lock = threading.Lock()
+        self._attempts: dict[str, int] = {}
+        self._payloads: dict[tuple, bytes] = {}
+        self._quota_tokens = float(quota_rps or 0)
+        self._quota_last = time.monotonic()
+        self._httpd = None
+        self._thread = None
+        self.reset_stats()
+
+    @classmethod
+    def from_profile(cls, profile: str, **kwargs) -> 'EODHDStubServer':
+        """Crea il server con uno dei profili di FAULT_PROFILES (gli argomenti espliciti prevalgono)."""
+        return cls(**{**FAULT_PROFILES[profile], **kwargs})
+
+    @property
+    def api_root(self) -> str:
+        """Radice da passare a EODHDClient(api_root=...) o alla variabile EODHD_API_ROOT."""
+        return f"http://{self.host}:{self.port}/api/"
+
+    @property
+    def telegram_root(self) -> str:
+        """Radice da passare a NotificationDispatcher o alla variabile TELEGRAM_API_ROOT."""
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> 'EODHDStubServer':
+        self._httpd = ThreadingHTTPServer((self.host, self.port), _StubHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.stub = self
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='eodhd-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._thread.join()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def reset_stats(self):
+        """Azzera le statistiche e i contatori dei tentativi (la sequenza dei guasti riparte da capo)."""
+        with self._lock:
+            self._stats = {'requests': 0, 'bytes': 0, 'status': {}, 'truncated': 0}
+            self._attempts.clear()
+            self._messages = []
+
+    def stats(self) -> dict:
+        """Richieste servite, byte inviati, conteggio per codice di stato e risposte troncate."""
+        with self._lock:
+            return {**self._stats, 'status': dict(self._stats['status'])}
+
+    def telegram_messages(self) -> list[dict]:
+        """Corpi JSON dei messaggi ricevuti su sendMessage dall'ultimo reset_stats."""
+        with self._lock:
+            return list(self._messages)
+
+    # ------------------------------------------------------------------
+    # Dati
+    # ------------------------------------------------------------------
+
+    def _frame(self, ticker: str) -> pd.DataFrame | None:
+        if ticker in self.data:
+            return self.data[ticker]
+        if self.recorded is not None:
+            return self.recorded.load(ticker)
+        with self._lock:
+            if ticker not in self.data:
+                start = (datetime.now() - timedelta(days=self.rows - 1)).strftime('%Y-%m-%d')
+                ticker_seed = zlib.crc32(ticker.encode()) ^ self.seed
+                self.data[ticker] = generate_ohlcv(self.rows, 'D', seed=ticker_seed, start=start)
+            return self.data[ticker]
+
+    def _payload(self, ticker: str, date_from: str | None, date_to: str | None) -> bytes | None:
+        key = (ticker, date_from, date_to)
+        cached = self._payloads.get(key)
+        if cached is not None:
+            return cached
+        df = self._frame(ticker)
+        if df is None:
+            return None
+        window = df.loc[pd.Timestamp(date_from) if date_from else None:
+                        pd.Timestamp(date_to) if date_to else None]
+        payload = eodhd_payload(window[['open', 'high', 'low', 'close', 'adj_close', 'volume']])
+        with self._lock:
+            self._payloads[key] = payload
+        return payload
+
+    # ------------------------------------------------------------------
+    # Guasti
+    # ------------------------------------------------------------------
+
+    def _quota_exceeded(self) -> bool:
+        if not self.quota_rps:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            self._quota_tokens = min(self.quota_rps, self._quota_tokens + (now - self._quota_last) * self.quota_rps)
+            self._quota_last = now
+            if self._quota_tokens >= 1:
+                self._quota_tokens -= 1
+                return False
+            return True
+
+    def _rng(self, url: str) -> random.Random:
+        with self._lock:
+            attempt = self._attempts.get(url, 0)
+            self._attempts[url] = attempt + 1
+        return random.Random(f"{self.seed}:{url}:{attempt}")
+
+    # ------------------------------------------------------------------
+    # Risposte
+    # ------------------------------------------------------------------
+
+    def handle(self, request: BaseHTTPRequestHandler):
+        url = urlsplit(request.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        rng = self._rng(request.path)
+
+        delay = self.latency + (rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+        parts = url.path.strip('/').split('/')
+        if len(parts) != 3 or parts[:2] != ['api', 'eod']:
+            return self._send(request, 404, b'Not Found')
+        if self.api_token is not None and query.get('api_token') != self.api_token:
+            return self._send(request, 401, b'Unauthenticated')
+        if self._quota_exceeded() or rng.random() < self.throttle_rate:
+            headers = {'Retry-After': str(self.retry_after)} if self.retry_after is not None else {}
+            return self._send(request, 429, b'Too Many Requests', headers)
+        if rng.random() < self.error_rate:
+            return self._send(request, rng.choice((500, 502, 503)), b'Server Error')
+
+        payload = self._payload(parts[2], query.get('from'), query.get('to'))
+        if payload is None:
+            return self._send(request, 404, b'Ticker Not Found.')
+        truncate = rng.random() < self.truncate_rate
+        return self._send(request, 200, payload, {'Content-Type': 'application/json'}, truncate)
+
+    def handle_telegram(self, request: BaseHTTPRequestHandler):
+        """
+        Risponde come sendMessage di Telegram (vedi 'telegram_root'), così
+        un'esecuzione completa del bot non esce mai in rete.
+        """
+        length = int(request.headers.get('Content-Length') or 0)
+        body = request.rfile.read(length)
+        if not urlsplit(request.path).path.endswith('/sendMessage'):
+            return self._send(request, 404, b'{"ok": false}')
+        try:
+            message = json.loads(body or b'{}')
+        except ValueError:
+            message = {'raw': body.decode('utf-8', 'replace')}
+        with self._lock:
+            self._messages.append(message)
+        return self._send(request, 200, b'{"ok": true, "result": {}}', {'Content-Type': 'application/json'})
+
+    def _send(self, request: BaseHTTPRequestHandler, status: int, body: bytes,
+              headers: dict | None = None, truncate: bool = False):
+        # Una risposta troncata dichiara la lunghezza intera ma ne invia metà e chiude la connessione
+        sent = body[:len(body) // 2] if truncate else body
+        request.send_response(status)
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.send_header('Content-Length', str(len(body)))
+        if truncate:
+            request.send_header('Connection', 'close')
+        request.end_headers()
+        request.wfile.write(sent)
+        request.wfile.flush()
+        if truncate:
+            request.close_connection = True
+
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['bytes'] += len(sent)
+            self._stats['status'][status] = self._stats['status'].get(status, 0) + 1
+            self._stats['truncated'] += truncate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server locale che imita l'API EOD di EODHD.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--profile', choices=sorted(FAULT_PROFILES), default='clean')
+    parser.add_argument('--recorded', default=None, help="Cartella della cache locale da servire")
+    parser.add_argument('--rows', type=int, default=DEFAULT_ROWS, help="Barre dei ticker sintetici")
+    parser.add_argument('--latency', type=float, default=None)
+    parser.add_argument('--jitter', type=float, default=None)
+    parser.add_argument('--throttle-rate', type=float, default=None)
+    parser.add_argument('--error-rate', type=float, default=None)
+    parser.add_argument('--truncate-rate', type=float, default=None)
+    parser.add_argument('--quota-rps', type=float, default=None)
+    parser.add_argument('--retry-after', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    overrides = {name: getattr(args, name) for name in
+                 ('latency', 'jitter', 'throttle_rate', 'error_rate', 'truncate_rate', 'quota_rps', 'retry_after')
+                 if getattr(args, name) is not None}
+    server = EODHDStubServer.from_profile(args.profile, recorded_dir=args.recorded, rows=args.rows,
+                                          host=args.host, port=args.port, seed=args.seed, **overrides)
+    server.start()
+    print(f"Server EODHD locale in ascolto: {server.api_root} (profilo '{args.profile}')")
+    print(f"Per usarlo: EODHD_API_ROOT={server.api_root}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(f"Statistiche: {server.stats()}")
+
+
+if __name__ == '__main__':
+    main()
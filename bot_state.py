@@ -0,0 +1,182 @@
+# File: bot_state.py
+# Modulo per il progetto KriterionQuant Hedging App
+#
+# Checkpoint persistente del bot: ultima barra elaborata, stato della
+# copertura e stato "caldo" degli indicatori incrementali. L'esecuzione
+# giornaliera riprende da qui ed elabora solo le barre nuove, con lo
+# stesso risultato di una rielaborazione completa dello stesso storico.
+# Non dipende da pandas: è usato anche dal runtime snello del bot (signal_runtime.py).
+
+import json
+import math
+import os
+
+from hedge_engine import EXIT_NONE, EXIT_STOP_LOSS, EXIT_SIGNAL
+from online_indicators import OnlineSMA, OnlineADX
+
+
+class SignalCheckpoint:
+    """
+    Stato del segnale di copertura aggiornato una barra alla volta.
+
+    Gli indicatori seguono IndicatorCalculator (SMA su adj_close, ADX su
+    high/low/close) e la macchina a stati segue 'hedge_state_path': le barre
+    di warm-up aggiornano gli indicatori ma, come il dropna del bot, non
+    partecipano alla macchina a stati.
+    """
+    VERSION = 1
+
+    def __init__(self, ticker: str, fast_ma: int, slow_ma: int, adx_period: int,
+                 adx_threshold: float, stop_loss_perc: float):
+        self.ticker = ticker
+        self.fast_ma = fast_ma
+        self.slow_ma = slow_ma
+        self.adx_period = adx_period
+        self.adx_threshold = adx_threshold
+        self.stop_loss_perc = stop_loss_perc
+
+        self.fast = OnlineSMA(fast_ma)
+        self.slow = OnlineSMA(slow_ma)
+        self.adx = OnlineADX(adx_period)
+
+        self.last_date: str | None = None
+        self.last_close = math.nan
+        self.last_adx = math.nan
+        self.bars_processed = 0
+        self.in_position = False
+        self.entry_price = 0.0
+        self.entry_date: str | None = None
+        self.last_exit_reason = EXIT_NONE
+        self.last_exit_date: str | None = None
+
+    @property
+    def params(self) -> dict:
+        return {'ticker': self.ticker, 'fast_ma': self.fast_ma, 'slow_ma': self.slow_ma,
+                'adx_period': self.adx_period, 'adx_threshold': self.adx_threshold,
+                'stop_loss_perc': self.stop_loss_perc}
+
+    def update(self, date: str, high: float, low: float, close: float, adj_close: float) -> bool:
+        """
+        Elabora una barra.
+
+        Returns:
+            bool: True se la barra è passata dalla macchina a stati (indicatori e prezzi validi).
+        """
+        fast = self.fast.update(adj_close)
+        slow = self.slow.update(adj_close)
+        adx = self.adx.update(high, low, close)
+        self.last_date = date
+        self.bars_processed += 1
+
+        values = (high, low, close, adj_close, fast, slow, adx)
+        if any(v != v for v in values):
+            return False
+        self.last_close = adj_close
+        self.last_adx = adx
+
+        signal = fast < slow and adx > self.adx_threshold
+        # Stessa sequenza di _hedge_state_loop: prima lo Stop Loss, poi la fine del segnale
+        if self.in_position:
+            if adj_close > self.entry_price * (1 + self.stop_loss_perc):
+                self._exit(date, EXIT_STOP_LOSS)
+            elif not signal:
+                self._exit(date, EXIT_SIGNAL)
+        elif signal:
+            self.in_position = True
+            self.entry_price = adj_close
+            self.entry_date = date
+            self.last_exit_reason = EXIT_NONE
+        return True
+
+    def _exit(self, date: str, reason: int):
+        self.in_position = False
+        self.entry_price = 0.0
+        self.entry_date = None
+        self.last_exit_reason = reason
+        self.last_exit_date = date
+
+    def process_bars(self, dates: list[str], high, low, close, adj_close) -> int:
+        """
+        Elabora, in ordine, le barre successive all'ultima già elaborata.
+
+        Args:
+            dates (list[str]): Date delle barre ('YYYY-MM-DD'), crescenti.
+            high, low, close, adj_close: Sequenze di prezzi allineate a 'dates'.
+
+        Returns:
+            int: Numero di barre nuove elaborate.
+        """
+        processed = 0
+        for date, h, l, c, a in zip(dates, high, low, close, adj_close):
+            if self.last_date is not None and date <= self.last_date:
+                continue
+            self.update(date, float(h), float(l), float(c), float(a))
+            processed += 1
+        return processed
+
+    def process(self, df) -> int:
+        """
+        Come 'process_bars', a partire da un DataFrame OHLCV come restituito da EODHDClient.
+        """
+        return self.process_bars(list(df.index.strftime('%Y-%m-%d')),
+                                 *(df[c].to_numpy(dtype=float) for c in ('high', 'low', 'close', 'adj_close')))
+
+    def to_dict(self) -> dict:
+        return {
+            'version': self.VERSION, 'params': self.params,
+            'last_date': self.last_date, 'last_close': self.last_close, 'last_adx': self.last_adx,
+            'bars_processed': self.bars_processed, 'in_position': self.in_position,
+            'entry_price': self.entry_price, 'entry_date': self.entry_date,
+            'last_exit_reason': self.last_exit_reason, 'last_exit_date': self.last_exit_date,
+            'indicators': {'fast': self.fast.to_dict(), 'slow': self.slow.to_dict(), 'adx': self.adx.to_dict()},
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> 'SignalCheckpoint':
+        obj = cls(**state['params'])
+        for name in ('last_date', 'last_close', 'last_adx', 'bars_processed', 'in_position',
+                     'entry_price', 'entry_date', 'last_exit_reason', 'last_exit_date'):
+            setattr(obj, name, state[name])
+        obj.fast = OnlineSMA.from_dict(state['indicators']['fast'])
+        obj.slow = OnlineSMA.from_dict(state['indicators']['slow'])
+        obj.adx = OnlineADX.from_dict(state['indicators']['adx'])
+        return obj
+
+    def save(self, path: str):
+        """Salva il checkpoint in JSON (scrittura atomica: un'interruzione non lo corrompe)."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, **params) -> 'SignalCheckpoint | None':
+        """
+        Legge il checkpoint salvato.
+
+        Args:
+            path (str): File del checkpoint.
+            **params: Parametri correnti della strategia: se differiscono da quelli
+                salvati il checkpoint non è più valido.
+
+        Returns:
+            SignalCheckpoint | None: Il checkpoint, o None se assente, illeggibile o superato.
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                state = json.load(f)
+            if state.get('version') != cls.VERSION:
+                print("Checkpoint di una versione precedente: verrà ricostruito.")
+                return None
+            if params and state['params'] != params:
+                print("Parametri della strategia cambiati: il checkpoint verrà ricostruito.")
+                return None
+            return cls.from_dict(state)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Checkpoint illeggibile ({path}), verrà ricostruito: {e}")
+            return None
@@ -1,15 +1,48 @@
 # btc_bot_runner.py
 # VERSIONE CORRETTA: Legge Stop Loss (Default 0.05) e usa simulazione storica.
+# Lo stato della strategia è salvato in un checkpoint: ogni esecuzione elabora solo le candele nuove.
+# Con --runtime lean il bot usa solo NumPy e requests (requirements-bot.txt): pandas non viene importato.
 
+import argparse
 import configparser
-from datetime import datetime, timedelta
-import pandas as pd
+import os
+from datetime import datetime, timedelta, timezone
 
-from data_handler import EODHDClient
-from indicator_calculator import IndicatorCalculator
-from telegram_notifier import send_telegram_message
+import instrumentation
+import signal_runtime
+from bot_state import SignalCheckpoint
+from notification_dispatcher import NotificationDispatcher
+from hedge_engine import EXIT_STOP_LOSS, EXIT_SIGNAL
 
-def generate_btc_signal():
+# Cartella della cache locale dei prezzi (persistita tra le esecuzioni dalla GitHub Action)
+DATA_CACHE_DIR = "data_cache"
+
+# Cartella di coda e ultimo stato delle notifiche (persistita come la cache dei prezzi)
+NOTIFICATION_STATE_DIR = "notification_state"
+
+# Cartella dei checkpoint del segnale (persistita come la cache dei prezzi)
+BOT_STATE_DIR = "bot_state"
+
+# Giorni di storico elaborati al primo avvio per riscaldare indicatori e stato
+BOOTSTRAP_DAYS = 500
+
+# Testo del motivo di uscita riportato nel messaggio Telegram
+EXIT_REASON_LABELS = {EXIT_STOP_LOSS: "Stop Loss Scattato", EXIT_SIGNAL: "Segnale Terminato"}
+
+def fetch_bars(runtime: str, api_key: str, ticker: str, start_date: str) -> dict | None:
+    """
+    Barre da start_date a oggi nel formato di signal_runtime.fetch_bars.
+    'pandas' passa da EODHDClient e dalla cache Parquet, 'lean' scarica e converte
+    direttamente in array NumPy: le barre risultanti sono le stesse.
+    """
+    if runtime == 'lean':
+        return signal_runtime.fetch_bars(api_key, ticker, start_date, datetime.now().strftime('%Y-%m-%d'))
+    # Import locale: il runtime snello non deve caricare pandas
+    from data_handler import EODHDClient
+    data_df = EODHDClient(cache_dir=DATA_CACHE_DIR).get_historical_data(api_key, ticker, start_date)
+    return None if data_df is None else signal_runtime.bars_from_frame(data_df)
+
+def generate_btc_signal(rebuild: bool = False, runtime: str = 'pandas'):
     print("Avvio processo di generazione segnale BTC (Logic-Consistent)...")
     
     config = configparser.ConfigParser()
@@ -17,7 +50,12 @@ def generate_btc_signal():
 
     api_key = config.get('EODHD', 'api_key')
     bot_token = config.get('TELEGRAM', 'bot_token')
-    chat_id = config.get('TELEGRAM', 'chat_id')
+    # Una o più chat separate da virgola
+    chat_ids = [c.strip() for c in config.get('TELEGRAM', 'chat_id').split(',') if c.strip()]
+    # Di default il messaggio parte solo quando lo stato della copertura cambia
+    suppress_unchanged = config.getboolean('TELEGRAM', 'suppress_unchanged', fallback=True)
+    dispatcher = NotificationDispatcher(bot_token, state_dir=NOTIFICATION_STATE_DIR,
+                                        digest=config.getboolean('TELEGRAM', 'daily_digest', fallback=False))
     
     ticker = config.get('STRATEGY', 'ticker')
     fast_ma = config.getint('STRATEGY', 'fast_ma')
@@ -31,59 +69,62 @@ def generate_btc_signal():
     else:
         stop_loss_perc = 0.05 # <--- DEFAULT AGGIORNATO A 0.05
 
-    print(f"Recupero dati per {ticker}...")
+    # Il checkpoint vale solo per gli stessi ticker e parametri
+    params = {'ticker': ticker, 'fast_ma': fast_ma, 'slow_ma': slow_ma, 'adx_period': adx_period,
+              'adx_threshold': adx_threshold, 'stop_loss_perc': stop_loss_perc}
+    checkpoint_path = os.path.join(BOT_STATE_DIR, f"{ticker.replace('/', '_')}.json")
+    checkpoint = None if rebuild else SignalCheckpoint.load(checkpoint_path, **params)
+
+    # Elaboriamo solo candele chiuse: l'ultima è quella di ieri (UTC)
+    last_closed = (datetime.now(timezone.utc) - timedelta(days=1)).strftime('%Y-%m-%d')
+    if checkpoint is not None and checkpoint.last_date >= last_closed:
+        print(f"Nessuna nuova candela dopo il {checkpoint.last_date}: niente da fare.")
+        return
+
+    if checkpoint is None:
+        # Primo avvio (o parametri cambiati): ricostruiamo lo stato sulla finestra storica
+        checkpoint = SignalCheckpoint(**params)
+        start_date = (datetime.now() - timedelta(days=BOOTSTRAP_DAYS)).strftime('%Y-%m-%d')
+    else:
+        next_day = datetime.strptime(checkpoint.last_date, '%Y-%m-%d') + timedelta(days=1)
+        start_date = next_day.strftime('%Y-%m-%d')
+
+    print(f"Recupero dati per {ticker} dal {start_date}...")
     try:
-        client = EODHDClient()
-        start_date = (datetime.now() - timedelta(days=500)).strftime('%Y-%m-%d')
-        data_df = client.get_historical_data(api_key, ticker, start_date)
-        if data_df is None or data_df.empty:
+        bars = fetch_bars(runtime, api_key, ticker, start_date)
+        if bars is None:
             raise ValueError("Dati scaricati vuoti.")
     except Exception as e:
         error_msg = f"ERRORE CRITICO {ticker}: {e}"
         print(error_msg)
-        send_telegram_message(error_msg, bot_token, chat_id)
+        dispatcher.dispatch([{'chat_id': c, 'text': error_msg} for c in chat_ids])
         return
 
-    print("Calcolo indicatori...")
-    calc = IndicatorCalculator()
-    data_df = calc.add_moving_average(data_df, period=fast_ma)
-    data_df = calc.add_moving_average(data_df, period=slow_ma)
-    data_df = calc.add_adx(data_df, period=adx_period)
-    data_df.dropna(inplace=True)
-
-    # --- SIMULAZIONE PER DETERMINARE STATO REALE ---
-    in_position = False
-    entry_price = 0.0
-    exit_reason = ""
-    
-    col_fast = f"sma_{fast_ma}"
-    col_slow = f"sma_{slow_ma}"
-    col_adx = f"ADX_{adx_period}"
-
-    signal_condition_series = (data_df[col_fast] < data_df[col_slow]) & \
-                              (data_df[col_adx] > adx_threshold)
+    bars = signal_runtime.bars_until(bars, last_closed)
+    if checkpoint.bars_processed == 0 and not bars['dates']:
+        error_msg = f"ERRORE CRITICO {ticker}: Dati scaricati vuoti."
+        print(error_msg)
+        dispatcher.dispatch([{'chat_id': c, 'text': error_msg} for c in chat_ids])
+        return
 
-    for i in range(len(data_df)):
-        current_price = data_df['adj_close'].iloc[i]
-        is_signal = signal_condition_series.iloc[i]
+    # --- AGGIORNAMENTO INCREMENTALE DI INDICATORI E STATO ---
+    with instrumentation.span('bot.process_bars', ticker=ticker) as span:
+        new_bars = checkpoint.process_bars(bars['dates'], bars['high'], bars['low'],
+                                           bars['close'], bars['adj_close'])
+        span.set(rows=new_bars)
+    if new_bars == 0:
+        print(f"Nessuna nuova candela dopo il {checkpoint.last_date}: niente da fare.")
+        return
+    print(f"Elaborate {new_bars} nuove candele (fino al {checkpoint.last_date}).")
+    checkpoint.save(checkpoint_path)
 
-        if is_signal and not in_position:
-            in_position = True
-            entry_price = current_price
-            exit_reason = ""
-        
-        elif in_position:
-            if current_price > entry_price * (1 + stop_loss_perc):
-                in_position = False
-                exit_reason = "Stop Loss Scattato"
-            elif not is_signal:
-                in_position = False
-                exit_reason = "Segnale Terminato"
+    in_position = checkpoint.in_position
+    entry_price = checkpoint.entry_price
+    exit_reason = EXIT_REASON_LABELS.get(checkpoint.last_exit_reason, "")
 
     # --- FORMATTAZIONE MESSAGGIO ---
-    last_row = data_df.iloc[-1]
-    current_date = last_row.name.strftime('%Y-%m-%d')
-    current_close = last_row['adj_close']
+    current_date = checkpoint.last_date
+    current_close = checkpoint.last_close
     
     if in_position:
         status_header = "🟢 COPERTURA ATTIVA"
@@ -107,12 +148,44 @@ def generate_btc_signal():
         f"📅 Data: {current_date}\n"
         f"📊 Stato: **{status_header}**\n\n"
         f"{detail_text}\n\n"
-        f"⚙️ _ADX: {last_row[col_adx]:.1f} | SL: {stop_loss_perc*100:.0f}%_"
+        f"⚙️ _ADX: {checkpoint.last_adx:.1f} | SL: {stop_loss_perc*100:.0f}%_"
     )
     
+    # Stato della strategia: un nuovo messaggio solo se cambia (entrata, uscita o motivo)
+    if in_position:
+        state = f"hedged:{checkpoint.entry_date}"
+    elif checkpoint.last_exit_date:
+        state = f"flat:{checkpoint.last_exit_reason}:{checkpoint.last_exit_date}"
+    else:
+        state = "flat"
+
     print("\n--- Invio Notifica Telegram ---")
     print(message)
-    send_telegram_message(message, bot_token, chat_id)
+    dispatcher.dispatch([{'chat_id': c, 'text': message, 'strategy': ticker,
+                          'state': state if suppress_unchanged else None} for c in chat_ids])
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera e invia il segnale di copertura BTC.")
+    parser.add_argument('--report', default=None,
+                        help="File JSON in cui salvare tempi e metriche delle fasi dell'esecuzione")
+    parser.add_argument('--profile', default=None,
+                        help="File in cui salvare il profilo cProfile dell'esecuzione")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="Ignora il checkpoint e ricostruisce lo stato dalla finestra storica")
+    parser.add_argument('--runtime', choices=['pandas', 'lean'], default='pandas',
+                        help="'lean' usa solo NumPy e requests, per un avvio più rapido")
+    args = parser.parse_args()
+
+    if args.report:
+        instrumentation.enable()
+    try:
+        with instrumentation.profiled(args.profile):
+            with instrumentation.span('bot.run'):
+                generate_btc_signal(rebuild=args.rebuild, runtime=args.runtime)
+    finally:
+        # Il report viene scritto anche se l'esecuzione termina con un errore
+        if args.report:
+            instrumentation.write_report(args.report)
 
 if __name__ == '__main__':
-    generate_btc_signal()
+    main()
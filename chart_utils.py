@@ -0,0 +1,227 @@
+# File: chart_utils.py
+# Modulo per il progetto KriterionQuant Hedging App
+#
+# Costruzione delle tracce Plotly per serie lunghe (storico dal 2017, barre orarie):
+# downsampling che preserva la forma (LTTB o min-max) calcolato sulla finestra
+# visibile, con meno punti di contesto fuori finestra, e passaggio a Scattergl
+# (WebGL) sopra una soglia di punti. I marker dei trade non vengono mai ridotti.
+# Il numero di punti inviati al browser resta limitato qualunque sia la lunghezza dello storico.
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+# Sopra questo numero di punti sorgente una traccia viene disegnata in WebGL
+WEBGL_THRESHOLD = 5_000
+
+# Punti per traccia nella finestra visibile e in ciascun lato fuori finestra
+MAX_POINTS = 2_000
+CONTEXT_POINTS = 300
+
+
+def _is_datetime(x) -> bool:
+    return pd.api.types.is_datetime64_any_dtype(getattr(x, 'dtype', None) or np.asarray(x).dtype)
+
+
+def _as_float(x) -> np.ndarray:
+    """Asse x come float64 (le date diventano nanosecondi) per il calcolo delle aree."""
+    if _is_datetime(x):
+        return pd.DatetimeIndex(x).as_unit('ns').asi8.astype(np.float64)
+    return np.asarray(x, dtype=np.float64)
+
+
+def _bound(x, value) -> float:
+    """Estremo della finestra visibile nella stessa unità di '_as_float(x)'."""
+    if _is_datetime(x):
+        return float(pd.Timestamp(value).as_unit('ns').value)
+    return float(value)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: per ogni bucket sceglie il punto che forma il
+    triangolo di area massima con il punto scelto nel bucket precedente e la media
+    del bucket successivo. Primo e ultimo punto sono sempre inclusi.
+
+    Args:
+        x (np.ndarray): Ascisse crescenti (float).
+        y (np.ndarray): Ordinate senza NaN.
+        n_out (int): Numero di punti da restituire.
+
+    Returns:
+        np.ndarray: Indici crescenti dei punti scelti.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    every = (n - 2) / (n_out - 2)
+    edges = (np.arange(n_out - 1) * every).astype(np.int64) + 1
+    edges[-1] = n - 1
+    # Medie di ogni bucket calcolate in un colpo solo; l'ultimo "bucket" è l'ultimo punto
+    bounds = np.append(edges, n)
+    sizes = np.diff(bounds)
+    avg_x = np.add.reduceat(x, edges) / sizes
+    avg_y = np.add.reduceat(y, edges) / sizes
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        area = np.abs((x[a] - avg_x[i + 1]) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (avg_y[i + 1] - y[a]))
+        a = start + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Min-max: divide la serie in n_out/2 bucket di pari numerosità e conserva il
+    minimo e il massimo di ciascuno (oltre a primo e ultimo punto). Preserva
+    esattamente i picchi, utile per prezzi molto volatili.
+
+    Returns:
+        np.ndarray: Indici crescenti dei punti scelti.
+    """
+    n = len(y)
+    n_buckets = max(n_out // 2, 1)
+    if n_out >= n:
+        return np.arange(n)
+    bucket = np.arange(n) * n_buckets // n
+    # Ordinando per (bucket, y) il primo elemento di ogni bucket è il minimo e l'ultimo il massimo
+    order = np.lexsort((y, bucket))
+    starts = np.searchsorted(bucket[order], np.arange(n_buckets))
+    ends = np.append(starts[1:], n) - 1
+    return np.unique(np.concatenate(([0, n - 1], order[starts], order[ends])))
+
+
+def downsample_indices(x, y, n_out: int, method: str = 'lttb') -> np.ndarray:
+    """
+    Indici dei punti da disegnare, calcolati sui soli valori finiti.
+
+    Args:
+        x: Ascisse (date o numeri), crescenti.
+        y: Ordinate.
+        n_out (int): Punti desiderati.
+        method (str): 'lttb' o 'minmax'.
+
+    Returns:
+        np.ndarray: Indici crescenti rispetto agli array originali.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    valid = np.flatnonzero(np.isfinite(y))
+    if len(valid) <= n_out:
+        return valid
+    if method == 'minmax':
+        chosen = minmax_indices(y[valid], n_out)
+    elif method == 'lttb':
+        chosen = lttb_indices(_as_float(x)[valid], y[valid], n_out)
+    else:
+        raise ValueError(f"Metodo di downsampling non supportato: {method}")
+    return valid[chosen]
+
+
+def window_indices(x, y, x_range=None, max_points: int = MAX_POINTS,
+                   context_points: int = CONTEXT_POINTS, method: str = 'lttb', keep=None) -> np.ndarray:
+    """
+    Downsampling per finestra visibile: 'max_points' dentro 'x_range', 'context_points'
+    per lato fuori finestra (così uno spostamento non lascia il grafico vuoto).
+
+    Args:
+        x: Ascisse crescenti.
+        y: Ordinate.
+        x_range (tuple, optional): (inizio, fine) della finestra visibile; None = tutta la serie.
+        max_points (int): Punti nella finestra visibile.
+        context_points (int): Punti per lato fuori finestra.
+        method (str): 'lttb' o 'minmax'.
+        keep (array-like, optional): Indici da includere sempre (es. le barre dei trade).
+
+    Returns:
+        np.ndarray: Indici crescenti dei punti da disegnare.
+    """
+    n = len(y)
+    y = np.asarray(y, dtype=np.float64)
+    if x_range is None:
+        parts = [downsample_indices(x, y, max_points, method)]
+    else:
+        values = _as_float(x)
+        lo = int(np.searchsorted(values, _bound(x, x_range[0]), side='left'))
+        hi = int(np.searchsorted(values, _bound(x, x_range[1]), side='right'))
+        # Un punto oltre ciascun bordo: la linea arriva fino al margine del grafico
+        lo, hi = max(lo - 1, 0), min(hi + 1, n)
+        parts = [downsample_indices(values[:lo], y[:lo], context_points, method),
+                 lo + downsample_indices(values[lo:hi], y[lo:hi], max_points, method),
+                 hi + downsample_indices(values[hi:], y[hi:], context_points, method)]
+    if keep is not None:
+        keep = np.asarray(keep, dtype=np.int64)
+        parts.append(keep[(keep >= 0) & (keep < n)])
+    return np.unique(np.concatenate(parts))
+
+
+def use_webgl(n_points: int) -> bool:
+    return n_points > WEBGL_THRESHOLD
+
+
+def line_trace(x, y, name: str, x_range=None, max_points: int = MAX_POINTS, method: str = 'lttb',
+               keep=None, webgl: bool | None = None, **kwargs):
+    """
+    Traccia a linee ridotta per la finestra visibile.
+
+    Args:
+        x: Ascisse (tipicamente un DatetimeIndex).
+        y: Valori della serie.
+        name (str): Nome in legenda.
+        x_range (tuple, optional): Finestra visibile (vedi 'window_indices').
+        max_points (int): Punti nella finestra visibile.
+        method (str): 'lttb' o 'minmax'.
+        keep (array-like, optional): Indici da includere sempre.
+        webgl (bool, optional): Forza Scattergl/Scatter; di default dipende dalla lunghezza di 'x'.
+        **kwargs: Altri attributi della traccia (line, marker, ...).
+
+    Returns:
+        go.Scatter | go.Scattergl: La traccia.
+    """
+    idx = window_indices(x, y, x_range, max_points, method=method, keep=keep)
+    trace_type = go.Scattergl if (use_webgl(len(y)) if webgl is None else webgl) else go.Scatter
+    x_points = x[idx] if isinstance(x, pd.Index) else np.asarray(x)[idx]
+    return trace_type(x=x_points, y=np.asarray(y, dtype=np.float64)[idx], mode='lines', name=name, **kwargs)
+
+
+def marker_trace(x, y, name: str, webgl: bool = False, **kwargs):
+    """Traccia di marker (trade) disegnata senza alcuna riduzione."""
+    trace_type = go.Scattergl if webgl else go.Scatter
+    return trace_type(x=x, y=y, mode='markers', name=name, **kwargs)
+
+
+def apply_range(fig: go.Figure, x_range=None, selectable: bool = False) -> go.Figure:
+    """
+    Imposta la finestra visibile e, se 'selectable', la selezione orizzontale
+    come trascinamento predefinito (la selezione è l'evento che richiede il ricampionamento).
+    """
+    if x_range is not None:
+        fig.update_xaxes(range=[str(x_range[0]), str(x_range[1])])
+    if selectable:
+        fig.update_layout(dragmode='select', selectdirection='h')
+    return fig
+
+
+def range_from_selection(event) -> tuple[str, str] | None:
+    """
+    Finestra (inizio, fine) da un evento di selezione a riquadro di st.plotly_chart.
+
+    Returns:
+        tuple[str, str] | None: Estremi come stringhe ISO, o None se non c'è selezione.
+    """
+    try:
+        boxes = event['selection']['box']
+    except (KeyError, TypeError, AttributeError):
+        return None
+    if not boxes or len(boxes[-1].get('x', [])) < 2:
+        return None
+    start, end = sorted(pd.Timestamp(v) for v in boxes[-1]['x'][:2])
+    return start.isoformat(), end.isoformat()
+
+
+def figure_points(fig: go.Figure) -> int:
+    """Numero totale di punti inviati al browser (per verificare che il payload resti limitato)."""
+    return sum(len(trace.x) for trace in fig.data if trace.x is not None)
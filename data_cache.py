@@ -0,0 +1,96 @@
+# File: data_cache.py
+# Modulo per il progetto KriterionQuant Hedging App
+
+import os
+import json
+import pandas as pd
+
+# Parquet richiede pyarrow: se non è installato ripieghiamo sul formato pickle di pandas
+try:
+    import pyarrow  # noqa: F401
+    _PARQUET_AVAILABLE = True
+except ImportError:
+    _PARQUET_AVAILABLE = False
+
+
+class LocalOHLCVCache:
+    """
+    Archivio locale colonnare dei dati OHLCV, un file per ticker.
+
+    Ogni ticker è salvato in un file Parquet (o pickle se pyarrow non è
+    disponibile) accompagnato da un piccolo file JSON di metadati che
+    ricorda da quale data in poi lo storico è completo.
+    """
+    def __init__(self, cache_dir: str = 'data_cache'):
+        """
+        Args:
+            cache_dir (str): La cartella in cui salvare i file della cache.
+        """
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _base_path(self, key: str) -> str:
+        safe_key = key.replace('/', '_').replace('\\', '_')
+        return os.path.join(self.cache_dir, safe_key)
+
+    def _data_path(self, key: str) -> str:
+        extension = 'parquet' if _PARQUET_AVAILABLE else 'pkl'
+        return f"{self._base_path(key)}.{extension}"
+
+    def _meta_path(self, key: str) -> str:
+        return f"{self._base_path(key)}.json"
+
+    def load(self, key: str) -> pd.DataFrame | None:
+        """Legge lo storico salvato per un ticker, o None se assente."""
+        path = self._data_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            if _PARQUET_AVAILABLE:
+                return pd.read_parquet(path)
+            return pd.read_pickle(path)
+        except Exception as e:
+            print(f"Cache illeggibile per {key}, verrà ricostruita: {e}")
+            return None
+
+    def covered_from(self, key: str) -> str | None:
+        """Restituisce la data ('YYYY-MM-DD') da cui lo storico salvato è completo."""
+        path = self._meta_path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f).get('covered_from')
+
+    def save(self, key: str, df: pd.DataFrame, covered_from: str):
+        """Sovrascrive lo storico salvato per un ticker in modo atomico."""
+        path = self._data_path(key)
+        tmp_path = f"{path}.tmp"
+        if _PARQUET_AVAILABLE:
+            df.to_parquet(tmp_path)
+        else:
+            df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+
+        with open(self._meta_path(key), 'w') as f:
+            json.dump({'covered_from': covered_from}, f)
+
+    def merge(self, key: str, new_df: pd.DataFrame, covered_from: str) -> pd.DataFrame:
+        """
+        Unisce nuove barre a quelle salvate e persiste il risultato.
+        In caso di date duplicate prevale la barra appena scaricata.
+        """
+        stored = self.load(key)
+        if stored is not None and not stored.empty and new_df.empty:
+            merged = stored
+        elif stored is not None and not stored.empty:
+            merged = pd.concat([stored, new_df])
+            merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+        else:
+            merged = new_df.sort_index()
+
+        previous_from = self.covered_from(key)
+        if previous_from is not None:
+            covered_from = min(covered_from, previous_from)
+
+        self.save(key, merged, covered_from)
+        return merged
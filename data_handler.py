@@ -1,18 +1,130 @@
 # File: data_handler.py
 # Modulo per il progetto KriterionQuant Hedging App
 
+import io
+import os
+import numpy as np
 import pandas as pd
 import requests
+import threading
 import time
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import instrumentation
+from data_cache import LocalOHLCVCache
+
+
+class RateLimiter:
+    """
+    Token bucket thread-safe: consente raffiche fino a 'capacity' richieste
+    e poi un ritmo medio di 'rate' richieste al secondo.
+    """
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocca il chiamante finché non è disponibile un token."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
 
 class EODHDClient:
     """
     Gestisce tutte le comunicazioni con l'API EODHD per il recupero
     dei dati storici.
     """
-    BASE_URL = "https://eodhd.com/api/eod/"
+    API_ROOT = "https://eodhd.com/api/"
+    BASE_URL = API_ROOT + "eod/"
+    INTRADAY_URL = API_ROOT + "intraday/"
+
+    # Ampiezza massima (in giorni) di una singola richiesta intraday per intervallo, secondo i limiti EODHD
+    INTRADAY_MAX_DAYS = {'1m': 120, '5m': 600, '1h': 7200}
+
+    # Tipi compatti delle barre intraday: prezzi float32, volumi interi
+    INTRADAY_DTYPES = {'open': np.float32, 'high': np.float32, 'low': np.float32,
+                       'close': np.float32, 'adj_close': np.float32, 'volume': np.int64}
+
+    # Timeout (connessione, lettura) in secondi per ogni richiesta
+    TIMEOUT = (5, 30)
 
+    # Errori nella lettura del corpo (risposta troncata, compressione corrotta): l'adapter
+    # ritenta solo connessioni e codici di stato, questi sono ritentati da '_get'
+    BODY_ERRORS = (requests.exceptions.ChunkedEncodingError, requests.exceptions.ContentDecodingError)
+
+    def __init__(self, cache_dir: str | None = None, requests_per_second: float = 10.0,
+                 max_retries: int = 5, pool_size: int = 16, backoff_factor: float = 0.5,
+                 api_root: str | None = None):
+        """
+        Args:
+            cache_dir (str, optional): Se indicata, lo storico scaricato viene salvato
+                in questa cartella e le chiamate successive scaricano solo le barre nuove.
+            requests_per_second (float): Ritmo massimo di richieste verso EODHD (quota API).
+            max_retries (int): Numero massimo di tentativi su errori 429/5xx e risposte
+                troncate, con backoff esponenziale.
+            pool_size (int): Numero di connessioni HTTP mantenute aperte e riutilizzate.
+            backoff_factor (float): Fattore del backoff esponenziale tra i tentativi.
+            api_root (str, optional): Radice alternativa dell'API (es. il server locale di
+                benchmarks/stub_server.py). Se assente si usa la variabile d'ambiente
+                EODHD_API_ROOT e, in mancanza, l'API reale.
+        """
+        api_root = api_root or os.environ.get('EODHD_API_ROOT') or self.API_ROOT
+        api_root = api_root.rstrip('/') + '/'
+        self.eod_url = f"{api_root}eod/"
+        self.intraday_url = f"{api_root}intraday/"
+        self.cache = LocalOHLCVCache(cache_dir) if cache_dir else None
+        self.rate_limiter = RateLimiter(rate=requests_per_second, capacity=max(1, int(requests_per_second)))
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=True
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get_many(self, api_key: str, tickers: list[str], start_date: str,
+                 max_workers: int = 8) -> dict[str, pd.DataFrame | None]:
+        """
+        Recupera in parallelo i dati storici giornalieri di più ticker.
+
+        Args:
+            api_key (str): La tua chiave API per EODHD.
+            tickers (list[str]): I ticker da scaricare (es. ['BTC-USD.CC', 'ETH-USD.CC']).
+            start_date (str): La data di inizio in formato 'YYYY-MM-DD'.
+            max_workers (int): Numero massimo di download contemporanei.
+
+        Returns:
+            dict[str, pd.DataFrame | None]: Un DataFrame OHLCV (o None in caso di errore) per ticker.
+        """
+        unique_tickers = list(dict.fromkeys(tickers))
+        workers = max(1, min(max_workers, self.pool_size, len(unique_tickers)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            frames = executor.map(lambda t: self.get_historical_data(api_key, t, start_date), unique_tickers)
+            return dict(zip(unique_tickers, frames))
+
+    @instrumentation.instrumented('eodhd.get_historical_data')
     def get_historical_data(self, api_key: str, ticker: str, start_date: str) -> pd.DataFrame | None:
         """
         Recupera i dati storici giornalieri per un dato ticker.
@@ -25,9 +137,203 @@ class EODHDClient:
         Returns:
             pd.DataFrame | None: Un DataFrame pandas con dati OHLCV o None in caso di errore.
         """
-        endpoint = f"{self.BASE_URL}{ticker}"
+        return self._fetch_with_cache(
+            ticker, start_date, lambda start, end: self._download(api_key, ticker, start, end)
+        )
+
+    def get_intraday_data(self, api_key: str, ticker: str, start_date: str, interval: str = '1h',
+                          max_workers: int = 4) -> pd.DataFrame | None:
+        """
+        Recupera le barre intraday (1m, 5m, 1h) per un dato ticker.
+
+        L'intervallo richiesto viene diviso in finestre della massima ampiezza
+        consentita da EODHD, scaricate in parallelo e unite eliminando le
+        sovrapposizioni. Le colonne sono le stesse dei dati giornalieri (quindi
+        utilizzabili da IndicatorCalculator ed EventDrivenBacktester) ma in tipi
+        compatti: prezzi float32 e volumi int64.
+
+        Args:
+            api_key (str): La tua chiave API per EODHD.
+            ticker (str): Il ticker da scaricare (es. 'BTC-USD.CC').
+            start_date (str): La data di inizio in formato 'YYYY-MM-DD'.
+            interval (str): '1m', '5m' oppure '1h'.
+            max_workers (int): Numero massimo di finestre scaricate contemporaneamente
+                (limita anche la memoria occupata dalle risposte JSON in transito).
+
+        Returns:
+            pd.DataFrame | None: Barre OHLCV con indice temporale UTC o None in caso di errore.
+        """
+        if interval not in self.INTRADAY_MAX_DAYS:
+            print(f"Intervallo intraday non supportato: {interval}")
+            return None
+        df = self._fetch_with_cache(
+            f"{ticker}@{interval}", start_date,
+            lambda start, end: self._download_intraday(api_key, ticker, interval, start, end, max_workers)
+        )
+        # Download e cache usano orari UTC senza fuso (come le date dei dati giornalieri):
+        # il fuso viene dichiarato solo sul risultato
+        if df is not None:
+            df.index = df.index.tz_localize('UTC')
+        return df
+
+    def _fetch_with_cache(self, key: str, start_date: str, fetch) -> pd.DataFrame | None:
+        """
+        Logica comune di giornaliero e intraday: senza cache scarica tutto, con la
+        cache scarica solo la parte iniziale mancante e le barre successive all'ultima salvata.
+
+        Args:
+            key (str): Chiave della cache (ticker, più l'intervallo per l'intraday).
+            start_date (str): La data di inizio in formato 'YYYY-MM-DD'.
+            fetch (callable): fetch(start, end) -> DataFrame | None, con date 'YYYY-MM-DD' incluse:
+                un DataFrame vuoto se l'API non ha barre nell'intervallo, None se la richiesta è fallita.
+        """
         end_date = datetime.now().strftime('%Y-%m-%d')
-        
+        if self.cache is None:
+            df = fetch(start_date, end_date)
+            return None if df is None or df.empty else df
+
+        stored = self.cache.load(key)
+        covered_from = self.cache.covered_from(key)
+        instrumentation.annotate(cache_rows=0 if stored is None else len(stored))
+
+        if stored is None or stored.empty or covered_from is None:
+            # Primo accesso: scarichiamo l'intero intervallo e lo salviamo
+            df = fetch(start_date, end_date)
+            if df is None or df.empty:
+                return None
+            stored = self.cache.merge(key, df, start_date)
+        else:
+            if start_date < covered_from:
+                # Richiesto uno storico più lungo di quello salvato: scarichiamo solo la parte mancante
+                head_end = (pd.Timestamp(covered_from) - timedelta(days=1)).strftime('%Y-%m-%d')
+                head_df = fetch(start_date, head_end)
+                if head_df is not None:
+                    # Anche una risposta vuota (es. ticker quotato dopo start_date) estende la copertura:
+                    # la stessa richiesta non viene ripetuta alle chiamate successive
+                    stored = self.cache.merge(key, head_df, start_date)
+                else:
+                    print(f"Download dello storico iniziale non riuscito per {key}: "
+                          f"i dati restituiti iniziano dal {covered_from} invece che dal {start_date}.")
+
+            # Aggiornamento incrementale: riscarichiamo dall'ultima data salvata (inclusa),
+            # perché l'ultima candela potrebbe essere stata salvata mentre era ancora in formazione
+            last_date = stored.index[-1].strftime('%Y-%m-%d')
+            tail_df = fetch(last_date, end_date)
+            if tail_df is not None:
+                stored = self.cache.merge(key, tail_df, covered_from)
+            else:
+                print(f"Aggiornamento non riuscito per {key}: uso i dati in cache fino al {last_date}.")
+
+        return stored.loc[pd.Timestamp(start_date):].copy()
+
+    def _download_intraday(self, api_key: str, ticker: str, interval: str, start_date: str,
+                           end_date: str, max_workers: int) -> pd.DataFrame | None:
+        """Scarica le barre intraday tra start_date e end_date (inclusi), a finestre parallele."""
+        start_ts = int(pd.Timestamp(start_date, tz='UTC').timestamp())
+        # Fine del giorno end_date inclusa
+        end_ts = int((pd.Timestamp(end_date, tz='UTC') + timedelta(days=1)).timestamp()) - 1
+        step = self.INTRADAY_MAX_DAYS[interval] * 86400
+        windows = [(lo, min(lo + step - 1, end_ts)) for lo in range(start_ts, end_ts + 1, step)]
+
+        workers = max(1, min(max_workers, self.pool_size, len(windows)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            chunks = list(executor.map(
+                lambda w: self._download_intraday_window(api_key, ticker, interval, *w), windows))
+
+        if any(chunk is None for chunk in chunks):
+            # Una finestra fallita lascerebbe un buco nello storico: meglio non restituire dati parziali
+            print(f"Download intraday incompleto per {ticker} ({interval}).")
+            return None
+        frames = [chunk for chunk in chunks if not chunk.empty]
+        if not frames:
+            print(f"Nessun dato intraday per {ticker} ({interval}).")
+            return chunks[0]
+
+        df = pd.concat(frames)
+        # Finestre contigue possono condividere la barra di confine
+        df = df[~df.index.duplicated(keep='last')].sort_index()
+        print(f"Dati intraday per {ticker} ({interval}) scaricati con successo: {len(df)} righe.")
+        return df
+
+    def _download_intraday_window(self, api_key: str, ticker: str, interval: str,
+                                  from_ts: int, to_ts: int) -> pd.DataFrame | None:
+        """
+        Scarica una singola finestra intraday in formato CSV: il parser di pandas
+        la converte direttamente nei tipi compatti, senza creare un oggetto Python per barra.
+        """
+        endpoint = f"{self.intraday_url}{ticker}"
+        params = {
+            "api_token": api_key,
+            "interval": interval,
+            "from": from_ts,
+            "to": to_ts,
+            "fmt": "csv"
+        }
+
+        try:
+            response = self._get(endpoint, params, 'eodhd.intraday_request', ticker=ticker, interval=interval)
+            response.raise_for_status()
+            return self._parse_intraday_csv(response.content)
+
+        except requests.exceptions.RequestException as e:
+            print(f"Errore durante la richiesta API: {e}")
+            return None
+        except Exception as e:
+            print(f"Errore imprevisto nella gestione dei dati intraday per {ticker}: {e}")
+            return None
+
+    @classmethod
+    def _parse_intraday_csv(cls, content: bytes) -> pd.DataFrame:
+        """Converte il CSV di /api/intraday/ in un DataFrame con i tipi di INTRADAY_DTYPES."""
+        if not content.strip():
+            # Nessuna barra nella finestra (es. periodo precedente all'inizio delle quotazioni)
+            return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in cls.INTRADAY_DTYPES.items()},
+                                index=pd.DatetimeIndex([], name='date'))
+        wanted = {'timestamp', 'open', 'high', 'low', 'close', 'volume'}
+        raw = pd.read_csv(io.BytesIO(content), usecols=lambda c: c.strip().lower() in wanted,
+                          dtype={'Open': np.float32, 'High': np.float32, 'Low': np.float32,
+                                 'Close': np.float32, 'open': np.float32, 'high': np.float32,
+                                 'low': np.float32, 'close': np.float32})
+        raw.columns = [c.strip().lower() for c in raw.columns]
+        raw = raw.dropna(subset=['timestamp'])
+
+        df = pd.DataFrame(index=pd.DatetimeIndex(pd.to_datetime(raw['timestamp'].astype(np.int64), unit='s'),
+                                                 name='date'))
+        for col in ('open', 'high', 'low', 'close'):
+            df[col] = raw[col].to_numpy(dtype=np.float32)
+        # L'endpoint intraday non fornisce prezzi rettificati: per le crypto coincidono con il close
+        df['adj_close'] = df['close']
+        df['volume'] = np.round(raw['volume'].fillna(0).to_numpy(dtype=np.float64)).astype(np.int64)
+        return df[list(cls.INTRADAY_DTYPES)]
+
+    def _get(self, endpoint: str, params: dict, span_name: str, **span_attrs) -> requests.Response:
+        """
+        GET con lettura completa del corpo. I tentativi su 429/5xx sono gestiti
+        dall'adapter della sessione; una risposta troncata viene richiesta di nuovo
+        fino a max_retries volte, con lo stesso backoff esponenziale.
+        """
+        for attempt in range(self.max_retries + 1):
+            # Il token bucket sostituisce la pausa fissa: attendiamo solo se la quota è esaurita
+            with instrumentation.span('eodhd.rate_limit_wait'):
+                self.rate_limiter.acquire()
+            try:
+                with instrumentation.span(span_name, **span_attrs) as span:
+                    response = self.session.get(endpoint, params=params, timeout=self.TIMEOUT)
+                    span.set(status_code=response.status_code, bytes=len(response.content))
+            except self.BODY_ERRORS:
+                instrumentation.count('eodhd.body_retries')
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff_factor * 2 ** attempt)
+                continue
+            instrumentation.count('eodhd.requests')
+            instrumentation.count('eodhd.bytes', len(response.content))
+            return response
+
+    def _download(self, api_key: str, ticker: str, start_date: str, end_date: str) -> pd.DataFrame | None:
+        """Scarica dall'API le barre giornaliere comprese tra start_date e end_date."""
+        endpoint = f"{self.eod_url}{ticker}"
+
         params = {
             "api_token": api_key,
             "from": start_date,
@@ -35,19 +341,22 @@ class EODHDClient:
             "period": "d",
             "fmt": "json"
         }
-        
-        # Includere un leggero ritardo per rispettare i rate limit dell'API
-        time.sleep(0.5)
 
         try:
-            response = requests.get(endpoint, params=params)
+            response = self._get(endpoint, params, 'eodhd.request', ticker=ticker, start=start_date, end=end_date)
             # Solleva un'eccezione per errori HTTP (es. 401, 403, 404, 429)
             response.raise_for_status()
             
             data = response.json()
-            if not isinstance(data, list) or not data:
-                print(f"Nessun dato o formato inatteso per {ticker}.")
+            if not isinstance(data, list):
+                print(f"Formato inatteso per {ticker}.")
                 return None
+            ohlcv_cols = ['open', 'high', 'low', 'close', 'adj_close', 'volume']
+            if not data:
+                # Nessuna barra nell'intervallo: risposta valida, distinta da un errore (None)
+                print(f"Nessun dato per {ticker} tra {start_date} e {end_date}.")
+                return pd.DataFrame({col: pd.Series(dtype=np.float64) for col in ohlcv_cols},
+                                    index=pd.DatetimeIndex([], name='date'))
             
             df = pd.DataFrame(data)
             df['date'] = pd.to_datetime(df['date'])
@@ -55,11 +364,11 @@ class EODHDClient:
             df.rename(columns={'adjusted_close': 'adj_close'}, inplace=True)
             
             # Assicuriamoci che le colonne numeriche siano del tipo corretto
-            ohlcv_cols = ['open', 'high', 'low', 'close', 'adj_close', 'volume']
             for col in ohlcv_cols:
                 if col in df.columns:
                     df[col] = pd.to_numeric(df[col], errors='coerce')
             
+            instrumentation.count('eodhd.rows', len(df))
             print(f"Dati per {ticker} scaricati con successo: {len(df)} righe.")
             return df[ohlcv_cols]
 
@@ -0,0 +1,180 @@
+# File: feature_cache.py
+# Modulo per il progetto KriterionQuant Hedging App
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from indicator_calculator import IndicatorCalculator
+
+
+def fingerprint_arrays(*arrays: np.ndarray) -> str:
+    """Impronta (hash BLAKE2b) del contenuto di uno o più array NumPy."""
+    h = hashlib.blake2b(digest_size=16)
+    for arr in arrays:
+        arr = np.ascontiguousarray(arr)
+        h.update(str((arr.dtype.str, arr.shape)).encode())
+        h.update(arr.view(np.uint8).reshape(-1) if arr.size else b'')
+    return h.hexdigest()
+
+
+def fingerprint_frame(df: pd.DataFrame, columns: list[str] | None = None) -> str:
+    """Impronta dei valori (non dell'indice) delle colonne indicate di un DataFrame."""
+    columns = list(df.columns) if columns is None else columns
+    h = hashlib.blake2b(digest_size=16)
+    for col in columns:
+        h.update(col.encode())
+        h.update(fingerprint_arrays(df[col].to_numpy()).encode())
+    return h.hexdigest()
+
+
+class IndicatorCache:
+    """
+    Cache a due livelli per le colonne degli indicatori.
+
+    - Livello in memoria: LRU con un budget massimo in byte.
+    - Livello su disco (opzionale): un file .npy per colonna, riaperto in memory-map.
+
+    Gli array restituiti sono in sola lettura, così possono essere condivisi
+    tra più DataFrame senza copie e senza rischio di modifiche accidentali.
+    """
+    def __init__(self, max_bytes: int = 256 * 1024 ** 2, disk_dir: str | None = None):
+        """
+        Args:
+            max_bytes (int): Budget di memoria del livello LRU (default 256 MB).
+            disk_dir (str, optional): Cartella del livello su disco; None per disattivarlo.
+        """
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(fingerprint: str, indicator: str, params: tuple, column: str) -> str:
+        """Chiave content-addressed: (impronta dei prezzi, indicatore, parametri, colonna)."""
+        raw = repr((fingerprint, indicator, params, column)).encode()
+        return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+    def get(self, key: str) -> np.ndarray | None:
+        with self._lock:
+            arr = self._entries.get(key)
+            if arr is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return arr
+
+        if self.disk_dir:
+            path = os.path.join(self.disk_dir, f"{key}.npy")
+            if os.path.exists(path):
+                arr = np.load(path, mmap_mode='r')
+                self._store(key, arr)
+                with self._lock:
+                    self.hits += 1
+                return arr
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, arr: np.ndarray) -> np.ndarray:
+        arr = np.asarray(arr)
+        arr.flags.writeable = False
+        if self.disk_dir:
+            path = os.path.join(self.disk_dir, f"{key}.npy")
+            tmp_path = f"{path}.tmp.npy"
+            np.save(tmp_path, arr)
+            os.replace(tmp_path, path)
+        self._store(key, arr)
+        return arr
+
+    def _store(self, key: str, arr: np.ndarray):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = arr
+            self._bytes += arr.nbytes
+            # Eviction LRU finché non rientriamo nel budget
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+
+# Cache condivisa di processo, usata quando non ne viene fornita una esplicita
+DEFAULT_CACHE = IndicatorCache()
+
+
+class CachedIndicatorCalculator:
+    """
+    Stessa interfaccia di IndicatorCalculator, ma con memoizzazione delle colonne.
+
+    Ogni colonna è identificata dall'impronta dei prezzi in ingresso, dal nome
+    dell'indicatore e dai suoi parametri: rieseguire lo stesso indicatore sulla
+    stessa serie storica restituisce la colonna già calcolata.
+    """
+    def __init__(self, cache: IndicatorCache | None = None):
+        self.cache = cache if cache is not None else DEFAULT_CACHE
+
+    def _get_or_compute(self, df: pd.DataFrame, indicator: str, params: tuple,
+                        input_cols: list[str], output_cols: list[str], compute) -> pd.DataFrame:
+        fingerprint = fingerprint_frame(df, input_cols)
+        keys = [self.cache.make_key(fingerprint, indicator, params, col) for col in output_cols]
+        cached = [self.cache.get(key) for key in keys]
+
+        if any(arr is None for arr in cached):
+            tmp = compute(df[input_cols].copy(deep=False))
+            cached = [self.cache.put(key, tmp[col].to_numpy(dtype=np.float64, copy=True))
+                      for key, col in zip(keys, output_cols)]
+
+        for col, arr in zip(output_cols, cached):
+            # Assegnando una Series costruita senza copia il DataFrame condivide l'array in cache
+            df[col] = pd.Series(arr, index=df.index, copy=False)
+        return df
+
+    def add_moving_average(self, df: pd.DataFrame, period: int, price_col: str = 'adj_close') -> pd.DataFrame:
+        """Aggiunge (dalla cache se possibile) la media mobile semplice (SMA)."""
+        return self._get_or_compute(
+            df, 'sma', (period,), [price_col], [f'sma_{period}'],
+            lambda tmp: IndicatorCalculator.add_moving_average(tmp, period, price_col)
+        )
+
+    def add_rsi(self, df: pd.DataFrame, period: int = 14, price_col: str = 'adj_close') -> pd.DataFrame:
+        """Aggiunge (dalla cache se possibile) il Relative Strength Index (RSI)."""
+        return self._get_or_compute(
+            df, 'rsi', (period,), [price_col], [f'rsi_{period}'],
+            lambda tmp: IndicatorCalculator.add_rsi(tmp, period, price_col)
+        )
+
+    def add_bollinger_bands(self, df: pd.DataFrame, period: int = 20, std: float = 2.0,
+                            price_col: str = 'adj_close') -> pd.DataFrame:
+        """Aggiunge (dalla cache se possibile) le Bande di Bollinger."""
+        return self._get_or_compute(
+            df, 'bbands', (period, std), [price_col],
+            [f'BBM_{period}_{std}', f'BBU_{period}_{std}', f'BBL_{period}_{std}'],
+            lambda tmp: IndicatorCalculator.add_bollinger_bands(tmp, period, std, price_col)
+        )
+
+    def add_adx(self, df: pd.DataFrame, period: int = 14) -> pd.DataFrame:
+        """Aggiunge (dalla cache se possibile) l'Average Directional Index (ADX)."""
+        return self._get_or_compute(
+            df, 'adx', (period,), ['high', 'low', 'close'], [f'ADX_{period}'],
+            lambda tmp: IndicatorCalculator.add_adx(tmp, period)
+        )
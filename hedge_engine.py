@@ -0,0 +1,350 @@
+# File: hedge_engine.py
+# Modulo per il progetto KriterionQuant Hedging App
+#
+# Kernel su array NumPy della macchina a stati della copertura
+# (entrata su segnale, uscita su Stop Loss o fine segnale).
+# Non dipende da pandas: lavora solo su array grezzi.
+
+import numpy as np
+
+import instrumentation
+
+# Numba è opzionale: se installato, il ciclo viene compilato JIT
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+def _hedge_state_loop(close, enter, exit_signal, stop_loss_perc):
+    """
+    Implementazione di riferimento barra per barra.
+    state[t] indica se, dopo aver elaborato la barra t, siamo coperti.
+    """
+    n = close.shape[0]
+    state = np.zeros(n, dtype=np.bool_)
+    is_hedged = False
+    entry_price = 0.0
+    for t in range(n):
+        if is_hedged:
+            # 1. Stop Loss: il prezzo è salito oltre la soglia rispetto all'entrata
+            if close[t] > entry_price * (1 + stop_loss_perc):
+                is_hedged = False
+                entry_price = 0.0
+            # 2. Fine segnale
+            elif exit_signal[t]:
+                is_hedged = False
+                entry_price = 0.0
+        # Chi esce in questa barra rientra al più presto nella successiva
+        elif enter[t]:
+            is_hedged = True
+            entry_price = close[t]
+        state[t] = is_hedged
+    return state
+
+
+if NUMBA_AVAILABLE:
+    _hedge_state_jit = njit(cache=True, nogil=True)(_hedge_state_loop)
+
+
+def _hedge_state_numpy(close, enter, exit_signal, stop_loss_perc):
+    """
+    Stessa macchina a stati, ma saltando da un episodio di copertura al successivo:
+    il ciclo Python gira una volta per trade invece che una volta per barra.
+    """
+    n = close.shape[0]
+    state = np.zeros(n, dtype=np.bool_)
+    enter_idx = np.flatnonzero(enter)
+    exit_idx = np.flatnonzero(exit_signal)
+
+    k = 0
+    while True:
+        # Prossima entrata a partire dalla barra k
+        pos = np.searchsorted(enter_idx, k)
+        if pos == len(enter_idx):
+            break
+        entry = enter_idx[pos]
+        stop_level = close[entry] * (1 + stop_loss_perc)
+
+        # Prima barra successiva all'entrata con segnale di uscita
+        pos_exit = np.searchsorted(exit_idx, entry + 1)
+        signal_exit = exit_idx[pos_exit] if pos_exit < len(exit_idx) else n
+
+        # Lo Stop Loss ha la precedenza: cerchiamo la prima violazione fino all'uscita su segnale inclusa
+        window = close[entry + 1:min(signal_exit + 1, n)]
+        breaches = np.flatnonzero(window > stop_level)
+        exit_bar = entry + 1 + breaches[0] if len(breaches) else signal_exit
+
+        state[entry:exit_bar] = True
+        if exit_bar >= n:
+            break
+        k = exit_bar + 1
+    return state
+
+
+def hedge_state_path(close: np.ndarray, enter: np.ndarray, exit_signal: np.ndarray,
+                     stop_loss_perc: float, engine: str = 'auto') -> np.ndarray:
+    """
+    Calcola lo stato di copertura dopo ogni barra.
+
+    Args:
+        close (np.ndarray): Prezzi di chiusura usati per entrata e Stop Loss.
+        enter (np.ndarray): Maschera booleana delle barre con segnale di entrata.
+        exit_signal (np.ndarray): Maschera booleana delle barre con segnale di uscita.
+        stop_loss_perc (float): Stop Loss percentuale (es. 0.05 per il 5%).
+        engine (str): 'numba', 'numpy', 'loop' oppure 'auto' (numba se disponibile).
+
+    Returns:
+        np.ndarray: Array booleano, True se dopo la barra t siamo coperti.
+    """
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    enter = np.ascontiguousarray(enter, dtype=np.bool_)
+    exit_signal = np.ascontiguousarray(exit_signal, dtype=np.bool_)
+    stop_loss_perc = float(stop_loss_perc)
+
+    if engine == 'auto':
+        engine = 'numba' if NUMBA_AVAILABLE else 'numpy'
+    if engine == 'numba':
+        if not NUMBA_AVAILABLE:
+            raise ImportError("Il motore 'numba' richiede il pacchetto numba.")
+        return _hedge_state_jit(close, enter, exit_signal, stop_loss_perc)
+    if engine == 'numpy':
+        return _hedge_state_numpy(close, enter, exit_signal, stop_loss_perc)
+    if engine == 'loop':
+        return _hedge_state_loop(close, enter, exit_signal, stop_loss_perc)
+    raise ValueError(f"Motore sconosciuto: {engine}")
+
+
+def _hedge_state_matrix_loop(close, enter, exit_signal, stop_loss_perc, state):
+    """
+    Macchina a stati di '_hedge_state_loop' applicata a ogni colonna, con il proprio Stop Loss.
+    Tutte le macchine avanzano insieme: un solo passaggio sulle barre, con lo
+    stato di ogni colonna in un vettore (le colonne in broadcast non vengono copiate).
+    """
+    n, k = state.shape
+    is_hedged = np.zeros(k, dtype=np.bool_)
+    entry_price = np.zeros(k, dtype=np.float64)
+    stop_factor = 1 + stop_loss_perc
+    for t in range(n):
+        for j in range(k):
+            if is_hedged[j]:
+                if close[t, j] > entry_price[j] * stop_factor[j]:
+                    is_hedged[j] = False
+                    entry_price[j] = 0.0
+                elif exit_signal[t, j]:
+                    is_hedged[j] = False
+                    entry_price[j] = 0.0
+            elif enter[t, j]:
+                is_hedged[j] = True
+                entry_price[j] = close[t, j]
+            state[t, j] = is_hedged[j]
+    return state
+
+
+if NUMBA_AVAILABLE:
+    _hedge_state_matrix_jit = njit(cache=True, nogil=True)(_hedge_state_matrix_loop)
+
+
+def _hedge_state_matrix_numpy(close, enter, exit_signal, stop_loss_perc, state):
+    """Stessa macchina a stati con il ciclo sulle barre e le colonne elaborate insieme."""
+    n, k = close.shape
+    is_hedged = np.zeros(k, dtype=np.bool_)
+    entry_price = np.zeros(k, dtype=np.float64)
+    stop_factor = 1 + stop_loss_perc
+    for t in range(n):
+        leave = is_hedged & ((close[t] > entry_price * stop_factor) | exit_signal[t])
+        join = ~is_hedged & enter[t]
+        is_hedged = (is_hedged & ~leave) | join
+        entry_price = np.where(join, close[t], entry_price)
+        state[t] = is_hedged
+    return state
+
+
+def hedge_state_matrix(close: np.ndarray, enter: np.ndarray, exit_signal: np.ndarray,
+                       stop_loss_perc, engine: str = 'auto') -> np.ndarray:
+    """
+    Versione a matrice di 'hedge_state_path': ogni colonna è un percorso
+    (o una variante di segnale) indipendente.
+
+    Args:
+        close (np.ndarray): Prezzi (barre x colonne), oppure un vettore condiviso da tutte le colonne.
+        enter (np.ndarray): Maschera booleana di entrata (barre x colonne o vettore).
+        exit_signal (np.ndarray): Maschera booleana di uscita (barre x colonne o vettore).
+        stop_loss_perc: Stop Loss percentuale, unico oppure uno per colonna.
+        engine (str): 'numba', 'numpy' oppure 'auto' (numba se disponibile).
+
+    Returns:
+        np.ndarray: Matrice booleana (barre x colonne) dello stato di copertura.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    enter = np.asarray(enter, dtype=np.bool_)
+    exit_signal = np.asarray(exit_signal, dtype=np.bool_)
+    # I vettori diventano colonne, poi tutto viene allineato alla stessa forma
+    close, enter, exit_signal = (a[:, None] if a.ndim == 1 else a for a in (close, enter, exit_signal))
+    n = close.shape[0]
+    k = max(close.shape[1], enter.shape[1], exit_signal.shape[1], np.size(stop_loss_perc))
+    stop_loss_perc = np.ascontiguousarray(np.broadcast_to(np.asarray(stop_loss_perc, dtype=np.float64), (k,)))
+
+    if engine == 'auto':
+        engine = 'numba' if NUMBA_AVAILABLE else 'numpy'
+    # Entrambi i motori leggono una barra alla volta: le viste in broadcast non richiedono copie
+    arrays = [np.broadcast_to(a, (n, k)) for a in (close, enter, exit_signal)]
+    state = np.empty((n, k), dtype=np.bool_)
+    if engine == 'numba':
+        if not NUMBA_AVAILABLE:
+            raise ImportError("Il motore 'numba' richiede il pacchetto numba.")
+        return _hedge_state_matrix_jit(*arrays, stop_loss_perc, state)
+    if engine == 'numpy':
+        return _hedge_state_matrix_numpy(*arrays, stop_loss_perc, state)
+    raise ValueError(f"Motore sconosciuto: {engine}")
+
+
+def _hedged_equity_loop(returns, positions, hedge_ratios, initial_capital, equity):
+    """
+    Curve di equity di molte varianti, barra per barra: per ogni colonna
+    esposizione (1 - h) + h * posizione, rendimento coperto e capitalizzazione.
+    Il ciclo interno scorre le colonne (una riga della matrice alla volta).
+    """
+    n, k = equity.shape
+    growth = np.ones(k)
+    for t in range(n):
+        for j in range(k):
+            h = hedge_ratios[j]
+            growth[j] = growth[j] * (1 + returns[t] * ((1 - h) + h * positions[t, j]))
+            equity[t, j] = growth[j] * initial_capital
+    return equity
+
+
+if NUMBA_AVAILABLE:
+    _hedged_equity_jit = njit(cache=True, nogil=True)(_hedged_equity_loop)
+
+
+def _hedged_equity_numpy(returns, positions, hedge_ratios, initial_capital, equity):
+    """Stesse operazioni di '_hedged_equity_loop' in broadcast su tutta la matrice."""
+    np.multiply(positions, hedge_ratios, out=equity)
+    equity += 1 - hedge_ratios
+    equity *= returns[:, None]
+    equity += 1
+    np.cumprod(equity, axis=0, out=equity)
+    equity *= initial_capital
+    return equity
+
+
+def hedged_equity_matrix(returns: np.ndarray, positions: np.ndarray, hedge_ratios,
+                         initial_capital: float, engine: str = 'auto') -> np.ndarray:
+    """
+    Curve di equity della strategia coperta su una matrice (barre x varianti):
+    un percorso di posizioni con un vettore di hedge ratio (la frontiera), oppure
+    una matrice di posizioni (es. più livelli di Stop Loss) con un rapporto unico.
+
+    Args:
+        returns (np.ndarray): Rendimenti per barra (senza NaN).
+        positions (np.ndarray): Posizioni (1 = Long, 0 = Hedged), vettore o matrice barre x varianti.
+        hedge_ratios: Rapporto di copertura unico oppure uno per colonna.
+        initial_capital (float): Capitale iniziale.
+        engine (str): 'numba', 'numpy' oppure 'auto' (numba se disponibile).
+
+    Returns:
+        np.ndarray: Matrice (barre x varianti) delle curve di equity.
+    """
+    returns = np.ascontiguousarray(returns, dtype=np.float64)
+    positions = np.asarray(positions, dtype=np.float64)
+    if positions.ndim == 1:
+        positions = positions[:, None]
+    n = len(returns)
+    k = max(positions.shape[1], np.size(hedge_ratios))
+    # Vettori condivisi in broadcast: nessuna copia per colonna
+    positions = np.broadcast_to(positions, (n, k))
+    hedge_ratios = np.ascontiguousarray(np.broadcast_to(np.asarray(hedge_ratios, dtype=np.float64), (k,)))
+    equity = np.empty((n, k), dtype=np.float64)
+
+    if engine == 'auto':
+        engine = 'numba' if NUMBA_AVAILABLE else 'numpy'
+    if engine == 'numba':
+        if not NUMBA_AVAILABLE:
+            raise ImportError("Il motore 'numba' richiede il pacchetto numba.")
+        return _hedged_equity_jit(returns, positions, hedge_ratios, float(initial_capital), equity)
+    if engine == 'numpy':
+        return _hedged_equity_numpy(returns, positions, hedge_ratios, float(initial_capital), equity)
+    raise ValueError(f"Motore sconosciuto: {engine}")
+
+
+# Codici del motivo di uscita nel registro dei trade
+EXIT_NONE = 0
+EXIT_STOP_LOSS = 1
+EXIT_SIGNAL = 2
+
+TRADE_DTYPE = np.dtype([
+    ('entry_idx', np.int64),
+    ('exit_idx', np.int64),
+    ('entry_price', np.float64),
+    ('exit_price', np.float64),
+    ('exit_reason', np.int8),
+])
+
+
+class TradeLedger:
+    """
+    Registro compatto dei trade di copertura prodotto da 'simulate_trades'.
+
+    Attributes:
+        trades (np.ndarray): Array strutturato (TRADE_DTYPE) dei trade chiusi.
+        state (np.ndarray): Stato di copertura dopo ogni barra.
+        in_position (bool): True se l'ultima copertura è ancora aperta.
+        entry_idx (int): Barra di entrata della copertura aperta (-1 se assente).
+        entry_price (float): Prezzo di entrata della copertura aperta (0.0 se assente).
+        last_exit_reason (int): Motivo dell'ultima uscita (EXIT_NONE se non c'è stata
+            alcuna uscita o se dopo l'ultima uscita siamo rientrati).
+    """
+    def __init__(self, trades: np.ndarray, state: np.ndarray, entry_idx: int,
+                 entry_price: float, last_exit_reason: int):
+        self.trades = trades
+        self.state = state
+        self.in_position = entry_idx >= 0
+        self.entry_idx = entry_idx
+        self.entry_price = entry_price
+        self.last_exit_reason = last_exit_reason
+
+
+@instrumentation.instrumented('hedge.simulate_trades')
+def simulate_trades(close: np.ndarray, enter: np.ndarray, exit_signal: np.ndarray,
+                    stop_loss_perc: float, engine: str = 'auto') -> TradeLedger:
+    """
+    Esegue la macchina a stati una sola volta e ne ricava il registro dei trade.
+
+    Args:
+        close (np.ndarray): Prezzi di chiusura usati per entrata e Stop Loss.
+        enter (np.ndarray): Maschera booleana delle barre con segnale di entrata.
+        exit_signal (np.ndarray): Maschera booleana delle barre con segnale di uscita.
+        stop_loss_perc (float): Stop Loss percentuale (es. 0.05 per il 5%).
+        engine (str): Motore della macchina a stati (vedi 'hedge_state_path').
+
+    Returns:
+        TradeLedger: Trade chiusi e stato della posizione aperta.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    state = hedge_state_path(close, enter, exit_signal, stop_loss_perc, engine=engine)
+
+    previous = np.zeros_like(state)
+    previous[1:] = state[:-1]
+    entries = np.flatnonzero(state & ~previous)
+    exits = np.flatnonzero(~state & previous)
+    n_closed = len(exits)
+
+    entry_prices = close[entries]
+    exit_prices = close[exits]
+    # Alla barra di uscita lo Stop Loss viene verificato prima della fine del segnale
+    stop_hit = exit_prices > entry_prices[:n_closed] * (1 + stop_loss_perc)
+
+    trades = np.empty(n_closed, dtype=TRADE_DTYPE)
+    trades['entry_idx'] = entries[:n_closed]
+    trades['exit_idx'] = exits
+    trades['entry_price'] = entry_prices[:n_closed]
+    trades['exit_price'] = exit_prices
+    trades['exit_reason'] = np.where(stop_hit, EXIT_STOP_LOSS, EXIT_SIGNAL)
+
+    if len(entries) > n_closed:
+        return TradeLedger(trades, state, int(entries[-1]), float(entry_prices[-1]), EXIT_NONE)
+    last_exit_reason = int(trades['exit_reason'][-1]) if n_closed else EXIT_NONE
+    return TradeLedger(trades, state, -1, 0.0, last_exit_reason)
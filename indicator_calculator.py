@@ -4,18 +4,23 @@
 import pandas as pd
 import numpy as np
 
+import indicator_kernels
+import instrumentation
+
 class IndicatorCalculator:
     """
     Contiene una collezione di metodi statici per calcolare vari
     indicatori tecnici su un DataFrame di dati di mercato.
     """
     @staticmethod
+    @instrumentation.instrumented('indicators.add_moving_average')
     def add_moving_average(df: pd.DataFrame, period: int, price_col: str = 'adj_close') -> pd.DataFrame:
         """Aggiunge una colonna per la media mobile semplice (SMA)."""
         df[f'sma_{period}'] = df[price_col].rolling(window=period).mean()
         return df
 
     @staticmethod
+    @instrumentation.instrumented('indicators.add_rsi')
     def add_rsi(df: pd.DataFrame, period: int = 14, price_col: str = 'adj_close') -> pd.DataFrame:
         """Aggiunge una colonna per il Relative Strength Index (RSI)."""
         delta = df[price_col].diff()
@@ -27,6 +32,7 @@ class IndicatorCalculator:
         return df
 
     @staticmethod
+    @instrumentation.instrumented('indicators.add_bollinger_bands')
     def add_bollinger_bands(df: pd.DataFrame, period: int = 20, std: float = 2.0, price_col: str = 'adj_close') -> pd.DataFrame:
         """Aggiunge le Bande di Bollinger al DataFrame."""
         sma = df[price_col].rolling(window=period).mean()
@@ -38,6 +44,7 @@ class IndicatorCalculator:
         return df
 
     @staticmethod
+    @instrumentation.instrumented('indicators.add_adx')
     def add_adx(df: pd.DataFrame, period: int = 14) -> pd.DataFrame:
         """Aggiunge l'Average Directional Index (ADX) al DataFrame."""
         high = df['high']
@@ -67,3 +74,52 @@ class IndicatorCalculator:
         
         df[f'ADX_{period}'] = adx
         return df
+
+    # --------------------------------------------------------------------------
+    # API batch: molti periodi dello stesso indicatore in un unico passaggio.
+    # Restituiscono un DataFrame "largo" costruito su un'unica matrice contigua,
+    # con gli stessi nomi di colonna dei metodi per singolo periodo.
+    # --------------------------------------------------------------------------
+
+    @staticmethod
+    @instrumentation.instrumented('indicators.moving_average_bank')
+    def moving_average_bank(df: pd.DataFrame, periods: list[int], price_col: str = 'adj_close') -> pd.DataFrame:
+        """Medie mobili semplici per tutti i periodi indicati (colonne 'sma_{period}')."""
+        values = indicator_kernels.rolling_mean_bank(df[price_col].to_numpy(dtype=np.float64), periods)
+        return pd.DataFrame(values, index=df.index, columns=[f'sma_{p}' for p in periods], copy=False)
+
+    @staticmethod
+    @instrumentation.instrumented('indicators.adx_bank')
+    def adx_bank(df: pd.DataFrame, periods: list[int]) -> pd.DataFrame:
+        """ADX per tutti i periodi indicati (colonne 'ADX_{period}'), con TR e DM calcolati una volta."""
+        values = indicator_kernels.adx_bank(
+            df['high'].to_numpy(dtype=np.float64),
+            df['low'].to_numpy(dtype=np.float64),
+            df['close'].to_numpy(dtype=np.float64),
+            periods
+        )
+        return pd.DataFrame(values, index=df.index, columns=[f'ADX_{p}' for p in periods], copy=False)
+
+    @staticmethod
+    @instrumentation.instrumented('indicators.rsi_bank')
+    def rsi_bank(df: pd.DataFrame, periods: list[int], price_col: str = 'adj_close') -> pd.DataFrame:
+        """RSI per tutti i periodi indicati (colonne 'rsi_{period}')."""
+        values = indicator_kernels.rsi_bank(df[price_col].to_numpy(dtype=np.float64), periods)
+        return pd.DataFrame(values, index=df.index, columns=[f'rsi_{p}' for p in periods], copy=False)
+
+    @staticmethod
+    @instrumentation.instrumented('indicators.bollinger_bank')
+    def bollinger_bank(df: pd.DataFrame, periods: list[int], std: float = 2.0,
+                       price_col: str = 'adj_close') -> pd.DataFrame:
+        """Bande di Bollinger per tutti i periodi indicati (colonne BBM/BBU/BBL come add_bollinger_bands)."""
+        prices = df[price_col].to_numpy(dtype=np.float64)
+        k = len(periods)
+        sma = indicator_kernels.rolling_mean_bank(prices, periods)
+        rolling_std = indicator_kernels.rolling_std_bank(prices, periods)
+
+        values = np.empty((len(prices), 3 * k), dtype=np.float64, order='F')
+        values[:, 0::3] = sma
+        values[:, 1::3] = sma + (rolling_std * std)
+        values[:, 2::3] = sma - (rolling_std * std)
+        columns = [f'{band}_{p}_{std}' for p in periods for band in ('BBM', 'BBU', 'BBL')]
+        return pd.DataFrame(values, index=df.index, columns=columns, copy=False)
@@ -0,0 +1,293 @@
+# File: indicator_kernels.py
+# Modulo per il progetto KriterionQuant Hedging App
+#
+# Kernel NumPy per il calcolo di molti periodi di uno stesso indicatore
+# in un unico passaggio. Non dipende da pandas: lavora su array grezzi
+# e restituisce matrici (barre x periodi) contigue per colonna.
+
+import numpy as np
+
+# Numba è opzionale: se installato, la ricorsione esponenziale viene compilata JIT
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+def com_from_alpha(alpha: float) -> float:
+    """Center of mass equivalente a ewm(alpha=...), calcolato come fa pandas."""
+    return (1 - alpha) / alpha
+
+
+def _ewm_mean_loop(values, coms, min_periods, out):
+    """
+    Porting di pandas ewm(adjust=True, ignore_na=False).mean() applicato
+    a ogni colonna di 'values' con il proprio center of mass e min_periods.
+    """
+    n, k = values.shape
+    for j in range(k):
+        old_wt_factor = 1. - 1. / (1. + coms[j])
+        weighted = values[0, j]
+        nobs = 1 if weighted == weighted else 0
+        out[0, j] = weighted if nobs >= min_periods[j] else np.nan
+        old_wt = 1.
+        for i in range(1, n):
+            cur = values[i, j]
+            is_observation = cur == cur
+            if is_observation:
+                nobs += 1
+            if weighted == weighted:
+                old_wt *= old_wt_factor
+                if is_observation:
+                    # Come in pandas: evita errori numerici sulle serie costanti
+                    if weighted != cur:
+                        weighted = old_wt * weighted + cur
+                        weighted /= (old_wt + 1.)
+                    old_wt += 1.
+            elif is_observation:
+                weighted = cur
+            out[i, j] = weighted if nobs >= min_periods[j] else np.nan
+    return out
+
+
+if NUMBA_AVAILABLE:
+    _ewm_mean_jit = njit(cache=True, nogil=True)(_ewm_mean_loop)
+
+
+def _ewm_mean_vectorized(values, coms, min_periods, out):
+    """Stessa ricorsione, vettorizzata sulle colonne (un ciclo Python per barra)."""
+    n, k = values.shape
+    old_wt_factor = 1. - 1. / (1. + coms)
+    weighted = values[0].copy()
+    nobs = (weighted == weighted).astype(np.int64)
+    out[0] = np.where(nobs >= min_periods, weighted, np.nan)
+    old_wt = np.ones(k)
+    for i in range(1, n):
+        cur = values[i]
+        is_observation = cur == cur
+        nobs += is_observation
+        started = weighted == weighted
+        old_wt = np.where(started, old_wt * old_wt_factor, old_wt)
+        update = started & is_observation
+        blend = update & (weighted != cur)
+        with np.errstate(invalid='ignore'):
+            blended = (old_wt * weighted + cur) / (old_wt + 1.)
+        weighted = np.where(blend, blended, weighted)
+        old_wt = np.where(update, old_wt + 1., old_wt)
+        weighted = np.where(~started & is_observation, cur, weighted)
+        out[i] = np.where(nobs >= min_periods, weighted, np.nan)
+    return out
+
+
+def _ewm_mean_pandas(values, coms, min_periods, out):
+    """Ripiego senza Numba: le colonne con gli stessi parametri passano insieme dal codice Cython di pandas."""
+    import pandas as pd
+
+    for com, minp in set(zip(coms.tolist(), min_periods.tolist())):
+        cols = np.flatnonzero((coms == com) & (min_periods == minp))
+        block = pd.DataFrame(values[:, cols]).ewm(com=com, min_periods=minp).mean()
+        out[:, cols] = block.to_numpy()
+    return out
+
+
+def ewm_mean_columns(values: np.ndarray, coms, min_periods) -> np.ndarray:
+    """
+    Media mobile esponenziale di ogni colonna di 'values', con risultati
+    identici a Series.ewm(com=..., min_periods=...).mean() di pandas.
+
+    Args:
+        values (np.ndarray): Matrice (barre x colonne) oppure vettore.
+        coms: Center of mass per colonna (vedi 'com_from_alpha').
+        min_periods: Numero minimo di osservazioni per colonna.
+
+    Returns:
+        np.ndarray: Matrice (barre x colonne) in ordine Fortran.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, None]
+    n, k = values.shape
+    coms = np.broadcast_to(np.asarray(coms, dtype=np.float64), (k,)).copy()
+    min_periods = np.broadcast_to(np.asarray(min_periods, dtype=np.int64), (k,)).copy()
+    out = np.empty((n, k), dtype=np.float64, order='F')
+    if n == 0:
+        return out
+    if NUMBA_AVAILABLE:
+        return _ewm_mean_jit(np.asfortranarray(values), coms, min_periods, out)
+    try:
+        return _ewm_mean_pandas(values, coms, min_periods, out)
+    except ImportError:
+        return _ewm_mean_vectorized(values, coms, min_periods, out)
+
+
+def _window_sums(values: np.ndarray, periods: np.ndarray):
+    """
+    Somme e conteggi di osservazioni valide su finestre mobili.
+
+    Le somme prefisse vengono ricalcolate a blocchi di lunghezza pari al periodo
+    massimo: ogni finestra è la somma di un suffisso del blocco precedente e di
+    un prefisso del blocco corrente, quindi l'errore di arrotondamento resta
+    limitato alla grandezza di un blocco invece di crescere con lo storico.
+    """
+    n = len(values)
+    block = int(periods.max()) if len(periods) else 1
+    valid = ~np.isnan(values)
+    padded = np.zeros(-(-n // block) * block, dtype=np.float64)
+    padded[:n] = np.where(valid, values, 0.)
+    blocks = padded.reshape(-1, block)
+    prefix = np.cumsum(blocks, axis=1).ravel()[:n]
+    suffix = np.cumsum(blocks[:, ::-1], axis=1)[:, ::-1].ravel()[:n]
+    count = np.concatenate(([0], np.cumsum(valid)))
+
+    idx = np.arange(n)
+    sums = np.empty((n, len(periods)), dtype=np.float64, order='F')
+    counts = np.empty((n, len(periods)), dtype=np.int64, order='F')
+    for j, p in enumerate(periods):
+        first = idx - p + 1
+        same_block = (first // block) == (idx // block)
+        before = np.where(first % block == 0, 0., prefix[np.maximum(first - 1, 0)])
+        sums[:, j] = np.where(same_block, prefix - before, suffix[np.maximum(first, 0)] + prefix)
+        counts[:, j] = count[idx + 1] - count[np.maximum(first, 0)]
+    return sums, counts
+
+
+def rolling_mean_bank(values: np.ndarray, periods) -> np.ndarray:
+    """
+    Medie mobili semplici per più periodi in un solo passaggio (somme prefisse a blocchi).
+    Equivalente a rolling(window=p).mean(): NaN finché la finestra non è piena.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    periods = np.asarray(periods, dtype=np.int64)
+    sums, counts = _window_sums(values, periods)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out = sums / periods
+    out[counts < periods] = np.nan
+    return out
+
+
+def rolling_std_bank(values: np.ndarray, periods, chunk_size: int = 1 << 22) -> np.ndarray:
+    """
+    Deviazioni standard mobili (ddof=1) per più periodi.
+    Usa il calcolo in due passaggi su viste delle finestre (senza copie),
+    elaborate a blocchi di righe per limitare la memoria.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    periods = np.asarray(periods, dtype=np.int64)
+    n = len(values)
+    out = np.full((n, len(periods)), np.nan, dtype=np.float64, order='F')
+    for j, p in enumerate(periods):
+        if p < 2 or n < p:
+            continue
+        windows = np.lib.stride_tricks.sliding_window_view(values, p)
+        rows = max(1, chunk_size // p)
+        for lo in range(0, len(windows), rows):
+            chunk = windows[lo:lo + rows]
+            out[lo + p - 1:lo + p - 1 + len(chunk), j] = chunk.std(axis=1, ddof=1)
+    return out
+
+
+def true_range_and_dm(high: np.ndarray, low: np.ndarray, close: np.ndarray):
+    """
+    True Range e Directional Movement, calcolati una sola volta e condivisi
+    da tutti i periodi dell'ADX (stessa definizione di IndicatorCalculator.add_adx).
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    prev_close = np.concatenate(([np.nan], close[:-1]))
+
+    plus_dm = np.concatenate(([np.nan], np.diff(high)))
+    minus_dm = np.concatenate(([np.nan], np.diff(low)))
+    plus_dm[plus_dm < 0] = 0
+    minus_dm[minus_dm > 0] = 0
+
+    # Massimo che ignora i NaN, come pd.concat(...).max(axis=1)
+    tr = np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+    return tr, plus_dm, minus_dm
+
+
+def adx_bank(high: np.ndarray, low: np.ndarray, close: np.ndarray, periods) -> np.ndarray:
+    """ADX per più periodi: TR e DM sono condivisi, gli smoothing girano in un'unica ricorsione."""
+    periods = np.asarray(periods, dtype=np.int64)
+    k = len(periods)
+    tr, plus_dm, minus_dm = true_range_and_dm(high, low, close)
+    coms = np.array([com_from_alpha(1 / p) for p in periods])
+
+    # Un'unica matrice (barre x 3 periodi): ATR, +DM e -DM di tutti i periodi insieme
+    stacked = np.empty((len(tr), 3 * k), dtype=np.float64, order='F')
+    stacked[:, :k] = tr[:, None]
+    stacked[:, k:2 * k] = plus_dm[:, None]
+    stacked[:, 2 * k:] = minus_dm[:, None]
+    smoothed = ewm_mean_columns(stacked, np.tile(coms, 3), np.tile(periods, 3))
+    atr, plus_sm, minus_sm = smoothed[:, :k], smoothed[:, k:2 * k], smoothed[:, 2 * k:]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        plus_di = 100 * (plus_sm / atr)
+        minus_di = 100 * (np.abs(minus_sm) / atr)
+        dx = (np.abs(plus_di - minus_di) / np.abs(plus_di + minus_di)) * 100
+    return ewm_mean_columns(dx, coms, periods)
+
+
+def rsi_bank(values: np.ndarray, periods) -> np.ndarray:
+    """RSI per più periodi con un'unica ricorsione esponenziale su guadagni e perdite."""
+    values = np.asarray(values, dtype=np.float64)
+    periods = np.asarray(periods, dtype=np.int64)
+    k = len(periods)
+    delta = np.concatenate(([np.nan], np.diff(values)))
+    gain = np.where(delta > 0, delta, 0.)
+    loss = -np.where(delta < 0, delta, 0.)
+    # Come add_rsi: ewm(com=period - 1)
+    coms = (periods - 1).astype(np.float64)
+
+    stacked = np.empty((len(values), 2 * k), dtype=np.float64, order='F')
+    stacked[:, :k] = gain[:, None]
+    stacked[:, k:] = loss[:, None]
+    smoothed = ewm_mean_columns(stacked, np.tile(coms, 2), np.tile(periods, 2))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rs = smoothed[:, :k] / smoothed[:, k:]
+        return np.asfortranarray(100 - (100 / (1 + rs)))
+
+
+def rolling_mean_columns(values: np.ndarray, period: int) -> np.ndarray:
+    """
+    Media mobile semplice dello stesso periodo su ogni colonna di una matrice
+    (barre x percorsi), con somme cumulative lungo l'asse del tempo.
+    NaN finché la finestra non è piena; pensata per serie prive di NaN.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(values.shape, np.nan, dtype=np.float64)
+    if len(values) < period:
+        return out
+    csum = np.cumsum(values, axis=0)
+    out[period - 1] = csum[period - 1]
+    out[period:] = csum[period:] - csum[:-period]
+    out[period - 1:] /= period
+    return out
+
+
+def adx_columns(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int) -> np.ndarray:
+    """ADX dello stesso periodo su ogni colonna di matrici (barre x percorsi)."""
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    nan_row = np.full((1, close.shape[1]), np.nan)
+    prev_close = np.concatenate((nan_row, close[:-1]))
+
+    plus_dm = np.concatenate((nan_row, np.diff(high, axis=0)))
+    minus_dm = np.concatenate((nan_row, np.diff(low, axis=0)))
+    plus_dm[plus_dm < 0] = 0
+    minus_dm[minus_dm > 0] = 0
+    tr = np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+
+    k = close.shape[1]
+    com = com_from_alpha(1 / period)
+    smoothed = ewm_mean_columns(np.hstack((tr, plus_dm, minus_dm)), com, period)
+    atr, plus_sm, minus_sm = smoothed[:, :k], smoothed[:, k:2 * k], smoothed[:, 2 * k:]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        plus_di = 100 * (plus_sm / atr)
+        minus_di = 100 * (np.abs(minus_sm) / atr)
+        dx = (np.abs(plus_di - minus_di) / np.abs(plus_di + minus_di)) * 100
+    return ewm_mean_columns(dx, com, period)
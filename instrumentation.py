@@ -0,0 +1,237 @@
+# File: instrumentation.py
+# Modulo per il progetto KriterionQuant Hedging App
+#
+# Strumentazione leggera della pipeline: span temporizzati (context manager
+# o decoratore), attributi come righe e byte, contatori e report JSON finale.
+# Finché non viene chiamato 'enable' ogni punto strumentato costa un solo
+# controllo di un flag globale.
+
+import cProfile
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from functools import wraps
+
+# Flag globale: letto a ogni chiamata strumentata, modificato solo da enable/disable
+ENABLED = False
+
+_lock = threading.Lock()
+_local = threading.local()
+_spans: list[dict] = []
+_counters: dict[str, float] = {}
+_started = {'wall': 0.0, 'perf': 0.0}
+
+
+class _NullSpan:
+    """Span inerte restituito quando la strumentazione è disattivata."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """
+    Intervallo temporizzato con attributi. Gli span annidati nello stesso
+    thread registrano il proprio genitore, così il report ricostruisce l'albero.
+    """
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        _local.stack.pop()
+        record = {
+            'name': self.name,
+            'parent': self.parent,
+            'thread': threading.current_thread().name,
+            'start_s': round(self.start - _started['perf'], 6),
+            'duration_s': round(duration, 6),
+            'status': 'ok' if exc_type is None else 'error',
+        }
+        if exc_type is not None:
+            record['error'] = f"{exc_type.__name__}: {exc}"
+        if self.attrs:
+            record['attrs'] = self.attrs
+        with _lock:
+            _spans.append(record)
+        return False
+
+    def set(self, **attrs):
+        """Aggiunge attributi allo span (es. rows=..., bytes=...)."""
+        self.attrs.update(attrs)
+
+
+def enable():
+    """Attiva la strumentazione e azzera i dati raccolti."""
+    global ENABLED
+    reset()
+    ENABLED = True
+
+
+def disable():
+    """Disattiva la strumentazione (i dati raccolti restano disponibili per il report)."""
+    global ENABLED
+    ENABLED = False
+
+
+def reset():
+    """Azzera span e contatori e riparte con l'orologio del report."""
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _started['wall'] = time.time()
+        _started['perf'] = time.perf_counter()
+
+
+def span(name: str, **attrs):
+    """
+    Context manager che misura un blocco di codice.
+
+    Args:
+        name (str): Nome dello span (es. 'eodhd.download').
+        **attrs: Attributi iniziali; altri si aggiungono con 'set' sullo span restituito.
+
+    Returns:
+        Span: Lo span attivo, oppure uno span inerte se la strumentazione è disattivata.
+    """
+    if not ENABLED:
+        return _NULL_SPAN
+    return Span(name, attrs)
+
+
+def annotate(**attrs):
+    """Aggiunge attributi allo span più interno attivo nel thread corrente (se presente)."""
+    if not ENABLED:
+        return
+    stack = getattr(_local, 'stack', None)
+    if stack:
+        stack[-1].set(**attrs)
+
+
+def count(name: str, value: float = 1):
+    """Incrementa un contatore globale (es. byte scaricati, messaggi inviati)."""
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def _rows(obj) -> int | None:
+    """Numero di righe di DataFrame, Series e array; None per gli altri oggetti."""
+    shape = getattr(obj, 'shape', None)
+    if shape:
+        return int(shape[0])
+    return None
+
+
+def instrumented(name: str):
+    """
+    Decoratore che avvolge una funzione in uno span. Registra automaticamente
+    le righe del primo argomento tabellare ('rows_in') e del risultato ('rows_out').
+
+    Args:
+        name (str): Nome dello span.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            with Span(name, {}) as current:
+                for arg in args:
+                    rows_in = _rows(arg)
+                    if rows_in is not None:
+                        current.set(rows_in=rows_in)
+                        break
+                result = fn(*args, **kwargs)
+                rows_out = _rows(result)
+                if rows_out is not None:
+                    current.set(rows_out=rows_out)
+                return result
+        return wrapper
+    return decorator
+
+
+def report() -> dict:
+    """
+    Report strutturato dell'esecuzione.
+
+    Returns:
+        dict: 'started_at', 'wall_time_s', 'spans' (in ordine di chiusura),
+              'summary' (numero di chiamate, tempo totale e massimo per nome) e 'counters'.
+    """
+    with _lock:
+        spans = list(_spans)
+        counters = dict(_counters)
+    summary = {}
+    for record in spans:
+        entry = summary.setdefault(record['name'], {'calls': 0, 'total_s': 0.0, 'max_s': 0.0, 'errors': 0})
+        entry['calls'] += 1
+        entry['total_s'] = round(entry['total_s'] + record['duration_s'], 6)
+        entry['max_s'] = max(entry['max_s'], record['duration_s'])
+        entry['errors'] += record['status'] == 'error'
+    return {
+        'started_at': datetime.fromtimestamp(_started['wall'], tz=timezone.utc).isoformat(),
+        'wall_time_s': round(time.perf_counter() - _started['perf'], 6),
+        'spans': spans,
+        'summary': summary,
+        'counters': counters,
+    }
+
+
+def write_report(path: str) -> dict:
+    """Salva il report in formato JSON e lo restituisce."""
+    data = report()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, default=str)
+    print(f"Report di esecuzione salvato in {path}")
+    return data
+
+
+@contextmanager
+def _profile_to(path: str):
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(path)
+        print(f"Profilo cProfile salvato in {path} (leggibile con 'python -m pstats')")
+
+
+def profiled(path: str | None):
+    """
+    Context manager che esegue il blocco sotto cProfile e salva le statistiche in 'path'.
+    Con path None non fa nulla.
+    """
+    if not path:
+        return nullcontext()
+    return _profile_to(path)
@@ -0,0 +1,134 @@
+# File: mmap_store.py
+# Modulo per il progetto KriterionQuant Hedging App
+#
+# Archivio colonnare su disco pensato per la condivisione tra processi:
+# ogni colonna è un file .npy contiguo, affiancato dall'indice delle date
+# e da un file di metadati. La lettura avviene per memory-map in sola
+# lettura, quindi ogni processo vede le stesse pagine fisiche (la cache
+# del sistema operativo) senza deserializzare né copiare i dati.
+
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+import pandas as pd
+
+_META_FILE = 'meta.json'
+_INDEX_FILE = 'index.npy'
+
+
+class MmapPriceStore:
+    """
+    Archivio di tabelle (prezzi, feature) in formato colonnare memory-mapped.
+
+    Ogni chiave è una cartella con 'index.npy' (date in nanosecondi),
+    un file .npy per colonna e 'meta.json' (righe, colonne, tipi, attributi).
+    I file .npy hanno l'intestazione allineata a 64 byte, quindi ogni colonna
+    è un blocco contiguo e allineato, leggibile come vista NumPy a costo zero.
+    """
+    VERSION = 1
+
+    def __init__(self, root: str):
+        """
+        Args:
+            root (str): Cartella che contiene le tabelle dell'archivio.
+        """
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        safe_key = key.replace('/', '_').replace('\\', '_')
+        return os.path.join(self.root, safe_key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(os.path.join(self.path(key), _META_FILE))
+
+    def save(self, key: str, df: pd.DataFrame, attrs: dict | None = None) -> str:
+        """
+        Scrive una tabella. La scrittura avviene in una cartella temporanea poi
+        rinominata, così un lettore non vede mai una tabella a metà.
+
+        Args:
+            key (str): Nome della tabella (es. il ticker).
+            df (pd.DataFrame): Tabella con indice di date e colonne numeriche.
+            attrs (dict, optional): Metadati liberi serializzabili in JSON.
+
+        Returns:
+            str: Percorso della tabella.
+        """
+        target = self.path(key)
+        tmp_dir = f"{target}.tmp-{uuid.uuid4().hex}"
+        os.makedirs(tmp_dir)
+        try:
+            index = pd.DatetimeIndex(df.index)
+            np.save(os.path.join(tmp_dir, _INDEX_FILE), index.as_unit('ns').asi8)
+            columns = [str(c) for c in df.columns]
+            dtypes = {}
+            for number, column in enumerate(columns):
+                values = np.ascontiguousarray(df.iloc[:, number].to_numpy())
+                dtypes[column] = values.dtype.str
+                np.save(os.path.join(tmp_dir, f"{number}.npy"), values)
+            meta = {'version': self.VERSION, 'rows': len(df), 'columns': columns, 'dtypes': dtypes,
+                    'index_name': index.name, 'tz': str(index.tz) if index.tz else None,
+                    'attrs': attrs or {}}
+            with open(os.path.join(tmp_dir, _META_FILE), 'w') as f:
+                json.dump(meta, f, indent=2)
+
+            # Sostituzione della versione precedente: la vecchia cartella viene spostata e poi rimossa
+            old_dir = None
+            if os.path.exists(target):
+                old_dir = f"{target}.old-{uuid.uuid4().hex}"
+                os.replace(target, old_dir)
+            os.replace(tmp_dir, target)
+            if old_dir:
+                shutil.rmtree(old_dir, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        return target
+
+    def meta(self, key: str) -> dict | None:
+        """Metadati di una tabella, o None se assente."""
+        path = os.path.join(self.path(key), _META_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def column(self, key: str, name: str) -> np.ndarray:
+        """Una colonna come array memory-mapped in sola lettura."""
+        meta = self.meta(key)
+        if meta is None:
+            raise KeyError(f"Tabella assente nell'archivio: {key}")
+        number = meta['columns'].index(name)
+        return np.load(os.path.join(self.path(key), f"{number}.npy"), mmap_mode='r')
+
+    def index(self, key: str) -> pd.DatetimeIndex:
+        meta = self.meta(key)
+        if meta is None:
+            raise KeyError(f"Tabella assente nell'archivio: {key}")
+        values = np.load(os.path.join(self.path(key), _INDEX_FILE), mmap_mode='r')
+        index = pd.DatetimeIndex(values.view('M8[ns]'), name=meta['index_name'])
+        return index.tz_localize('UTC').tz_convert(meta['tz']) if meta['tz'] else index
+
+    def load(self, key: str, columns: list[str] | None = None) -> pd.DataFrame | None:
+        """
+        Apre una tabella come DataFrame costruito su viste memory-mapped (nessuna copia).
+
+        Args:
+            key (str): Nome della tabella.
+            columns (list[str], optional): Sottoinsieme di colonne da aprire.
+
+        Returns:
+            pd.DataFrame | None: La tabella in sola lettura, o None se assente.
+        """
+        meta = self.meta(key)
+        if meta is None:
+            return None
+        names = columns or meta['columns']
+        data = {name: np.load(os.path.join(self.path(key), f"{meta['columns'].index(name)}.npy"), mmap_mode='r')
+                for name in names}
+        # Con copy=False ogni colonna resta un blocco separato che punta al proprio file
+        return pd.DataFrame(data, index=self.index(key), columns=names, copy=False)
@@ -0,0 +1,282 @@
+# File: notification_dispatcher.py
+# Modulo per il progetto KriterionQuant Hedging App
+#
+# Invio asincrono delle notifiche Telegram a più chat e strategie:
+# connessioni riutilizzate, limiti di frequenza per chat e globali,
+# coda persistente con nuovi tentativi, soppressione dei messaggi
+# il cui stato non è cambiato e riepilogo giornaliero opzionale.
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import instrumentation
+
+# Limiti di Telegram: circa 1 messaggio al secondo per chat privata,
+# 20 al minuto per gruppo e 30 al secondo in totale per bot
+PRIVATE_CHAT_INTERVAL = 1.0
+GROUP_CHAT_INTERVAL = 3.0
+GLOBAL_RATE = 30
+
+DEFAULT_STATE_DIR = 'notification_state'
+
+TELEGRAM_API_ROOT = 'https://api.telegram.org'
+
+
+class AsyncRateLimiter:
+    """Token bucket per coroutine: come RateLimiter di data_handler, ma l'attesa non blocca il loop."""
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _atomic_write_json(path: str, data):
+    """Scrive il JSON in un file temporaneo e lo sostituisce all'originale: mai file a metà."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str, default):
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"File di stato illeggibile ({path}), verrà ricreato: {e}")
+        return default
+
+
+class NotificationDispatcher:
+    """
+    Distributore delle notifiche Telegram.
+
+    Ogni notifica è un dizionario con 'chat_id' e 'text' e, facoltativamente,
+    'strategy' e 'state'. Se 'state' coincide con l'ultimo stato inviato
+    alla stessa chat per la stessa strategia, il messaggio viene soppresso
+    (le notifiche senza 'state', come gli errori, partono sempre). Le chat
+    vengono servite in parallelo, i messaggi di una stessa chat in ordine;
+    quelli non consegnati restano in una coda su disco per l'esecuzione successiva.
+    """
+    def __init__(self, bot_token: str, state_dir: str = DEFAULT_STATE_DIR, digest: bool = False,
+                 max_attempts: int = 5, retry_backoff: float = 60.0, concurrency: int = 32,
+                 api_root: str | None = None, timeout: float = 10.0):
+        """
+        Args:
+            bot_token (str): Token del bot Telegram.
+            state_dir (str): Cartella di coda e ultimo stato inviato (da persistere tra le esecuzioni).
+            digest (bool): Se True, i messaggi soppressi perché invariati vengono raccolti
+                in un unico riepilogo per chat, al più uno al giorno (UTC).
+            max_attempts (int): Tentativi massimi per messaggio, sommando le esecuzioni.
+            retry_backoff (float): Attesa base in secondi prima di ritentare un messaggio in coda
+                (raddoppia a ogni tentativo).
+            concurrency (int): Richieste HTTP contemporanee (e connessioni nel pool).
+            api_root (str, optional): Radice dell'API di Telegram (default: variabile d'ambiente
+                TELEGRAM_API_ROOT, altrimenti l'API reale).
+            timeout (float): Timeout di ogni richiesta in secondi.
+        """
+        self.bot_token = bot_token
+        self.state_dir = state_dir
+        self.digest = digest
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.concurrency = concurrency
+        api_root = api_root or os.environ.get('TELEGRAM_API_ROOT') or TELEGRAM_API_ROOT
+        self.api_url = f"{api_root.rstrip('/')}/bot{bot_token}/sendMessage"
+        self.timeout = timeout
+        os.makedirs(state_dir, exist_ok=True)
+        self.queue_path = os.path.join(state_dir, 'queue.json')
+        self.state_path = os.path.join(state_dir, 'last_sent.json')
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    # ------------------------------------------------------------------
+    # Invio
+    # ------------------------------------------------------------------
+
+    def _post(self, chat_id: str, text: str) -> tuple[bool, float | None, str]:
+        """
+        Una richiesta sendMessage (eseguita in un thread del pool).
+
+        Returns:
+            tuple: (consegnato, secondi di attesa prima di ritentare o None se
+                   l'errore è definitivo, descrizione dell'esito).
+        """
+        payload = {'chat_id': chat_id, 'text': text, 'parse_mode': 'Markdown'}
+        with instrumentation.span('telegram.dispatch_message', chat_id=str(chat_id),
+                                  message_bytes=len(text.encode('utf-8'))) as span:
+            try:
+                response = self.session.post(self.api_url, json=payload, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                return False, 1.0, f"connessione: {e}"
+            span.set(status_code=response.status_code)
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        if response.status_code == 200 and body.get('ok'):
+            return True, None, 'ok'
+        if response.status_code == 429:
+            return False, float(body.get('parameters', {}).get('retry_after', 1)), 'limite di frequenza'
+        if response.status_code >= 500:
+            return False, 1.0, f"errore del server {response.status_code}"
+        # 400/403 (testo non valido, bot bloccato, chat inesistente): ritentare non servirebbe
+        return False, None, f"{response.status_code} {body.get('description', '')}".strip()
+
+    async def _send_chat(self, items: list[dict], chat_limiter: AsyncRateLimiter,
+                         global_limiter: AsyncRateLimiter, executor: ThreadPoolExecutor) -> list[tuple]:
+        """Invia in ordine i messaggi di una chat; alla prima consegna fallita rimanda i successivi."""
+        loop = asyncio.get_running_loop()
+        outcomes = []
+        for position, item in enumerate(items):
+            await chat_limiter.acquire()
+            await global_limiter.acquire()
+            delivered, retry_after, detail = await loop.run_in_executor(
+                executor, self._post, item['chat_id'], item['text'])
+            # Un solo nuovo tentativo immediato se Telegram chiede un'attesa breve
+            if not delivered and retry_after is not None and retry_after <= 5:
+                await asyncio.sleep(retry_after)
+                await global_limiter.acquire()
+                delivered, retry_after, detail = await loop.run_in_executor(
+                    executor, self._post, item['chat_id'], item['text'])
+            outcomes.append((item, delivered, retry_after is not None, detail))
+            if not delivered and retry_after is not None:
+                # Mantiene l'ordine dei messaggi della chat: i successivi restano in coda
+                outcomes.extend((later, False, True, 'rimandato') for later in items[position + 1:])
+                break
+        return outcomes
+
+    # ------------------------------------------------------------------
+    # Coda, stato e riepilogo
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _state_key(item: dict) -> str:
+        return f"{item['chat_id']}|{item.get('strategy') or ''}"
+
+    def _build_digests(self, unchanged: list[dict], last_sent: dict, today: str) -> list[dict]:
+        by_chat: dict[str, list[dict]] = {}
+        for item in unchanged:
+            # Uno stato già comunicato oggi non ha bisogno di riepilogo
+            if last_sent[self._state_key(item)].get('sent_at', '')[:10] != today:
+                by_chat.setdefault(item['chat_id'], []).append(item)
+        digests = []
+        for chat_id, items in by_chat.items():
+            if last_sent.get(f"{chat_id}|__digest__", {}).get('date') == today:
+                continue
+            body = "\n\n".join(item['text'] for item in items)
+            digests.append({'id': uuid.uuid4().hex, 'chat_id': chat_id, 'strategy': '__digest__',
+                            'state': None, 'digest_date': today, 'attempts': 0, 'next_attempt': 0.0,
+                            'text': f"🗓️ *Riepilogo giornaliero* (nessuna variazione)\n\n{body}"})
+        return digests
+
+    async def dispatch_async(self, notifications: list[dict]) -> dict:
+        """
+        Accoda le nuove notifiche insieme a quelle rimaste in sospeso e le consegna.
+
+        Args:
+            notifications (list[dict]): Notifiche con 'chat_id', 'text' e, facoltativi,
+                'strategy' e 'state'.
+
+        Returns:
+            dict: Conteggi 'sent', 'suppressed', 'digests', 'queued' (da ritentare)
+                  e 'dropped' (scartati dopo errori definitivi o troppi tentativi).
+        """
+        now = time.time()
+        today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        pending = _read_json(self.queue_path, [])
+        last_sent = _read_json(self.state_path, {})
+
+        fresh = [{'id': uuid.uuid4().hex, 'chat_id': str(n['chat_id']), 'text': n['text'],
+                  'strategy': n.get('strategy'), 'state': n.get('state'),
+                  'attempts': 0, 'next_attempt': 0.0} for n in notifications]
+        # Un messaggio nuovo sostituisce quello in sospeso per la stessa chat e strategia
+        superseded = {self._state_key(item) for item in fresh if item['strategy']}
+        queue = [item for item in pending if not item['strategy'] or self._state_key(item) not in superseded]
+        queue += fresh
+
+        to_send, unchanged = [], []
+        for item in queue:
+            previous = last_sent.get(self._state_key(item), {}).get('state')
+            if item['state'] is not None and item['state'] == previous:
+                unchanged.append(item)
+            else:
+                to_send.append(item)
+        digests = self._build_digests(unchanged, last_sent, today) if self.digest else []
+        to_send += digests
+
+        ready = [item for item in to_send if item['next_attempt'] <= now]
+        waiting = [item for item in to_send if item['next_attempt'] > now]
+
+        by_chat: dict[str, list[dict]] = {}
+        for item in ready:
+            by_chat.setdefault(item['chat_id'], []).append(item)
+        global_limiter = AsyncRateLimiter(GLOBAL_RATE, GLOBAL_RATE)
+        with ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, len(by_chat)))) as executor:
+            # I gruppi hanno un identificativo negativo e limiti più stretti
+            tasks = [self._send_chat(items, AsyncRateLimiter(
+                         1 / (GROUP_CHAT_INTERVAL if chat_id.startswith('-') else PRIVATE_CHAT_INTERVAL), 1),
+                         global_limiter, executor)
+                     for chat_id, items in by_chat.items()]
+            results = await asyncio.gather(*tasks)
+
+        summary = {'sent': 0, 'suppressed': len(unchanged), 'digests': 0, 'queued': 0, 'dropped': 0}
+        retained = list(waiting)
+        for item, delivered, retryable, detail in (outcome for chat in results for outcome in chat):
+            if delivered:
+                summary['sent'] += 1
+                if item['strategy'] == '__digest__':
+                    summary['digests'] += 1
+                    last_sent[f"{item['chat_id']}|__digest__"] = {'date': item['digest_date']}
+                elif item['state'] is not None:
+                    last_sent[self._state_key(item)] = {
+                        'state': item['state'], 'sent_at': datetime.now(timezone.utc).isoformat()}
+                continue
+            if item['strategy'] == '__digest__':
+                # I riepiloghi non consegnati vengono ricostruiti alla prossima esecuzione
+                continue
+            item['attempts'] += 1
+            if retryable and item['attempts'] < self.max_attempts:
+                item['next_attempt'] = now + self.retry_backoff * 2 ** (item['attempts'] - 1)
+                retained.append(item)
+                summary['queued'] += 1
+            else:
+                print(f"Messaggio per la chat {item['chat_id']} scartato ({detail}).")
+                summary['dropped'] += 1
+
+        _atomic_write_json(self.queue_path, retained)
+        _atomic_write_json(self.state_path, last_sent)
+        instrumentation.count('telegram.messages', summary['sent'])
+        print(f"Notifiche: {summary['sent']} inviate, {summary['suppressed']} invariate, "
+              f"{summary['queued']} in coda, {summary['dropped']} scartate.")
+        return summary
+
+    def dispatch(self, notifications: list[dict]) -> dict:
+        """Versione sincrona di 'dispatch_async', per script e GitHub Action."""
+        return asyncio.run(self.dispatch_async(notifications))
@@ -0,0 +1,321 @@
+# File: online_indicators.py
+# Modulo per il progetto KriterionQuant Hedging App
+#
+# Versioni incrementali (una barra alla volta) degli indicatori di
+# IndicatorCalculator. Ogni aggiornamento costa O(1) e lo stato può essere
+# salvato con to_dict() e ripristinato con from_dict().
+# Il modulo usa solo la libreria standard, così può girare anche senza pandas.
+
+import math
+from collections import deque
+
+NAN = float('nan')
+
+
+def _div(a: float, b: float) -> float:
+    """Divisione con la semantica IEEE di NumPy/pandas (inf o NaN invece di eccezioni)."""
+    try:
+        return a / b
+    except ZeroDivisionError:
+        if a != a or a == 0:
+            return NAN
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+
+
+def _nanmax(*values: float) -> float:
+    """Massimo che ignora i NaN (NaN solo se lo sono tutti)."""
+    valid = [v for v in values if v == v]
+    return max(valid) if valid else NAN
+
+
+class OnlineEWM:
+    """
+    Media esponenziale incrementale, identica a ewm(com=..., min_periods=...).mean()
+    di pandas con i parametri di default (adjust=True, ignore_na=False).
+    """
+    def __init__(self, com: float, min_periods: int = 0):
+        self.com = com
+        self.min_periods = min_periods
+        self.old_wt_factor = 1. - 1. / (1. + com)
+        self.weighted = NAN
+        self.old_wt = 1.
+        self.nobs = 0
+
+    @classmethod
+    def from_alpha(cls, alpha: float, min_periods: int = 0) -> 'OnlineEWM':
+        """Costruttore equivalente a ewm(alpha=...): pandas converte alpha in center of mass."""
+        return cls((1 - alpha) / alpha, min_periods)
+
+    def update(self, value: float) -> float:
+        value = float(value)
+        is_observation = value == value
+        if is_observation:
+            self.nobs += 1
+        if self.weighted == self.weighted:
+            self.old_wt *= self.old_wt_factor
+            if is_observation:
+                if self.weighted != value:
+                    self.weighted = (self.old_wt * self.weighted + value) / (self.old_wt + 1.)
+                self.old_wt += 1.
+        elif is_observation:
+            self.weighted = value
+        return self.value
+
+    @property
+    def value(self) -> float:
+        return self.weighted if self.nobs >= self.min_periods else NAN
+
+    def to_dict(self) -> dict:
+        return {'com': self.com, 'min_periods': self.min_periods, 'weighted': self.weighted,
+                'old_wt': self.old_wt, 'nobs': self.nobs}
+
+    @classmethod
+    def from_dict(cls, state: dict) -> 'OnlineEWM':
+        obj = cls(state['com'], state['min_periods'])
+        obj.weighted = state['weighted']
+        obj.old_wt = state['old_wt']
+        obj.nobs = state['nobs']
+        return obj
+
+
+class OnlineSMA:
+    """
+    Media mobile semplice incrementale, equivalente a rolling(window=period).mean().
+    Replica la somma compensata (Kahan) usata da pandas, quindi i valori coincidono.
+    """
+    def __init__(self, period: int):
+        self.period = period
+        self.window = deque()
+        self.nobs = 0
+        self.neg_ct = 0
+        self.sum_x = 0.
+        self.compensation_add = 0.
+        self.compensation_remove = 0.
+        self.num_consecutive_same_value = 0
+        self.prev_value = NAN
+
+    def _reset(self, value: float):
+        self.nobs = 0
+        self.neg_ct = 0
+        self.sum_x = 0.
+        self.compensation_add = 0.
+        self.compensation_remove = 0.
+        self.num_consecutive_same_value = 0
+        self.prev_value = value
+
+    def _add(self, value: float):
+        if value != value:
+            return
+        self.nobs += 1
+        y = value - self.compensation_add
+        t = self.sum_x + y
+        self.compensation_add = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, value) < 0:
+            self.neg_ct += 1
+        if value == self.prev_value:
+            self.num_consecutive_same_value += 1
+        else:
+            self.num_consecutive_same_value = 1
+        self.prev_value = value
+
+    def _remove(self, value: float):
+        if value != value:
+            return
+        self.nobs -= 1
+        y = -value - self.compensation_remove
+        t = self.sum_x + y
+        self.compensation_remove = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, value) < 0:
+            self.neg_ct -= 1
+
+    def update(self, value: float) -> float:
+        value = float(value)
+        if not self.window or self.period == 1:
+            # Come pandas: la prima finestra (o ogni finestra di lunghezza 1) riparte da zero
+            self.window.clear()
+            self._reset(value)
+        elif len(self.window) == self.period:
+            self._remove(self.window.popleft())
+        self.window.append(value)
+        self._add(value)
+        return self.value
+
+    @property
+    def value(self) -> float:
+        if self.nobs < self.period or self.nobs == 0:
+            return NAN
+        result = self.sum_x / self.nobs
+        if self.num_consecutive_same_value >= self.nobs:
+            result = self.prev_value
+        elif self.neg_ct == 0 and result < 0:
+            result = 0.
+        elif self.neg_ct == self.nobs and result > 0:
+            result = 0.
+        return result
+
+    def to_dict(self) -> dict:
+        state = dict(self.__dict__)
+        state['window'] = list(self.window)
+        return state
+
+    @classmethod
+    def from_dict(cls, state: dict) -> 'OnlineSMA':
+        obj = cls(state['period'])
+        obj.__dict__.update(state)
+        obj.window = deque(state['window'])
+        return obj
+
+
+class OnlineRSI:
+    """RSI incrementale, equivalente a IndicatorCalculator.add_rsi."""
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.prev_price = NAN
+        self.gain = OnlineEWM(period - 1, min_periods=period)
+        self.loss = OnlineEWM(period - 1, min_periods=period)
+
+    def update(self, price: float) -> float:
+        price = float(price)
+        delta = price - self.prev_price
+        self.prev_price = price
+        # Come delta.where(delta > 0, 0): il primo delta (NaN) vale zero
+        self.gain.update(delta if delta > 0 else 0.)
+        self.loss.update(-(delta if delta < 0 else 0.))
+        return self.value
+
+    @property
+    def value(self) -> float:
+        rs = _div(self.gain.value, self.loss.value)
+        return 100 - _div(100, 1 + rs)
+
+    def to_dict(self) -> dict:
+        return {'period': self.period, 'prev_price': self.prev_price,
+                'gain': self.gain.to_dict(), 'loss': self.loss.to_dict()}
+
+    @classmethod
+    def from_dict(cls, state: dict) -> 'OnlineRSI':
+        obj = cls(state['period'])
+        obj.prev_price = state['prev_price']
+        obj.gain = OnlineEWM.from_dict(state['gain'])
+        obj.loss = OnlineEWM.from_dict(state['loss'])
+        return obj
+
+
+class OnlineBollinger:
+    """
+    Bande di Bollinger incrementali (media e deviazione standard mobili, ddof=1)
+    con il metodo di Welford per aggiungere e togliere osservazioni dalla finestra.
+    """
+    def __init__(self, period: int = 20, std: float = 2.0):
+        self.period = period
+        self.std = std
+        self.window = deque()
+        self.nobs = 0
+        self.mean_x = 0.
+        self.ssqdm_x = 0.
+        self.num_consecutive_same_value = 0
+        self.prev_value = NAN
+
+    def update(self, value: float) -> tuple[float, float, float]:
+        value = float(value)
+        if len(self.window) == self.period:
+            old = self.window.popleft()
+            if old == old:
+                self.nobs -= 1
+                if self.nobs:
+                    delta = old - self.mean_x
+                    self.mean_x -= delta / self.nobs
+                    self.ssqdm_x -= (old - self.mean_x) * delta
+                else:
+                    self.mean_x = 0.
+                    self.ssqdm_x = 0.
+        self.window.append(value)
+        if value == value:
+            self.nobs += 1
+            delta = value - self.mean_x
+            self.mean_x += delta / self.nobs
+            self.ssqdm_x += (value - self.mean_x) * delta
+            # Come pandas: una finestra di valori tutti uguali ha varianza esattamente nulla
+            if value == self.prev_value:
+                self.num_consecutive_same_value += 1
+            else:
+                self.num_consecutive_same_value = 1
+            self.prev_value = value
+        return self.value
+
+    @property
+    def value(self) -> tuple[float, float, float]:
+        """Tripla (banda media, banda superiore, banda inferiore)."""
+        if self.nobs < self.period or self.period < 2:
+            return NAN, NAN, NAN
+        if self.num_consecutive_same_value >= self.nobs:
+            rolling_std = 0.
+        else:
+            rolling_std = math.sqrt(max(self.ssqdm_x / (self.nobs - 1), 0.))
+        middle = self.mean_x
+        return middle, middle + rolling_std * self.std, middle - rolling_std * self.std
+
+    def to_dict(self) -> dict:
+        state = dict(self.__dict__)
+        state['window'] = list(self.window)
+        return state
+
+    @classmethod
+    def from_dict(cls, state: dict) -> 'OnlineBollinger':
+        obj = cls(state['period'], state['std'])
+        obj.__dict__.update(state)
+        obj.window = deque(state['window'])
+        return obj
+
+
+class OnlineADX:
+    """ADX incrementale, equivalente a IndicatorCalculator.add_adx."""
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.prev_high = NAN
+        self.prev_low = NAN
+        self.prev_close = NAN
+        alpha = 1 / period
+        self.atr = OnlineEWM.from_alpha(alpha, min_periods=period)
+        self.plus_dm = OnlineEWM.from_alpha(alpha, min_periods=period)
+        self.minus_dm = OnlineEWM.from_alpha(alpha, min_periods=period)
+        self.adx = OnlineEWM.from_alpha(alpha, min_periods=period)
+
+    def update(self, high: float, low: float, close: float) -> float:
+        high, low, close = float(high), float(low), float(close)
+        plus_dm = high - self.prev_high
+        minus_dm = low - self.prev_low
+        if plus_dm < 0:
+            plus_dm = 0.
+        if minus_dm > 0:
+            minus_dm = 0.
+        tr = _nanmax(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.prev_high, self.prev_low, self.prev_close = high, low, close
+
+        atr = self.atr.update(tr)
+        plus_di = 100 * _div(self.plus_dm.update(plus_dm), atr)
+        minus_di = 100 * _div(abs(self.minus_dm.update(minus_dm)), atr)
+        dx = _div(abs(plus_di - minus_di), abs(plus_di + minus_di)) * 100
+        return self.adx.update(dx)
+
+    @property
+    def value(self) -> float:
+        return self.adx.value
+
+    def to_dict(self) -> dict:
+        return {'period': self.period, 'prev_high': self.prev_high, 'prev_low': self.prev_low,
+                'prev_close': self.prev_close, 'atr': self.atr.to_dict(),
+                'plus_dm': self.plus_dm.to_dict(), 'minus_dm': self.minus_dm.to_dict(),
+                'adx': self.adx.to_dict()}
+
+    @classmethod
+    def from_dict(cls, state: dict) -> 'OnlineADX':
+        obj = cls(state['period'])
+        obj.prev_high = state['prev_high']
+        obj.prev_low = state['prev_low']
+        obj.prev_close = state['prev_close']
+        for name in ('atr', 'plus_dm', 'minus_dm', 'adx'):
+            setattr(obj, name, OnlineEWM.from_dict(state[name]))
+        return obj
@@ -0,0 +1,301 @@
+# File: optimizer.py
+# Modulo per il progetto KriterionQuant Hedging App
+
+import argparse
+import configparser
+import heapq
+import itertools
+import os
+import tempfile
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from feature_cache import CachedIndicatorCalculator
+from indicator_calculator import IndicatorCalculator
+from backtester import EventDrivenBacktester
+from performance_analyzer import PerformanceAnalyzer
+from mmap_store import MmapPriceStore
+from results_store import ResultsStore, DEFAULT_STORE_PATH
+
+# Colonne di prezzo necessarie a indicatori e backtest
+PRICE_COLUMNS = ['high', 'low', 'close', 'adj_close']
+
+# Griglia di default attorno ai parametri attualmente in produzione
+DEFAULT_GRID = {
+    'fast_ma': list(range(10, 55, 5)),
+    'slow_ma': list(range(20, 105, 5)),
+    'adx_period': [10, 14, 20],
+    'adx_threshold': [10, 15, 20, 25],
+    'stop_loss_perc': [0.03, 0.05, 0.10, 0.15],
+    'hedge_ratio': [0.5, 1.0]
+}
+
+# Stato del processo worker: DataFrame memory-mapped in sola lettura
+_WORKER = {}
+
+
+def _attach_worker(store_root: str, key: str, initial_capital: float):
+    """
+    Inizializzatore dei worker: apre la tabella delle feature per memory-map.
+    Non riceve né deserializza dati: tutti i processi leggono le stesse pagine.
+    """
+    _WORKER['data'] = MmapPriceStore(store_root).load(key)
+    _WORKER['initial_capital'] = initial_capital
+
+
+@contextmanager
+def shared_features(features: pd.DataFrame, initial_capital: float):
+    """
+    Scrive la matrice delle feature in un MmapPriceStore temporaneo per tutta la durata del blocco.
+
+    Yields:
+        tuple: Argomenti da passare a '_attach_worker' come initargs del pool.
+    """
+    with tempfile.TemporaryDirectory(prefix='kq_features_') as root:
+        MmapPriceStore(root).save('features', features.astype(np.float64))
+        yield (root, 'features', initial_capital)
+
+
+def _evaluate_group(fast_ma: int, slow_ma: int, adx_period: int, combos: list[tuple]) -> list[dict]:
+    """
+    Valuta tutte le combinazioni che condividono gli stessi indicatori,
+    letti dalla matrice delle feature precalcolata nel processo principale.
+    """
+    return evaluate_combinations(_WORKER['data'], fast_ma, slow_ma, adx_period, combos,
+                                 _WORKER['initial_capital'])
+
+
+def evaluate_combinations(data: pd.DataFrame, fast_ma: int, slow_ma: int, adx_period: int,
+                          combos: list[tuple], initial_capital: float) -> list[dict]:
+    """
+    Esegue indicatori, backtest e KPI per un gruppo di combinazioni.
+
+    Args:
+        data (pd.DataFrame): Dati OHLC (almeno high, low, close, adj_close). Gli indicatori
+            già presenti come colonne vengono riutilizzati, gli altri calcolati (con cache).
+        fast_ma, slow_ma, adx_period (int): Parametri degli indicatori comuni al gruppo.
+        combos (list[tuple]): Tuple (adx_threshold, stop_loss_perc, hedge_ratio) da valutare.
+        initial_capital (float): Capitale iniziale del backtest.
+
+    Returns:
+        list[dict]: Parametri e KPI di ciascuna combinazione.
+    """
+    col_fast, col_slow, col_adx = f'sma_{fast_ma}', f'sma_{slow_ma}', f'ADX_{adx_period}'
+    df = data[PRICE_COLUMNS].copy(deep=False)
+    calc = CachedIndicatorCalculator()
+    for col, compute in ((col_fast, lambda d: calc.add_moving_average(d, period=fast_ma)),
+                         (col_slow, lambda d: calc.add_moving_average(d, period=slow_ma)),
+                         (col_adx, lambda d: calc.add_adx(d, period=adx_period))):
+        if col in data.columns:
+            df[col] = data[col]
+        else:
+            df = compute(df)
+    df.dropna(inplace=True)
+
+    results = []
+    if len(df) < 2:
+        return results
+
+    trend_down = (df[col_fast] < df[col_slow]).to_numpy()
+    adx = df[col_adx].to_numpy()
+    backtester = EventDrivenBacktester()
+
+    # Le macchine a stati di tutte le coppie (soglia ADX, Stop Loss) avanzano insieme in un
+    # solo passaggio sui prezzi; l'hedge ratio entra solo nelle curve di equity
+    thresholds = sorted({adx_threshold for adx_threshold, _, _ in combos})
+    levels = sorted({stop_loss_perc for _, stop_loss_perc, _ in combos})
+    signals = pd.DataFrame({t: np.where(trend_down & (adx > t), -1, 0) for t in thresholds}, index=df.index)
+    positions = backtester.compute_positions_batch(df, signals, levels)
+    pairs = pd.MultiIndex.from_tuples([(adx_threshold, stop_loss_perc) for adx_threshold, stop_loss_perc, _ in combos])
+    bt = backtester.compute_equity_batch(df, positions.iloc[:, positions.columns.get_indexer(pairs)],
+                                         initial_capital, [hedge_ratio for _, _, hedge_ratio in combos])
+
+    # KPI di tutte le combinazioni del gruppo in un unico passaggio
+    kpis = PerformanceAnalyzer.batch_kpis(bt['hedged'].to_numpy(), bt['positions'].to_numpy(),
+                                          bt['hedge_only_returns'].to_numpy())
+    for (adx_threshold, stop_loss_perc, hedge_ratio), row in zip(combos, kpis.to_dict('records')):
+        results.append({
+            'fast_ma': fast_ma, 'slow_ma': slow_ma, 'adx_period': adx_period,
+            'adx_threshold': adx_threshold, 'stop_loss_perc': stop_loss_perc,
+            'hedge_ratio': hedge_ratio, **row
+        })
+    return results
+
+
+def _rank_value(result: dict, rank_by: str) -> float:
+    """Valore del KPI usato per la classifica (-inf se mancante o NaN)."""
+    value = result.get(rank_by, np.nan)
+    return -np.inf if value is None or np.isnan(value) else float(value)
+
+
+class ParameterOptimizer:
+    """
+    Ottimizzazione a griglia dei parametri della strategia di hedging.
+
+    Tutte le medie mobili e tutti gli ADX della griglia vengono calcolati in un
+    unico passaggio (API batch di IndicatorCalculator) e pubblicati, insieme ai
+    prezzi, in un archivio colonnare memory-mapped: i worker li leggono senza riceverne copie.
+    Le combinazioni vengono raggruppate per (fast_ma, slow_ma, adx_period) e
+    distribuite su un pool di processi. Con un ResultsStore le combinazioni già
+    valutate sugli stessi dati vengono lette dall'archivio e solo le altre calcolate.
+    """
+    def __init__(self, data: pd.DataFrame, initial_capital: float = 50000,
+                 max_workers: int | None = None, results_store: ResultsStore | None = None,
+                 ticker: str | None = None):
+        """
+        Args:
+            data (pd.DataFrame): Dati OHLCV come restituiti da EODHDClient.
+            initial_capital (float): Capitale iniziale per ciascun backtest.
+            max_workers (int, optional): Numero di processi (default: numero di core).
+            results_store (ResultsStore, optional): Archivio in cui cercare e salvare i risultati.
+            ticker (str, optional): Ticker dei dati, registrato nell'archivio.
+        """
+        self.data = data[PRICE_COLUMNS].astype(np.float64)
+        self.initial_capital = initial_capital
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.results_store = results_store
+        self.fingerprint = None
+        if results_store is not None:
+            self.fingerprint = ResultsStore.fingerprint(self.data)
+            results_store.register_dataset(self.fingerprint, self.data, ticker)
+
+    @staticmethod
+    def build_tasks(grid: dict) -> list[tuple]:
+        """Raggruppa le combinazioni valide della griglia per indicatori condivisi."""
+        tasks = []
+        for fast_ma, slow_ma, adx_period in itertools.product(grid['fast_ma'], grid['slow_ma'], grid['adx_period']):
+            if fast_ma >= slow_ma:
+                continue
+            combos = list(itertools.product(grid['adx_threshold'], grid['stop_loss_perc'], grid['hedge_ratio']))
+            tasks.append((fast_ma, slow_ma, adx_period, combos))
+        return tasks
+
+    def build_features(self, grid: dict) -> pd.DataFrame:
+        """Prezzi più tutte le SMA e gli ADX richiesti dalla griglia, calcolati in batch."""
+        ma_periods = sorted(set(grid['fast_ma']) | set(grid['slow_ma']))
+        adx_periods = sorted(set(grid['adx_period']))
+        return pd.concat([
+            self.data,
+            IndicatorCalculator.moving_average_bank(self.data, ma_periods),
+            IndicatorCalculator.adx_bank(self.data, adx_periods)
+        ], axis=1)
+
+    def _split_stored(self, tasks: list[tuple]) -> tuple[list[dict], list[tuple]]:
+        """
+        Separa le combinazioni già presenti nell'archivio da quelle da calcolare.
+
+        Returns:
+            tuple: (risultati salvati, gruppi con le sole combinazioni mancanti).
+        """
+        stored = self.results_store.lookup(self.fingerprint, self.initial_capital)
+        hits, pending = [], []
+        for fast_ma, slow_ma, adx_period, combos in tasks:
+            missing = []
+            for combo in combos:
+                kpis = stored.get((fast_ma, slow_ma, adx_period, *combo))
+                if kpis is None:
+                    missing.append(combo)
+                else:
+                    adx_threshold, stop_loss_perc, hedge_ratio = combo
+                    hits.append({'fast_ma': fast_ma, 'slow_ma': slow_ma, 'adx_period': adx_period,
+                                 'adx_threshold': adx_threshold, 'stop_loss_perc': stop_loss_perc,
+                                 'hedge_ratio': hedge_ratio, **kpis})
+            if missing:
+                pending.append((fast_ma, slow_ma, adx_period, missing))
+        return hits, pending
+
+    def iter_results(self, grid: dict = None):
+        """
+        Esegue la griglia e restituisce i risultati man mano che i gruppi terminano.
+
+        Yields:
+            dict: Parametri e KPI di una singola combinazione.
+        """
+        grid = grid or DEFAULT_GRID
+        tasks = self.build_tasks(grid)
+        if self.results_store is not None:
+            hits, tasks = self._split_stored(tasks)
+            yield from hits
+            if not tasks:
+                return
+        features = self.build_features(grid)
+        with shared_features(features, self.initial_capital) as init_args:
+            with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_attach_worker,
+                                     initargs=init_args) as executor:
+                futures = [executor.submit(_evaluate_group, *task) for task in tasks]
+                for future in as_completed(futures):
+                    results = future.result()
+                    if self.results_store is not None:
+                        self.results_store.put_many(
+                            self.fingerprint, [{**r, 'initial_capital': self.initial_capital} for r in results],
+                            source='optimizer')
+                    yield from results
+
+    def run(self, grid: dict = None, rank_by: str = 'Return on MaxDD', top_n: int = 20,
+            progress_callback=None) -> pd.DataFrame:
+        """
+        Esegue la griglia e restituisce le migliori combinazioni.
+
+        Args:
+            grid (dict, optional): Valori da esplorare per ciascun parametro (default: DEFAULT_GRID).
+            rank_by (str): KPI usato per la classifica (es. 'Return on MaxDD', 'Sharpe Ratio').
+            top_n (int): Numero di combinazioni da restituire.
+            progress_callback (callable, optional): Chiamata con il numero di combinazioni valutate.
+
+        Returns:
+            pd.DataFrame: Le migliori combinazioni ordinate per 'rank_by' decrescente.
+        """
+        best = []
+        for count, result in enumerate(self.iter_results(grid), start=1):
+            item = (_rank_value(result, rank_by), count, result)
+            if len(best) < top_n:
+                heapq.heappush(best, item)
+            else:
+                heapq.heappushpop(best, item)
+            if progress_callback is not None:
+                progress_callback(count)
+
+        ranked = [result for _, _, result in sorted(best, key=lambda x: (x[0], -x[1]), reverse=True)]
+        return pd.DataFrame(ranked)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ottimizzazione a griglia della strategia di hedging.")
+    parser.add_argument('--ticker', default='BTC-USD.CC')
+    parser.add_argument('--start', default='2017-01-01', help="Data di inizio (YYYY-MM-DD)")
+    parser.add_argument('--capital', type=float, default=50000)
+    parser.add_argument('--rank-by', default='Return on MaxDD')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default=None, help="File CSV in cui salvare la classifica")
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH,
+                        help="Archivio dei risultati (le combinazioni già valutate non vengono ricalcolate)")
+    parser.add_argument('--no-store', action='store_true', help="Non leggere né scrivere l'archivio")
+    args = parser.parse_args()
+
+    from data_handler import EODHDClient
+
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    api_key = config.get('EODHD', 'api_key')
+
+    data_df = EODHDClient(cache_dir='data_cache').get_historical_data(api_key, args.ticker, args.start)
+    if data_df is None or data_df.empty:
+        print(f"Dati non disponibili per {args.ticker}.")
+        return
+
+    store = None if args.no_store else ResultsStore(args.store)
+    optimizer = ParameterOptimizer(data_df, initial_capital=args.capital, max_workers=args.workers,
+                                   results_store=store, ticker=args.ticker)
+    ranking = optimizer.run(rank_by=args.rank_by, top_n=args.top)
+    print(ranking.to_string(index=False))
+    if args.output:
+        ranking.to_csv(args.output, index=False)
+        print(f"Classifica salvata in {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,189 @@
 import pandas as pd
 import numpy as np
 
+import instrumentation
+
+# Numba è opzionale: se installato, il passaggio unico dei KPI in batch viene compilato JIT
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# Ordine delle statistiche grezze prodotte dal passaggio unico sulle curve di equity
+_STATS = ['first', 'last', 'mean', 'm2', 'gross_profits', 'gross_losses', 'downside_sq',
+          'max_drawdown', 'ulcer_sq', 'max_under_water', 'bars_under_water']
+
+
+def _equity_pass_loop(equity, out):
+    """
+    Un solo passaggio su una matrice di equity (barre x varianti): rendimenti,
+    media e varianza (Welford), profitti/perdite lorde, scarto negativo,
+    drawdown, Ulcer e tempo sott'acqua, senza array intermedi.
+
+    Il ciclo esterno scorre le barre e quello interno le varianti, con lo stato
+    di ogni variante in un vettore: le catene di divisioni di colonne diverse
+    sono indipendenti e si sovrappongono, e le condizioni sono scritte come
+    selezioni senza salti. Ogni colonna esegue esattamente le stesse operazioni
+    di un passaggio colonna per colonna.
+    """
+    n, k = equity.shape
+    first = equity[0].copy()
+    prev = first.copy()
+    peak = first.copy()
+    mean = np.zeros(k)
+    m2 = np.zeros(k)
+    gross_profits = np.zeros(k)
+    gross_losses = np.zeros(k)
+    downside_sq = np.zeros(k)
+    max_drawdown = np.zeros(k)
+    ulcer_sq = np.zeros(k)
+    under_water = np.zeros(k)
+    max_under_water = np.zeros(k)
+    bars_under_water = np.zeros(k)
+    for t in range(n):
+        for j in range(k):
+            value = equity[t, j]
+            # Come pct_change().fillna(0): il primo rendimento vale zero
+            r = value / prev[j] - 1 if t > 0 else 0.0
+            prev[j] = value
+            delta = r - mean[j]
+            mean[j] += delta / (t + 1)
+            m2[j] += delta * (r - mean[j])
+            loss = r if r < 0 else 0.0
+            gross_profits[j] += r if r > 0 else 0.0
+            gross_losses[j] += loss
+            downside_sq[j] += loss * loss
+
+            below = value < peak[j]
+            top = peak[j] if below else value
+            peak[j] = top
+            bars = under_water[j] + 1.0 if below else 0.0
+            under_water[j] = bars
+            bars_under_water[j] += 1.0 if below else 0.0
+            max_under_water[j] = bars if bars > max_under_water[j] else max_under_water[j]
+            drawdown = (value - top) / top
+            max_drawdown[j] = drawdown if drawdown < max_drawdown[j] else max_drawdown[j]
+            ulcer_sq[j] += drawdown * drawdown
+
+    out[:, 0] = first
+    out[:, 1] = prev
+    out[:, 2] = mean
+    out[:, 3] = m2
+    out[:, 4] = gross_profits
+    out[:, 5] = gross_losses
+    out[:, 6] = downside_sq
+    out[:, 7] = max_drawdown
+    out[:, 8] = ulcer_sq
+    out[:, 9] = max_under_water
+    out[:, 10] = bars_under_water
+    return out
+
+
+if NUMBA_AVAILABLE:
+    _equity_pass_jit = njit(cache=True, nogil=True)(_equity_pass_loop)
+
+
+def _equity_pass_numpy(equity, out):
+    """Stesse statistiche di '_equity_pass_loop', calcolate con operazioni NumPy su tutta la matrice."""
+    n = equity.shape[0]
+    returns = np.zeros_like(equity)
+    returns[1:] = equity[1:] / equity[:-1] - 1
+    running_max = np.maximum.accumulate(equity, axis=0)
+    drawdown = (equity - running_max) / running_max
+
+    # Tempo sott'acqua: barre trascorse dall'ultimo massimo (ogni massimo azzera il contatore)
+    bars = np.arange(n)[:, None]
+    at_peak = equity >= running_max
+    last_peak = np.maximum.accumulate(np.where(at_peak, bars, 0), axis=0)
+    under_water = bars - last_peak
+
+    mean = returns.mean(axis=0)
+    out[:, 0] = equity[0]
+    out[:, 1] = equity[-1]
+    out[:, 2] = mean
+    out[:, 3] = ((returns - mean) ** 2).sum(axis=0)
+    out[:, 4] = np.where(returns > 0, returns, 0.).sum(axis=0)
+    out[:, 5] = np.where(returns < 0, returns, 0.).sum(axis=0)
+    out[:, 6] = (np.minimum(returns, 0.) ** 2).sum(axis=0)
+    out[:, 7] = np.minimum(drawdown.min(axis=0), 0.)
+    out[:, 8] = (drawdown ** 2).sum(axis=0)
+    out[:, 9] = under_water.max(axis=0)
+    out[:, 10] = (~at_peak).sum(axis=0)
+    return out
+
+
+def _max_drawdown_columns(equity: np.ndarray) -> np.ndarray:
+    running_max = np.maximum.accumulate(equity, axis=0)
+    return ((equity - running_max) / running_max).min(axis=0)
+
+
+def _rolling_max_drawdown(equity: np.ndarray, window: int) -> np.ndarray:
+    """
+    Max drawdown di ogni finestra equity[t-window+1 : t+1] (dall'inizio per le prime
+    barre), misurato rispetto al massimo raggiunto all'interno della finestra.
+
+    Le barre sono divise in blocchi di 'window': una finestra che termina nel blocco
+    che inizia in B è la coda [s, B) del blocco precedente più la testa [B, t] del
+    proprio. Per ogni coda (a ritroso) e ogni testa (in avanti) bastano massimo,
+    minimo e drawdown peggiore, quindi il costo è O(n) per colonna.
+    """
+    n, k = equity.shape
+    blocks = -(-n // window)
+    padded = np.full((blocks * window, k), np.nan)
+    padded[:n] = equity
+    padded = padded.reshape(blocks, window, k)
+
+    # Testa [B, t]: massimo e minimo progressivi, drawdown peggiore rispetto al massimo dall'inizio del blocco
+    head_peak = np.fmax.accumulate(padded, axis=1)
+    head_low = np.fmin.accumulate(padded, axis=1)
+    head_dd = np.fmin.accumulate((padded - head_peak) / head_peak, axis=1)
+
+    # Coda [s, B): il drawdown peggiore o non parte da s, o parte da s e arriva al minimo successivo
+    backward = padded[:, ::-1]
+    tail_peak = np.fmax.accumulate(backward, axis=1)[:, ::-1]
+    tail_low = np.fmin.accumulate(backward, axis=1)[:, ::-1]
+    tail_dd = np.fmin.accumulate(((tail_low - padded) / padded)[:, ::-1], axis=1)[:, ::-1]
+
+    head_peak, head_low, head_dd = (a.reshape(-1, k)[:n] for a in (head_peak, head_low, head_dd))
+    tail_peak, tail_dd = (a.reshape(-1, k)[:n] for a in (tail_peak, tail_dd))
+
+    out = head_dd.copy()
+    # Finestre che iniziano nel blocco precedente (le altre coincidono con la testa)
+    t = np.arange(n)
+    start = t - window + 1
+    crossing = (start > 0) & (t % window != window - 1)
+    t, start = t[crossing], start[crossing]
+    # Picco nella coda e minimo nella testa
+    cross_dd = (head_low[t] - tail_peak[start]) / tail_peak[start]
+    out[t] = np.minimum(np.minimum(head_dd[t], tail_dd[start]), cross_dd)
+    return np.minimum(out, 0.)
+
+
+def _compounded_drawdown_loop(returns, first, out):
+    """
+    Max drawdown della capitalizzazione composta di ogni colonna di rendimenti
+    (capitale iniziale 'first'), come '_max_drawdown_columns(np.cumprod(1 + returns) * first)'
+    ma in un solo passaggio per righe e senza matrici intermedie.
+    """
+    n, k = returns.shape
+    growth = np.ones(k)
+    peak = np.zeros(k)
+    for t in range(n):
+        for j in range(k):
+            growth[j] = growth[j] * (1 + returns[t, j])
+            value = growth[j] * first[j]
+            top = value if t == 0 or value > peak[j] else peak[j]
+            peak[j] = top
+            drawdown = (value - top) / top
+            out[j] = drawdown if t == 0 or drawdown < out[j] else out[j]
+    return out
+
+
+if NUMBA_AVAILABLE:
+    _compounded_drawdown_jit = njit(cache=True, nogil=True)(_compounded_drawdown_loop)
+
+
 class PerformanceAnalyzer:
     """
     Calcola un set completo di metriche di performance (KPI) a partire 
@@ -24,10 +207,12 @@ class PerformanceAnalyzer:
         self.initial_capital = self.equity.iloc[0] if not self.equity.empty else 0
         self.hedge_only_returns = hedge_only_returns
 
+    @instrumentation.instrumented('kpis.calculate')
     def calculate_kpis(self) -> dict:
         """
         Calcola e restituisce un dizionario con tutti i KPI.
         """
+        instrumentation.annotate(rows=len(self.equity))
         if len(self.equity) < 2:
             return {
                 'Net Profit': 0, 'Profit Factor': 0, 'Sharpe Ratio': 0,
@@ -79,3 +264,181 @@ class PerformanceAnalyzer:
             kpis['Short-Only MaxDD'] = 0.0
             
         return kpis
+
+    @staticmethod
+    @instrumentation.instrumented('kpis.batch')
+    def batch_kpis(equity, positions=None, hedge_only_returns=None,
+                   periods_per_year: int = 252) -> pd.DataFrame:
+        """
+        Calcola i KPI di molte curve di equity insieme, con un unico passaggio sui dati.
+
+        I KPI in comune con 'calculate_kpis' hanno le stesse definizioni; in più
+        vengono restituiti Sortino Ratio, Ulcer Index e tempo sott'acqua.
+
+        Args:
+            equity (pd.DataFrame | np.ndarray): Curve di equity (barre x varianti), senza NaN.
+            positions (pd.DataFrame | np.ndarray, optional): Posizioni per variante (per 'Num Trades').
+            hedge_only_returns (pd.DataFrame | np.ndarray, optional): Rendimenti della sola
+                componente short per variante (per 'Short-Only MaxDD').
+            periods_per_year (int): Barre per anno usate per annualizzare.
+
+        Returns:
+            pd.DataFrame: Una riga per variante (indice = colonne di 'equity'), una colonna per KPI.
+        """
+        labels = equity.columns if isinstance(equity, pd.DataFrame) else None
+        values = np.asarray(equity, dtype=np.float64)
+        if values.ndim == 1:
+            values = values[:, None]
+        n, k = values.shape
+
+        stats = np.empty((k, len(_STATS)), dtype=np.float64)
+        if n >= 2:
+            if NUMBA_AVAILABLE:
+                _equity_pass_jit(np.ascontiguousarray(values), stats)
+            else:
+                _equity_pass_numpy(values, stats)
+        s = dict(zip(_STATS, stats.T))
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.sqrt(s['m2'] / (n - 1)) if n > 1 else np.zeros(k)
+            downside = np.sqrt(s['downside_sq'] / n) if n else np.zeros(k)
+            cumulative_return = s['last'] / s['first'] - 1
+            annualized_return = (1 + cumulative_return) ** (1 / (n / periods_per_year)) - 1
+            kpis = {
+                'Net Profit': s['last'] - s['first'],
+                'Profit Factor': np.where(s['gross_losses'] != 0,
+                                          s['gross_profits'] / np.abs(s['gross_losses']), np.inf),
+                'Sharpe Ratio': np.where(std != 0, s['mean'] / std * np.sqrt(periods_per_year), 0.),
+                'Sortino Ratio': np.where(downside != 0, s['mean'] / downside * np.sqrt(periods_per_year),
+                                          np.where(s['mean'] > 0, np.inf, 0.)),
+                'Max Drawdown': s['max_drawdown'],
+                'Return on MaxDD': np.where(s['max_drawdown'] != 0,
+                                            annualized_return / np.abs(s['max_drawdown']), np.inf),
+                'Ulcer Index': np.sqrt(s['ulcer_sq'] / n),
+                'Max Time Under Water': s['max_under_water'].astype(np.int64),
+                'Time Under Water %': s['bars_under_water'] / n
+            }
+
+        if positions is not None:
+            pos = np.asarray(positions, dtype=np.float64).reshape(n, -1)
+            # Come calculate_kpis: la prima differenza (NaN) viene contata come cambio di posizione
+            kpis['Num Trades'] = (np.diff(pos, axis=0) != 0).sum(axis=0) + 1
+        if hedge_only_returns is not None:
+            hedge = np.asarray(hedge_only_returns, dtype=np.float64).reshape(n, -1)
+            if not np.isfinite(hedge).all():
+                hedge = np.nan_to_num(hedge)
+            if NUMBA_AVAILABLE:
+                kpis['Short-Only MaxDD'] = _compounded_drawdown_jit(np.ascontiguousarray(hedge), s['first'],
+                                                                    np.empty(hedge.shape[1]))
+            else:
+                kpis['Short-Only MaxDD'] = _max_drawdown_columns(np.cumprod(1 + hedge, axis=0) * s['first'])
+
+        result = pd.DataFrame(kpis, index=labels)
+        if n < 2:
+            # Come calculate_kpis: con meno di due barre tutti i KPI valgono zero
+            result.loc[:, :] = 0
+        return result
+
+    @staticmethod
+    @instrumentation.instrumented('kpis.frontier')
+    def frontier_kpis(frontier: dict, periods_per_year: int = 252) -> pd.DataFrame:
+        """
+        KPI di ogni hedge ratio a partire da EventDrivenBacktester.run_hedge_frontier.
+
+        Le curve coperte sono valutate insieme con 'batch_kpis'; 'Num Trades' e
+        'Short-Only MaxDD' dipendono solo dalle posizioni, quindi sono calcolati
+        una volta e valgono per tutti i rapporti.
+
+        Returns:
+            pd.DataFrame: Una riga per hedge ratio (indice 'hedge_ratio'), una colonna per KPI.
+        """
+        hedged = frontier['hedged']
+        kpis = PerformanceAnalyzer.batch_kpis(hedged, periods_per_year=periods_per_year)
+        shared = PerformanceAnalyzer.batch_kpis(hedged.iloc[:, :1], frontier['positions'].loc[hedged.index],
+                                                frontier['hedge_only_returns'].loc[hedged.index],
+                                                periods_per_year=periods_per_year)
+        for name in ('Num Trades', 'Short-Only MaxDD'):
+            kpis[name] = shared[name].iloc[0]
+        return kpis
+
+    @staticmethod
+    def rolling_metrics(equity, window: int = 252, periods_per_year: int = 252) -> dict:
+        """
+        Metriche mobili ed espandenti, calcolate in O(n) per ogni curva.
+
+        - Rolling Sharpe / Rolling Sortino: sui rendimenti dell'ultima finestra.
+        - Rolling MaxDD: max drawdown all'interno dell'ultima finestra, misurato dal
+          massimo raggiunto dopo la prima barra della finestra.
+        - Expanding Sharpe / Expanding MaxDD: dall'inizio dello storico fino a ogni barra.
+        - Time Under Water: barre trascorse dall'ultimo massimo dell'equity.
+
+        Args:
+            equity (pd.Series | pd.DataFrame): Una curva o più curve (una per colonna).
+            window (int): Lunghezza della finestra mobile in barre.
+            periods_per_year (int): Barre per anno usate per annualizzare.
+
+        Returns:
+            dict: Nome della metrica -> Series o DataFrame con lo stesso indice di 'equity'.
+        """
+        returns = equity.pct_change().fillna(0)
+        annualize = np.sqrt(periods_per_year)
+
+        rolling = returns.rolling(window)
+        rolling_std = rolling.std()
+        downside = (returns.clip(upper=0) ** 2).rolling(window).mean() ** 0.5
+        values = equity.to_numpy(dtype=np.float64)
+        rolling_dd = _rolling_max_drawdown(values if values.ndim == 2 else values[:, None], window)
+        if isinstance(equity, pd.DataFrame):
+            rolling_dd = pd.DataFrame(rolling_dd, index=equity.index, columns=equity.columns)
+        else:
+            rolling_dd = pd.Series(rolling_dd[:, 0], index=equity.index, name=equity.name)
+
+        expanding_std = returns.expanding().std()
+        running_max = equity.cummax()
+        drawdown = (equity - running_max) / running_max
+
+        # Barre dall'ultimo massimo: posizione corrente meno posizione dell'ultimo massimo
+        bars = np.arange(len(equity))
+        at_peak = (equity >= running_max).to_numpy()
+        if at_peak.ndim == 2:
+            bars = bars[:, None]
+        last_peak = np.maximum.accumulate(np.where(at_peak, bars, 0), axis=0)
+        if isinstance(equity, pd.DataFrame):
+            under_water = pd.DataFrame(bars - last_peak, index=equity.index, columns=equity.columns)
+        else:
+            under_water = pd.Series(bars - last_peak, index=equity.index, name=equity.name)
+
+        return {
+            'Rolling Sharpe': (rolling.mean() / rolling_std.where(rolling_std != 0)) * annualize,
+            'Rolling Sortino': (rolling.mean() / downside.where(downside != 0)) * annualize,
+            'Rolling MaxDD': rolling_dd,
+            'Expanding Sharpe': (returns.expanding().mean() / expanding_std.where(expanding_std != 0)) * annualize,
+            'Expanding MaxDD': drawdown.cummin(),
+            'Time Under Water': under_water
+        }
+
+    @staticmethod
+    def basket_kpis(basket: dict, periods_per_year: int = 252) -> pd.DataFrame:
+        """
+        KPI per gamba e del portafoglio a partire dai risultati di
+        EventDrivenBacktester.run_basket_backtest.
+
+        Ogni gamba è valutata dalla sua prima barra quotata; le gambe che
+        iniziano nella stessa data sono calcolate insieme con 'batch_kpis'.
+
+        Returns:
+            pd.DataFrame: Una riga per ticker più 'Portfolio' e 'Portfolio B&H'.
+        """
+        listed = basket['listed']
+        first_row = listed.to_numpy().argmax(axis=0)
+        rows = []
+        for start in np.unique(first_row):
+            legs = listed.columns[first_row == start]
+            rows.append(PerformanceAnalyzer.batch_kpis(
+                basket['leg_hedged'][legs].iloc[start:], basket['positions'][legs].iloc[start:],
+                basket['hedge_only_returns'][legs].iloc[start:], periods_per_year=periods_per_year))
+
+        portfolio = pd.DataFrame({'Portfolio': basket['portfolio'],
+                                  'Portfolio B&H': basket['portfolio_long_only']})
+        rows.append(PerformanceAnalyzer.batch_kpis(portfolio, periods_per_year=periods_per_year))
+        return pd.concat(rows).reindex(list(listed.columns) + list(portfolio.columns))
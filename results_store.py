@@ -0,0 +1,508 @@
+# File: results_store.py
+# Modulo per il progetto KriterionQuant Hedging App
+#
+# Archivio persistente dei risultati di backtest e ottimizzazione (SQLite).
+# Ogni esecuzione è identificata dall'impronta dei dati, dall'origine e dalla
+# tupla dei parametri: un'esecuzione identica viene letta dall'archivio invece
+# di essere ricalcolata. I KPI sono colonne indicizzate, interrogabili per
+# classifiche e heatmap; la curva di equity, facoltativa, è salvata a parte
+# in formato colonnare compresso.
+
+import argparse
+import io
+import math
+import operator
+import os
+import sqlite3
+from contextlib import closing, contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from feature_cache import fingerprint_frame
+
+DEFAULT_STORE_PATH = os.path.join('results_db', 'results.db')
+
+# Parametri che identificano un'esecuzione (insieme all'impronta dei dati e all'origine)
+PARAM_COLUMNS = ('fast_ma', 'slow_ma', 'adx_period', 'adx_threshold', 'stop_loss_perc',
+                 'hedge_ratio', 'initial_capital')
+
+# KPI di PerformanceAnalyzer (calculate_kpis e batch_kpis) -> colonna SQL
+KPI_COLUMNS = {
+    'Net Profit': 'net_profit',
+    'Profit Factor': 'profit_factor',
+    'Sharpe Ratio': 'sharpe_ratio',
+    'Sortino Ratio': 'sortino_ratio',
+    'Max Drawdown': 'max_drawdown',
+    'Return on MaxDD': 'return_on_maxdd',
+    'Num Trades': 'num_trades',
+    'Short-Only MaxDD': 'short_only_maxdd',
+    'Ulcer Index': 'ulcer_index',
+    'Max Time Under Water': 'max_time_under_water',
+    'Time Under Water %': 'time_under_water_pct',
+}
+_INT_KPIS = ('Num Trades', 'Max Time Under Water')
+
+# KPI con un indice dedicato: classifiche "top N" senza scandire la tabella
+RANKED_KPIS = ('Return on MaxDD', 'Sharpe Ratio', 'Net Profit')
+
+# Colonne di idx_runs_ma oltre a (fingerprint, source): coprono la heatmap predefinita
+# (fast_ma x slow_ma di 'Return on MaxDD', filtrata per stop loss) senza leggere la tabella
+HEATMAP_INDEX_COLUMNS = ('fast_ma', 'slow_ma', 'stop_loss_perc', KPI_COLUMNS['Return on MaxDD'])
+
+# Tutti gli indici iniziano con (fingerprint, source): le query vengono eseguite per
+# ciascuna coppia, così anche un filtro sull'origine percorre un indice.
+# Colonna filtrabile -> indice che la ha subito dopo il prefisso
+_FILTER_INDEXES = {
+    'stop_loss_perc': 'idx_runs_src_stop_loss',
+    'fast_ma': 'idx_runs_src_ma',
+    **{KPI_COLUMNS[k]: f'idx_runs_src_{KPI_COLUMNS[k]}' for k in RANKED_KPIS},
+}
+
+# Un filtro indicizzato che seleziona meno di queste righe viene usato per leggere
+# le sole righe filtrate (poi ordinate o raggruppate); altrimenti si percorre
+# l'indice del KPI in ordine o si scandisce la tabella
+SELECTIVE_ROWS = 10_000
+
+# Origine dei risultati: l'ottimizzatore (batch_kpis, posizioni effettive) e la dashboard
+# (calculate_kpis sul segnale) non calcolano 'Num Trades' allo stesso modo, quindi
+# un'esecuzione è "identica" solo a un'altra della stessa origine.
+DEFAULT_SOURCE = 'optimizer'
+
+_OPERATORS = {'=': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le,
+              '>': operator.gt, '>=': operator.ge}
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS datasets (
+    fingerprint TEXT PRIMARY KEY,
+    ticker TEXT,
+    start_date TEXT,
+    end_date TEXT,
+    bars INTEGER,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    fast_ma INTEGER NOT NULL,
+    slow_ma INTEGER NOT NULL,
+    adx_period INTEGER NOT NULL,
+    adx_threshold REAL NOT NULL,
+    stop_loss_perc REAL NOT NULL,
+    hedge_ratio REAL NOT NULL,
+    initial_capital REAL NOT NULL,
+    source TEXT NOT NULL,
+    created_at TEXT,
+    {', '.join(f'{column} REAL' for column in KPI_COLUMNS.values())},
+    UNIQUE (fingerprint, source, {', '.join(PARAM_COLUMNS)})
+);
+CREATE TABLE IF NOT EXISTS equity_curves (
+    run_id INTEGER PRIMARY KEY REFERENCES runs(id) ON DELETE CASCADE,
+    data BLOB NOT NULL
+);
+DROP INDEX IF EXISTS idx_runs_stop_loss;
+DROP INDEX IF EXISTS idx_runs_ma;
+{''.join(f'DROP INDEX IF EXISTS idx_runs_{KPI_COLUMNS[k]};' for k in RANKED_KPIS)}
+CREATE INDEX IF NOT EXISTS idx_runs_src_stop_loss ON runs (fingerprint, source, stop_loss_perc);
+CREATE INDEX IF NOT EXISTS idx_runs_src_ma ON runs (fingerprint, source, {', '.join(HEATMAP_INDEX_COLUMNS)});
+{''.join(f'CREATE INDEX IF NOT EXISTS idx_runs_src_{KPI_COLUMNS[k]} ON runs (fingerprint, source, {KPI_COLUMNS[k]});'
+         for k in RANKED_KPIS)}
+"""
+
+
+def _column(name: str) -> str:
+    """Colonna SQL di un parametro o di un KPI (i nomi non previsti sono rifiutati)."""
+    if name in PARAM_COLUMNS or name == 'source':
+        return name
+    if name in KPI_COLUMNS:
+        return KPI_COLUMNS[name]
+    raise ValueError(f"Colonna non presente nell'archivio: {name}")
+
+
+def _sql_value(value):
+    """Valore per SQLite: tipi NumPy convertiti, NaN come NULL (inf resta inf)."""
+    if value is None:
+        return None
+    value = value.item() if isinstance(value, np.generic) else value
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def _matches(value, condition) -> bool:
+    """Stessa semantica dei filtri di ResultsStore._where, applicata a un valore."""
+    if isinstance(condition, tuple):
+        op, target = condition
+        if op not in _OPERATORS:
+            raise ValueError(f"Operatore non supportato: {op}")
+        return _OPERATORS[op](value, target)
+    if isinstance(condition, (list, set)):
+        return value in condition
+    return value == condition
+
+
+def encode_equity(curves: pd.DataFrame | pd.Series) -> bytes:
+    """
+    Curve di equity in formato colonnare compresso: un array per colonna più
+    l'indice delle date codificato a differenze (compressione quasi totale per barre regolari).
+    """
+    df = curves.to_frame() if isinstance(curves, pd.Series) else curves
+    index = pd.DatetimeIndex(df.index).as_unit('ns').asi8
+    arrays = {'index_start': index[:1], 'index_delta': np.diff(index)}
+    arrays.update({f"col_{i}": df.iloc[:, i].to_numpy(dtype=np.float64) for i in range(df.shape[1])})
+    arrays['columns'] = np.array([str(c) for c in df.columns])
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def decode_equity(blob: bytes) -> pd.DataFrame:
+    """Inverso di 'encode_equity'."""
+    with np.load(io.BytesIO(blob)) as data:
+        index = np.concatenate([data['index_start'], data['index_start'] + np.cumsum(data['index_delta'])])
+        columns = list(data['columns'])
+        values = {name: data[f"col_{i}"] for i, name in enumerate(columns)}
+    return pd.DataFrame(values, index=pd.DatetimeIndex(index.view('M8[ns]'), name='date'), columns=columns)
+
+
+class ResultsStore:
+    """
+    Archivio SQLite dei risultati, indicizzato per (impronta dei dati, parametri).
+
+    Le tabelle sono tre: 'datasets' (una riga per serie di prezzi), 'runs'
+    (parametri e KPI di ogni esecuzione, con indici su parametri e KPI di
+    classifica) ed 'equity_curves' (curve compresse, facoltative).
+    Ogni operazione apre una propria connessione: l'archivio si può usare da
+    più thread (rerun di Streamlit) e più processi (ottimizzatore).
+    """
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        """
+        Args:
+            path (str): File del database (la cartella viene creata se manca).
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        with closing(sqlite3.connect(self.path, timeout=30)) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # Cache di pagina da 64 MB: gli indici restano in memoria durante gli inserimenti in blocco
+            conn.execute("PRAGMA cache_size=-65536")
+            conn.execute("PRAGMA foreign_keys=ON")
+            with conn:
+                yield conn
+
+    @staticmethod
+    def fingerprint(data: pd.DataFrame, columns: list[str] | None = None) -> str:
+        """Impronta dei dati di prezzo (valori e date) che identifica una serie."""
+        columns = columns or [c for c in ('high', 'low', 'close', 'adj_close') if c in data.columns]
+        frame = data[columns].copy(deep=False)
+        frame['_date'] = pd.DatetimeIndex(data.index).as_unit('ns').asi8
+        return fingerprint_frame(frame)
+
+    def register_dataset(self, fingerprint: str, data: pd.DataFrame | None = None, ticker: str | None = None):
+        """Registra la serie di prezzi con ticker e intervallo di date, mostrati dalla dashboard."""
+        start = end = bars = None
+        if data is not None and not data.empty:
+            start, end, bars = data.index[0].strftime('%Y-%m-%d'), data.index[-1].strftime('%Y-%m-%d'), len(data)
+        with self._connect() as conn:
+            conn.execute("INSERT INTO datasets VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (fingerprint) DO UPDATE SET "
+                         "ticker = coalesce(excluded.ticker, ticker), start_date = coalesce(excluded.start_date, start_date), "
+                         "end_date = coalesce(excluded.end_date, end_date), bars = coalesce(excluded.bars, bars)",
+                         (fingerprint, ticker, start, end, bars, datetime.now(timezone.utc).isoformat()))
+
+    def put_many(self, fingerprint: str, results: list[dict], source: str = DEFAULT_SOURCE) -> int:
+        """
+        Salva (o aggiorna) molte esecuzioni in un'unica transazione.
+
+        Args:
+            fingerprint (str): Impronta dei dati (vedi 'fingerprint').
+            results (list[dict]): Dizionari con i parametri di PARAM_COLUMNS e i KPI.
+            source (str): Origine dei risultati (es. 'optimizer', 'dashboard').
+
+        Returns:
+            int: Numero di esecuzioni scritte.
+        """
+        if not results:
+            return 0
+        created_at = datetime.now(timezone.utc).isoformat()
+        # Conversione in blocco: tipi Python nativi e NaN -> NULL
+        frame = pd.DataFrame.from_records(results).reindex(columns=[*PARAM_COLUMNS, *KPI_COLUMNS])
+        if frame[list(PARAM_COLUMNS)].isna().any().any():
+            raise ValueError("Ogni risultato deve contenere tutti i parametri di PARAM_COLUMNS.")
+        frame = frame.astype(object).where(frame.notna(), None)
+        n_params = len(PARAM_COLUMNS)
+        rows = [(fingerprint, *row[:n_params], source, created_at, *row[n_params:])
+                for row in frame.itertuples(index=False, name=None)]
+        kpi_columns = list(KPI_COLUMNS.values())
+        columns = ['fingerprint', *PARAM_COLUMNS, 'source', 'created_at', *kpi_columns]
+        sql = (f"INSERT INTO runs ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+               f"ON CONFLICT (fingerprint, source, {', '.join(PARAM_COLUMNS)}) DO UPDATE SET "
+               + ', '.join(f"{c} = excluded.{c}" for c in ['created_at', *kpi_columns]))
+        with self._connect() as conn:
+            conn.executemany(sql, rows)
+            # Ogni serie con risultati compare in 'datasets' (anche se mai registrata)
+            conn.execute("INSERT INTO datasets (fingerprint, updated_at) VALUES (?, ?) "
+                         "ON CONFLICT (fingerprint) DO UPDATE SET updated_at = excluded.updated_at",
+                         (fingerprint, created_at))
+        return len(rows)
+
+    def put(self, fingerprint: str, params: dict, kpis: dict, equity: pd.DataFrame | pd.Series | None = None,
+            source: str = DEFAULT_SOURCE) -> int:
+        """
+        Salva una singola esecuzione e, se fornita, la sua curva di equity.
+
+        Returns:
+            int: Identificativo dell'esecuzione nell'archivio.
+        """
+        self.put_many(fingerprint, [{**params, **kpis}], source)
+        run_id = self.run_id(fingerprint, params, source)
+        if equity is not None:
+            with self._connect() as conn:
+                conn.execute("INSERT OR REPLACE INTO equity_curves VALUES (?, ?)", (run_id, encode_equity(equity)))
+        return run_id
+
+    @staticmethod
+    def _key(fingerprint: str, params: dict, source: str) -> tuple[str, tuple]:
+        """Clausola e argomenti che individuano un'esecuzione."""
+        where = ' AND '.join(f"{name} = ?" for name in ('fingerprint', 'source', *PARAM_COLUMNS))
+        return where, (fingerprint, source, *(_sql_value(params[n]) for n in PARAM_COLUMNS))
+
+    def run_id(self, fingerprint: str, params: dict, source: str = DEFAULT_SOURCE) -> int | None:
+        where, args = self._key(fingerprint, params, source)
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT id FROM runs WHERE {where}", args).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _kpis(row) -> dict:
+        """KPI non nulli di una riga, con i nomi di PerformanceAnalyzer."""
+        kpis = {}
+        for name, value in zip(KPI_COLUMNS, row):
+            if value is not None:
+                kpis[name] = int(value) if name in _INT_KPIS else value
+        return kpis
+
+    def get(self, fingerprint: str, params: dict, source: str = DEFAULT_SOURCE) -> dict | None:
+        """KPI di un'esecuzione identica già salvata, o None."""
+        where, args = self._key(fingerprint, params, source)
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT {', '.join(KPI_COLUMNS.values())} FROM runs WHERE {where}", args).fetchone()
+        return None if row is None else self._kpis(row)
+
+    def lookup(self, fingerprint: str, initial_capital: float, source: str = DEFAULT_SOURCE) -> dict[tuple, dict]:
+        """
+        Tutte le esecuzioni salvate per una serie, un capitale e un'origine.
+
+        Returns:
+            dict: (fast_ma, slow_ma, adx_period, adx_threshold, stop_loss_perc, hedge_ratio) -> KPI.
+        """
+        keys = PARAM_COLUMNS[:-1]
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT {', '.join(keys)}, {', '.join(KPI_COLUMNS.values())} FROM runs "
+                                f"WHERE fingerprint = ? AND source = ? AND initial_capital = ?",
+                                (fingerprint, source, float(initial_capital))).fetchall()
+        return {tuple(row[:len(keys)]): self._kpis(row[len(keys):]) for row in rows}
+
+    def equity(self, run_id: int) -> pd.DataFrame | None:
+        """Curva di equity salvata per un'esecuzione, o None."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT data FROM equity_curves WHERE run_id = ?", (run_id,)).fetchone()
+        return None if row is None else decode_equity(row[0])
+
+    @staticmethod
+    def _where(fingerprint: str | None, filters: dict | None) -> tuple[str, list]:
+        """
+        Clausola WHERE da filtri {colonna: valore | (operatore, valore) | [valori]}.
+        Le colonne possono essere parametri o KPI (con i nomi di PerformanceAnalyzer).
+        """
+        clauses, args = [], []
+        if fingerprint is not None:
+            clauses.append("fingerprint = ?")
+            args.append(fingerprint)
+        for name, condition in (filters or {}).items():
+            column = _column(name)
+            if isinstance(condition, tuple):
+                op, value = condition
+                if op not in _OPERATORS:
+                    raise ValueError(f"Operatore non supportato: {op}")
+                clauses.append(f"{column} {op} ?")
+                args.append(_sql_value(value))
+            elif isinstance(condition, (list, set)):
+                values = [_sql_value(v) for v in condition]
+                clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+                args.extend(values)
+            else:
+                clauses.append(f"{column} = ?")
+                args.append(_sql_value(condition))
+        return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), args
+
+    @staticmethod
+    def _partitions(conn, fingerprint: str | None, source_filter=None) -> list[tuple[str, str]]:
+        """
+        Coppie (fingerprint, source) presenti nell'archivio che passano il filtro sull'origine.
+        Salta da una coppia alla successiva lungo l'indice: poche letture anche con milioni di righe.
+        """
+        pairs, key = [], None
+        while True:
+            if fingerprint is not None:
+                sql = "SELECT fingerprint, source FROM runs INDEXED BY idx_runs_src_stop_loss WHERE fingerprint = ?"
+                args = [fingerprint]
+                if key is not None:
+                    sql += " AND source > ?"
+                    args.append(key[1])
+            else:
+                sql = "SELECT fingerprint, source FROM runs INDEXED BY idx_runs_src_stop_loss"
+                args = []
+                if key is not None:
+                    sql += " WHERE (fingerprint, source) > (?, ?)"
+                    args.extend(key)
+            key = conn.execute(sql + " ORDER BY fingerprint, source LIMIT 1", args).fetchone()
+            if key is None:
+                return pairs
+            if source_filter is None or _matches(key[1], source_filter):
+                pairs.append(key)
+
+    def _selective_index(self, conn, fingerprint: str, source: str, filters: dict) -> str | None:
+        """
+        Indice del filtro che seleziona meno righe, se sono meno di SELECTIVE_ROWS.
+        Il conteggio (limitato) legge solo l'indice.
+        """
+        best, best_rows = None, SELECTIVE_ROWS
+        for name, condition in filters.items():
+            index = _FILTER_INDEXES.get(_column(name))
+            if index is None or (isinstance(condition, tuple) and condition[0] == '!='):
+                continue
+            where, args = self._where(fingerprint, {'source': source, name: condition})
+            rows = conn.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM runs INDEXED BY {index} {where} LIMIT ?)",
+                                (*args, best_rows)).fetchone()[0]
+            if rows < best_rows:
+                best, best_rows = index, rows
+        return best
+
+    def top(self, rank_by: str = 'Return on MaxDD', n: int = 20, fingerprint: str | None = None,
+            filters: dict | None = None, ascending: bool = False) -> pd.DataFrame:
+        """
+        Le migliori esecuzioni per un KPI.
+
+        Esempio: top('Return on MaxDD', 10, fp, {'stop_loss_perc': ('<=', 0.10)})
+
+        Returns:
+            pd.DataFrame: Origine, parametri e KPI (nomi di PerformanceAnalyzer), più 'run_id'.
+        """
+        order = _column(rank_by)
+        filters = dict(filters or {})
+        source_filter = filters.pop('source', None)
+        columns = ['id', 'source', *PARAM_COLUMNS, *KPI_COLUMNS.values()]
+        rows = []
+        with self._connect() as conn:
+            for fp, source in self._partitions(conn, fingerprint, source_filter):
+                # Un filtro selettivo legge solo le sue righe e le ordina; altrimenti l'indice del KPI
+                # viene percorso in ordine fino ai primi N che passano i filtri; senza indice sul KPI
+                # resta la scansione sequenziale (con ordinamento dei soli primi N)
+                index = self._selective_index(conn, fp, source, filters)
+                if index is None:
+                    index = _FILTER_INDEXES.get(order)
+                table = f"runs INDEXED BY {index}" if index else "runs NOT INDEXED"
+                where, args = self._where(fp, {'source': source, **filters})
+                sql = (f"SELECT {', '.join(columns)} FROM {table} {where} AND {order} IS NOT NULL "
+                       f"ORDER BY {order} {'ASC' if ascending else 'DESC'} LIMIT ?")
+                rows.extend(conn.execute(sql, (*args, int(n))).fetchall())
+        df = pd.DataFrame(rows, columns=['run_id', 'source', *PARAM_COLUMNS, *KPI_COLUMNS])
+        df = df.sort_values(rank_by, ascending=ascending, kind='stable').head(int(n)).reset_index(drop=True)
+        return df.dropna(axis=1, how='all')
+
+    def heatmap(self, x: str = 'fast_ma', y: str = 'slow_ma', value: str = 'Return on MaxDD', agg: str = 'max',
+                fingerprint: str | None = None, filters: dict | None = None) -> pd.DataFrame:
+        """
+        Griglia x × y di un KPI aggregato sulle altre dimensioni (es. il migliore
+        'Return on MaxDD' per ogni coppia fast_ma × slow_ma).
+
+        Args:
+            agg (str): 'max', 'min', 'avg' o 'count'.
+
+        Returns:
+            pd.DataFrame: Righe = valori di y, colonne = valori di x.
+        """
+        if agg not in ('max', 'min', 'avg', 'count'):
+            raise ValueError(f"Aggregazione non supportata: {agg}")
+        cx, cy, cv = _column(x), _column(y), _column(value)
+        filters = dict(filters or {})
+        source_filter = filters.pop('source', None)
+        used = {cx, cy, cv, *(_column(name) for name in filters)}
+        covered = used <= set(HEATMAP_INDEX_COLUMNS)
+        # La media tra più origini si ricompone da somme e conteggi
+        expr = f"SUM({cv}), COUNT({cv})" if agg == 'avg' else f"{agg.upper()}({cv})"
+        rows = []
+        with self._connect() as conn:
+            for fp, source in self._partitions(conn, fingerprint, source_filter):
+                # Filtro selettivo: solo le sue righe. Se idx_runs_src_ma contiene tutte le colonne
+                # la query legge solo l'indice (0.2s a 1M righe). Altrimenti scansione sequenziale:
+                # percorrere l'indice ordinato per x/y salterebbe tra pagine lontane quando le
+                # esecuzioni sono state inserite in un altro ordine (3s contro meno di 1s a 1M righe)
+                index = self._selective_index(conn, fp, source, filters)
+                if index is None and covered:
+                    index = 'idx_runs_src_ma'
+                table = f"runs INDEXED BY {index}" if index else "runs NOT INDEXED"
+                where, args = self._where(fp, {'source': source, **filters})
+                sql = f"SELECT {cx}, {cy}, {expr} FROM {table} {where} GROUP BY {cx}, {cy}"
+                rows.extend(conn.execute(sql, args).fetchall())
+        if agg == 'avg':
+            df = pd.DataFrame(rows, columns=[x, y, 'sum', 'count']).groupby([x, y], as_index=False).sum()
+            df[value] = df['sum'] / df['count'].where(df['count'] > 0)
+        else:
+            df = pd.DataFrame(rows, columns=[x, y, value])
+            df = df.groupby([x, y], as_index=False)[value].agg('sum' if agg == 'count' else agg)
+        return df.pivot(index=y, columns=x, values=value).sort_index().sort_index(axis=1)
+
+    def datasets(self) -> pd.DataFrame:
+        """Serie di prezzi presenti nell'archivio con il numero di esecuzioni salvate."""
+        with self._connect() as conn:
+            # Il conteggio per serie usa un indice che inizia con 'fingerprint'
+            rows = conn.execute(
+                "SELECT fingerprint, ticker, start_date, end_date, bars, "
+                "(SELECT COUNT(*) FROM runs r WHERE r.fingerprint = d.fingerprint), updated_at "
+                "FROM datasets d ORDER BY updated_at DESC").fetchall()
+        return pd.DataFrame(rows, columns=['fingerprint', 'ticker', 'start_date', 'end_date', 'bars',
+                                           'runs', 'updated_at'])
+
+    def count(self, fingerprint: str | None = None) -> int:
+        where, args = self._where(fingerprint, None)
+        with self._connect() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM runs {where}", args).fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Interroga l'archivio dei risultati.")
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH)
+    parser.add_argument('--fingerprint', default=None, help="Serie di prezzi (default: la più recente)")
+    parser.add_argument('--rank-by', default='Return on MaxDD')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--max-stop-loss', type=float, default=None, help="Es. 0.10 per Stop Loss <= 10%%")
+    parser.add_argument('--heatmap', action='store_true', help="Mostra la heatmap fast_ma x slow_ma")
+    args = parser.parse_args()
+
+    store = ResultsStore(args.store)
+    datasets = store.datasets()
+    if datasets.empty:
+        print("Archivio vuoto.")
+        return
+    print(datasets.to_string(index=False))
+    fingerprint = args.fingerprint or datasets['fingerprint'].iloc[0]
+    filters = {'stop_loss_perc': ('<=', args.max_stop_loss)} if args.max_stop_loss is not None else None
+    print(f"\nTop {args.top} per {args.rank_by} ({fingerprint}):")
+    print(store.top(args.rank_by, args.top, fingerprint, filters).to_string(index=False))
+    if args.heatmap:
+        print(f"\nHeatmap fast_ma x slow_ma (max {args.rank_by}):")
+        print(store.heatmap(value=args.rank_by, fingerprint=fingerprint, filters=filters).round(3).to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+# File: robustness.py
+# Modulo per il progetto KriterionQuant Hedging App
+#
+# Analisi di robustezza Monte Carlo: genera migliaia di storici alternativi
+# ricampionando le barre reali (block bootstrap o rimescolamento) ed esegue
+# indicatori, macchina a stati e KPI su tutti i percorsi insieme, come
+# matrici (barre x percorsi), a blocchi di dimensione limitata in memoria.
+
+import argparse
+import configparser
+
+import numpy as np
+import pandas as pd
+
+from hedge_engine import hedge_state_matrix
+from indicator_kernels import rolling_mean_columns, adx_columns
+from performance_analyzer import PerformanceAnalyzer
+
+# Parametri della strategia in produzione (gli stessi di OPTIMAL_PARAMS nella dashboard)
+DEFAULT_PARAMS = {
+    'fast_ma': 25, 'slow_ma': 40, 'adx_period': 14, 'adx_threshold': 15,
+    'stop_loss_perc': 0.05, 'hedge_ratio': 1.0
+}
+
+# Array (barre x percorsi) stimati per percorso: serve a dimensionare i blocchi
+_ARRAYS_PER_PATH = 24
+
+# KPI riportati per ogni percorso (da PerformanceAnalyzer.batch_kpis, più il rendimento totale)
+ROBUSTNESS_KPIS = ['Total Return', 'Sharpe Ratio', 'Sortino Ratio', 'Max Drawdown',
+                   'Return on MaxDD', 'Ulcer Index']
+
+# KPI per cui un valore più basso è migliore
+_LOWER_IS_BETTER = {'Ulcer Index'}
+
+
+def sample_indices(n_bars: int, n_paths: int, method: str = 'block', block_size: int = 20,
+                   rng: np.random.Generator | None = None) -> np.ndarray:
+    """
+    Indici delle barre da ricampionare, uno per colonna.
+
+    Args:
+        n_bars (int): Numero di barre storiche disponibili (e di ogni percorso).
+        n_paths (int): Numero di percorsi da generare.
+        method (str): 'block' (moving block bootstrap, conserva la volatilità a grappoli)
+            oppure 'shuffle' (permutazione delle barre, nessuna dipendenza temporale).
+        block_size (int): Lunghezza dei blocchi per il metodo 'block'.
+        rng (np.random.Generator, optional): Generatore casuale.
+
+    Returns:
+        np.ndarray: Matrice (n_bars x n_paths) di indici interi.
+    """
+    rng = rng or np.random.default_rng()
+    if method == 'shuffle':
+        return rng.permuted(np.broadcast_to(np.arange(n_bars), (n_paths, n_bars)), axis=1).T
+    if method == 'block':
+        block_size = max(1, min(block_size, n_bars))
+        n_blocks = -(-n_bars // block_size)
+        starts = rng.integers(0, n_bars - block_size + 1, size=(n_blocks, n_paths))
+        offsets = np.arange(block_size)[None, :, None]
+        return (starts[:, None, :] + offsets).reshape(-1, n_paths)[:n_bars]
+    raise ValueError(f"Metodo di ricampionamento sconosciuto: {method}")
+
+
+class MonteCarloRobustness:
+    """
+    Distribuzione dei KPI della strategia coperta e del Buy & Hold su storici ricampionati.
+
+    Ogni percorso è costruito ricampionando barre intere (rendimento del close
+    e posizione di high/low rispetto al close), così ADX e Stop Loss vedono
+    escursioni intraday realistiche. Indicatori, macchina a stati e KPI sono
+    calcolati per colonne; i percorsi vengono elaborati a blocchi in modo che
+    la memoria resti entro 'max_bytes' qualunque sia il numero di percorsi.
+    """
+    def __init__(self, data: pd.DataFrame, params: dict | None = None,
+                 initial_capital: float = 50000, max_bytes: int = 512 * 1024 ** 2):
+        """
+        Args:
+            data (pd.DataFrame): Dati OHLCV come restituiti da EODHDClient.
+            params (dict, optional): Parametri della strategia (default: DEFAULT_PARAMS).
+            initial_capital (float): Capitale iniziale di ogni percorso.
+            max_bytes (int): Budget di memoria indicativo per blocco di percorsi.
+        """
+        prices = data[['high', 'low', 'adj_close']].astype(np.float64).dropna()
+        close = prices['adj_close'].to_numpy()
+        self.start_price = close[0]
+        self.log_returns = np.diff(np.log(close))
+        # High e low sono ricampionati come rapporto rispetto al close della stessa barra
+        self.high_ratio = (prices['high'] / data.loc[prices.index, 'close']).to_numpy()[1:]
+        self.low_ratio = (prices['low'] / data.loc[prices.index, 'close']).to_numpy()[1:]
+        self.params = {**DEFAULT_PARAMS, **(params or {})}
+        self.initial_capital = initial_capital
+        self.max_bytes = max_bytes
+
+    def _chunk_size(self) -> int:
+        bytes_per_path = (len(self.log_returns) + 1) * 8 * _ARRAYS_PER_PATH
+        return max(1, self.max_bytes // bytes_per_path)
+
+    def simulate_chunk(self, idx: np.ndarray) -> dict:
+        """
+        Esegue strategia e Buy & Hold su un blocco di percorsi.
+
+        Args:
+            idx (np.ndarray): Indici delle barre ricampionate (barre x percorsi).
+
+        Returns:
+            dict: KPI per percorso, con prefisso 'Hedged' e 'B&H'.
+        """
+        p = self.params
+        n_paths = idx.shape[1]
+        first_row = np.zeros((1, n_paths))
+        close = self.start_price * np.exp(np.concatenate((first_row, np.cumsum(self.log_returns[idx], axis=0))))
+        high = close * np.concatenate((first_row + 1, self.high_ratio[idx]))
+        low = close * np.concatenate((first_row + 1, self.low_ratio[idx]))
+
+        fast = rolling_mean_columns(close, p['fast_ma'])
+        slow = rolling_mean_columns(close, p['slow_ma'])
+        adx = adx_columns(high, low, close, p['adx_period'])
+
+        # Come nel backtest storico, il periodo di warm-up degli indicatori viene escluso
+        warmup = np.isnan(fast).any(axis=1) | np.isnan(slow).any(axis=1) | np.isnan(adx).any(axis=1)
+        start = int(np.argmin(warmup)) if not warmup.all() else len(close)
+        close, fast, slow, adx = close[start:], fast[start:], slow[start:], adx[start:]
+        if len(close) < 2:
+            raise ValueError("Storico troppo corto rispetto ai periodi degli indicatori.")
+
+        signal = (fast < slow) & (adx > p['adx_threshold'])
+        hedged = hedge_state_matrix(close[:-1], signal[:-1], ~signal[:-1], p['stop_loss_perc'])
+        positions = np.ones_like(close)
+        positions[1:][hedged] = 0.0
+
+        returns = np.zeros_like(close)
+        returns[1:] = close[1:] / close[:-1] - 1
+        exposure = (1 - p['hedge_ratio']) + p['hedge_ratio'] * positions
+        equity_hedged = np.cumprod(1 + returns * exposure, axis=0) * self.initial_capital
+        equity_bh = np.cumprod(1 + returns, axis=0) * self.initial_capital
+
+        kpis = {}
+        for label, equity in (('Hedged', equity_hedged), ('B&H', equity_bh)):
+            batch = PerformanceAnalyzer.batch_kpis(equity)
+            batch['Total Return'] = batch['Net Profit'] / self.initial_capital
+            for name in ROBUSTNESS_KPIS:
+                kpis[f'{label} {name}'] = batch[name].to_numpy()
+        return kpis
+
+    def run(self, n_paths: int = 1000, method: str = 'block', block_size: int = 20,
+            seed: int | None = None, confidence: float = 0.90) -> dict:
+        """
+        Esegue la simulazione Monte Carlo.
+
+        Args:
+            n_paths (int): Numero di percorsi da simulare.
+            method (str): 'block' oppure 'shuffle' (vedi 'sample_indices').
+            block_size (int): Lunghezza dei blocchi per il block bootstrap.
+            seed (int, optional): Seme per la riproducibilità.
+            confidence (float): Ampiezza dell'intervallo di confidenza (es. 0.90).
+
+        Returns:
+            dict: 'paths' (DataFrame dei KPI per percorso), 'summary' (media e
+                  intervallo di confidenza di ogni KPI) e 'prob_hedge_beats_bh'
+                  (probabilità che la copertura batta il Buy & Hold per KPI).
+        """
+        rng = np.random.default_rng(seed)
+        n_bars = len(self.log_returns)
+        chunk = self._chunk_size()
+        parts = []
+        for done in range(0, n_paths, chunk):
+            idx = sample_indices(n_bars, min(chunk, n_paths - done), method, block_size, rng)
+            parts.append(pd.DataFrame(self.simulate_chunk(idx)))
+        paths = pd.concat(parts, ignore_index=True)
+
+        tail = (1 - confidence) / 2
+        summary = pd.DataFrame({
+            'Media': paths.mean(),
+            'Mediana': paths.median(),
+            f'CI {tail:.1%}': paths.quantile(tail),
+            f'CI {1 - tail:.1%}': paths.quantile(1 - tail)
+        })
+
+        # Per il drawdown "meglio" significa meno negativo, quindi vince il valore più alto;
+        # per l'Ulcer Index vince il più basso
+        prob = {}
+        for name in ROBUSTNESS_KPIS:
+            hedged, bh = paths[f'Hedged {name}'], paths[f'B&H {name}']
+            beats = hedged < bh if name in _LOWER_IS_BETTER else hedged > bh
+            prob[name] = float(beats.mean())
+        return {'paths': paths, 'summary': summary, 'prob_hedge_beats_bh': prob}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analisi di robustezza Monte Carlo della strategia di hedging.")
+    parser.add_argument('--ticker', default='BTC-USD.CC')
+    parser.add_argument('--start', default='2017-01-01', help="Data di inizio (YYYY-MM-DD)")
+    parser.add_argument('--paths', type=int, default=1000)
+    parser.add_argument('--method', choices=['block', 'shuffle'], default='block')
+    parser.add_argument('--block-size', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    from data_handler import EODHDClient
+
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    api_key = config.get('EODHD', 'api_key')
+
+    data_df = EODHDClient(cache_dir='data_cache').get_historical_data(api_key, args.ticker, args.start)
+    if data_df is None or data_df.empty:
+        print(f"Dati non disponibili per {args.ticker}.")
+        return
+
+    results = MonteCarloRobustness(data_df).run(n_paths=args.paths, method=args.method,
+                                                block_size=args.block_size, seed=args.seed)
+    print(results['summary'].to_string())
+    print("\nProbabilità che la copertura batta il Buy & Hold:")
+    for name, value in results['prob_hedge_beats_bh'].items():
+        print(f"  {name}: {value:.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+# File: signal_runtime.py
+# Modulo per il progetto KriterionQuant Hedging App
+#
+# Runtime snello del bot giornaliero: scarica le barre EOD e le converte in
+# array NumPy senza pandas, pyarrow né la cache Parquet. Dipende solo da
+# NumPy e requests (requirements-bot.txt); indicatori e stato sono quelli di
+# bot_state.SignalCheckpoint, quindi il risultato coincide con il percorso pandas.
+
+import os
+import time
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import instrumentation
+
+# Stessa radice di EODHDClient.API_ROOT (ridefinita qui per non importare pandas)
+API_ROOT = "https://eodhd.com/api/"
+
+# Timeout (connessione, lettura) in secondi, come in EODHDClient
+TIMEOUT = (5, 30)
+
+PRICE_FIELDS = ('high', 'low', 'close', 'adjusted_close')
+
+# Errori nella lettura del corpo ritentati da '_get', come EODHDClient.BODY_ERRORS
+BODY_ERRORS = (requests.exceptions.ChunkedEncodingError, requests.exceptions.ContentDecodingError)
+
+
+def _session(max_retries: int = 5) -> requests.Session:
+    """Sessione con gli stessi tentativi su 429/5xx di EODHDClient."""
+    retry = Retry(total=max_retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=frozenset(['GET']), respect_retry_after_header=True)
+    session = requests.Session()
+    adapter = HTTPAdapter(max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _get(session: requests.Session, url: str, params: dict, max_retries: int = 5,
+         backoff_factor: float = 0.5, **span_attrs) -> requests.Response:
+    """GET con nuovi tentativi sulle risposte troncate, come EODHDClient._get."""
+    for attempt in range(max_retries + 1):
+        try:
+            with instrumentation.span('eodhd.request', **span_attrs) as span:
+                response = session.get(url, params=params, timeout=TIMEOUT)
+                span.set(status_code=response.status_code, bytes=len(response.content))
+        except BODY_ERRORS:
+            instrumentation.count('eodhd.body_retries')
+            if attempt == max_retries:
+                raise
+            time.sleep(backoff_factor * 2 ** attempt)
+            continue
+        instrumentation.count('eodhd.requests')
+        instrumentation.count('eodhd.bytes', len(response.content))
+        return response
+
+
+def _column(rows: list[dict], field: str) -> np.ndarray:
+    """Colonna numerica con la semantica di pd.to_numeric(errors='coerce'): valori non validi -> NaN."""
+    values = [row.get(field) for row in rows]
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        out = np.full(len(values), np.nan)
+        for i, value in enumerate(values):
+            try:
+                out[i] = float(value)
+            except (TypeError, ValueError):
+                pass
+        return out
+
+
+def fetch_bars(api_key: str, ticker: str, start_date: str, end_date: str,
+               api_root: str | None = None, session: requests.Session | None = None) -> dict | None:
+    """
+    Scarica le barre giornaliere tra start_date e end_date (incluse).
+
+    Args:
+        api_key (str): La tua chiave API per EODHD.
+        ticker (str): Il ticker da scaricare (es. 'BTC-USD.CC').
+        start_date (str): La data di inizio in formato 'YYYY-MM-DD'.
+        end_date (str): La data di fine in formato 'YYYY-MM-DD'.
+        api_root (str, optional): Radice alternativa dell'API (default: EODHD_API_ROOT o l'API reale).
+        session (requests.Session, optional): Sessione da riutilizzare.
+
+    Returns:
+        dict | None: 'dates' (lista di 'YYYY-MM-DD' crescenti e univoche) e gli array
+                     'high', 'low', 'close', 'adj_close'; None in caso di errore.
+    """
+    api_root = (api_root or os.environ.get('EODHD_API_ROOT') or API_ROOT).rstrip('/') + '/'
+    params = {"api_token": api_key, "from": start_date, "to": end_date, "period": "d", "fmt": "json"}
+    session = session or _session()
+    try:
+        response = _get(session, f"{api_root}eod/{ticker}", params, ticker=ticker, start=start_date, end=end_date)
+        response.raise_for_status()
+        rows = response.json()
+    except requests.exceptions.RequestException as e:
+        print(f"Errore durante la richiesta API: {e}")
+        return None
+    except ValueError as e:
+        print(f"Errore imprevisto nella gestione dei dati per {ticker}: {e}")
+        return None
+    if not isinstance(rows, list):
+        print(f"Nessun dato o formato inatteso per {ticker}.")
+        return None
+
+    # Ordine crescente e una sola barra per data (vince l'ultima), come la cache del percorso pandas
+    by_date = {str(row['date'])[:10]: row for row in rows if row.get('date')}
+    dates = sorted(by_date)
+    ordered = [by_date[d] for d in dates]
+    bars = {'dates': dates}
+    for field in PRICE_FIELDS:
+        bars['adj_close' if field == 'adjusted_close' else field] = _column(ordered, field)
+    instrumentation.count('eodhd.rows', len(dates))
+    print(f"Dati per {ticker} scaricati con successo: {len(dates)} righe.")
+    return bars
+
+
+def bars_until(bars: dict, last_date: str) -> dict:
+    """Barre con data fino a 'last_date' inclusa."""
+    keep = sum(1 for d in bars['dates'] if d <= last_date)
+    return {key: values[:keep] for key, values in bars.items()}
+
+
+def bars_from_frame(df) -> dict:
+    """Stesso formato di 'fetch_bars' a partire da un DataFrame di EODHDClient (percorso pandas)."""
+    return {'dates': list(df.index.strftime('%Y-%m-%d')),
+            **{c: df[c].to_numpy(dtype=np.float64) for c in ('high', 'low', 'close', 'adj_close')}}
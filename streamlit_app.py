@@ -9,9 +9,13 @@ from datetime import datetime, timedelta
 
 # Importa le classi dai nostri moduli di backend
 from data_handler import EODHDClient
-from indicator_calculator import IndicatorCalculator
+from feature_cache import CachedIndicatorCalculator
 from backtester import EventDrivenBacktester
 from performance_analyzer import PerformanceAnalyzer
+from hedge_engine import simulate_trades, TradeLedger, EXIT_STOP_LOSS, EXIT_SIGNAL
+from walk_forward import WalkForwardAnalyzer
+from results_store import ResultsStore, DEFAULT_STORE_PATH
+import chart_utils
 
 # --- Configurazione della Pagina Streamlit ---
 st.set_page_config(
@@ -25,95 +29,346 @@ OPTIMAL_PARAMS = {
     'fast_ma': 25, 'slow_ma': 40, 'adx_threshold': 15, 'adx_period': 14
 }
 
+# Cartella della cache locale dei prezzi (evita di riscaricare tutto lo storico a ogni click)
+DATA_CACHE_DIR = "data_cache"
+
+# Hedge ratio della frontiera: gli stessi valori dello slider (0-200%, passo 1%)
+FRONTIER_HEDGE_RATIOS = tuple(np.arange(0, 201) / 100)
+
+# Livelli dell'analisi di sensibilità: gli stessi valori dello slider dello Stop Loss (0-50%, passo 1%)
+STOP_LOSS_LEVELS = tuple(np.arange(0, 51) / 100)
+
+# Etichette dei motivi di uscita mostrate nella dashboard
+EXIT_REASON_LABELS = {EXIT_STOP_LOSS: "Stop Loss Scattato", EXIT_SIGNAL: "Segnale Terminato"}
+
 # ==============================================================================
-# FUNZIONE DI PLOTTING AGGIORNATA
+# PIPELINE CON CACHE
+# Ogni fase è memorizzata con chiave (ticker, date, parametri): spostando lo
+# slider dell'hedge o cambiando il capitale si ricalcolano solo le fasi a valle.
+# 'as_of' è la data odierna e fa scadere la cache al cambio di giorno.
 # ==============================================================================
-def plot_differentiated_signals_on_price(df: pd.DataFrame, ticker: str, stop_loss_perc: float = 0.05):
+@st.cache_resource
+def get_eodhd_client() -> EODHDClient:
+    """Client condiviso tra sessioni e rerun (pool di connessioni e rate limiter unici)."""
+    return EODHDClient(cache_dir=DATA_CACHE_DIR)
+
+@st.cache_resource
+def get_results_store() -> ResultsStore:
+    """Archivio persistente dei risultati: sopravvive ai rerun e ai riavvii dell'app."""
+    return ResultsStore(DEFAULT_STORE_PATH)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def load_data_fingerprint(ticker: str, start_date: str, as_of: str) -> str:
+    """Impronta dei prezzi della fase 1: chiave dei risultati nell'archivio."""
+    data_df = load_price_data(ticker, start_date, as_of)
+    fingerprint = ResultsStore.fingerprint(data_df)
+    get_results_store().register_dataset(fingerprint, data_df, ticker)
+    return fingerprint
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def load_price_data(ticker: str, start_date: str, as_of: str) -> pd.DataFrame:
+    """Fase 1: dati OHLCV scaricati (o letti dalla cache locale)."""
+    api_key = st.secrets["EODHD_API_KEY"]
+    data_df = get_eodhd_client().get_historical_data(api_key, ticker, start_date)
+    if data_df is None or data_df.empty:
+        # Solleviamo un'eccezione così il fallimento non viene memorizzato in cache
+        raise ValueError(f"Nessun dato disponibile per {ticker}.")
+    return data_df
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def load_indicator_data(ticker: str, start_date: str, as_of: str,
+                        fast_ma: int, slow_ma: int, adx_period: int) -> pd.DataFrame:
+    """Fase 2: prezzi con medie mobili e ADX, senza le righe di warm-up."""
+    data_df = load_price_data(ticker, start_date, as_of)
+    calc = CachedIndicatorCalculator()
+    data_df = calc.add_moving_average(data_df, period=fast_ma)
+    data_df = calc.add_moving_average(data_df, period=slow_ma)
+    data_df = calc.add_adx(data_df, period=adx_period)
+    data_df.dropna(inplace=True)
+    return data_df
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def load_signal(ticker: str, start_date: str, as_of: str, params: tuple) -> pd.Series:
+    """Segnale della strategia (non dipende dallo Stop Loss)."""
+    fast_ma, slow_ma, adx_period, adx_threshold = params
+    data_df = load_indicator_data(ticker, start_date, as_of, fast_ma, slow_ma, adx_period)
+    base_signal = np.where((data_df[f"sma_{fast_ma}"] < data_df[f"sma_{slow_ma}"]) &
+                           (data_df[f"ADX_{adx_period}"] > adx_threshold), -1, 0)
+    return pd.Series(base_signal, index=data_df.index)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def load_positions(ticker: str, start_date: str, as_of: str, params: tuple,
+                   stop_loss_perc: float) -> tuple[pd.Series, pd.Series]:
+    """Fase 3: segnale e posizioni (dipendono dallo Stop Loss, non da hedge ratio e capitale)."""
+    data_df = load_indicator_data(ticker, start_date, as_of, *params[:3])
+    signal = load_signal(ticker, start_date, as_of, params)
+    positions = EventDrivenBacktester().compute_positions(data_df, signal, stop_loss_perc)
+    return signal, positions
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def load_equity(ticker: str, start_date: str, as_of: str, params: tuple,
+                stop_loss_perc: float, hedge_ratio: float, capital: float) -> dict:
+    """Fase 4: curve di equity della strategia coperta e del Buy & Hold."""
+    data_df = load_indicator_data(ticker, start_date, as_of, *params[:3])
+    signal, positions = load_positions(ticker, start_date, as_of, params, stop_loss_perc)
+    return EventDrivenBacktester.compute_equity(data_df, signal, positions, capital, hedge_ratio)
+
+def _run_params(params: tuple, stop_loss_perc: float, hedge_ratio: float, capital: float) -> dict:
+    """Parametri di un'esecuzione della dashboard come chiave dell'archivio."""
+    return {'fast_ma': params[0], 'slow_ma': params[1], 'adx_period': params[2], 'adx_threshold': params[3],
+            'stop_loss_perc': stop_loss_perc, 'hedge_ratio': hedge_ratio, 'initial_capital': capital}
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def load_equity_curves(ticker: str, start_date: str, as_of: str, params: tuple,
+                       stop_loss_perc: float, hedge_ratio: float, capital: float) -> pd.DataFrame:
     """
-    Crea un grafico del prezzo con segnali di entrata e uscite differenziate.
-    Stop Loss default: 5%
+    Curve 'hedged' e 'long_only': lette dall'archivio se l'esecuzione è già
+    stata salvata con la sua equity, altrimenti ricalcolate (Fase 4).
     """
-    trades = []
-    in_position = False
-    entry_price = 0.0
-    entry_date = None
-    
-    # Variabili per tracciare l'ultima posizione se rimane aperta
-    last_open_entry_date = None
-    last_open_entry_price = None
+    store = get_results_store()
+    fingerprint = load_data_fingerprint(ticker, start_date, as_of)
+    run_id = store.run_id(fingerprint, _run_params(params, stop_loss_perc, hedge_ratio, capital), source='dashboard')
+    equity = store.equity(run_id) if run_id is not None else None
+    if equity is None:
+        results = load_equity(ticker, start_date, as_of, params, stop_loss_perc, hedge_ratio, capital)
+        equity = pd.DataFrame({'hedged': results['hedged'], 'long_only': results['long_only']})
+    return equity
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def load_kpis(ticker: str, start_date: str, as_of: str, params: tuple,
+              stop_loss_perc: float, hedge_ratio: float, capital: float) -> tuple[dict, dict]:
+    """
+    Fase 5: KPI della strategia coperta e del benchmark. Se la stessa esecuzione
+    è già nell'archivio i KPI e la curva del Buy & Hold vengono letti da lì, senza
+    ricalcolare il backtest; altrimenti sono calcolati e salvati insieme all'equity.
+    """
+    store = get_results_store()
+    fingerprint = load_data_fingerprint(ticker, start_date, as_of)
+    run_params = _run_params(params, stop_loss_perc, hedge_ratio, capital)
+    kpis_hedged = store.get(fingerprint, run_params, source='dashboard')
+    if kpis_hedged is None:
+        results = load_equity(ticker, start_date, as_of, params, stop_loss_perc, hedge_ratio, capital)
+        analyzer_hedged = PerformanceAnalyzer(results['hedged'], results['signal'], hedge_only_returns=results['hedge_only_returns'])
+        kpis_hedged = analyzer_hedged.calculate_kpis()
+        equity = pd.DataFrame({'hedged': results['hedged'], 'long_only': results['long_only']})
+        store.put(fingerprint, run_params, kpis_hedged, equity=equity, source='dashboard')
+    else:
+        equity = load_equity_curves(ticker, start_date, as_of, params, stop_loss_perc, hedge_ratio, capital)
+
+    positions_bh = pd.Series(1, index=equity['long_only'].index)
+    analyzer_bh = PerformanceAnalyzer(equity['long_only'], positions_bh)
+    kpis_bh = analyzer_bh.calculate_kpis()
+    return kpis_hedged, kpis_bh
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def build_equity_figure(ticker: str, start_date: str, as_of: str, params: tuple,
+                        stop_loss_perc: float, hedge_ratio: float, capital: float,
+                        x_range: tuple | None = None) -> go.Figure:
+    """
+    Grafico delle curve di equity, ricostruito solo quando cambiano i suoi input.
+    Le curve sono ricampionate sulla finestra 'x_range' (None = tutto lo storico).
+    """
+    equity = load_equity_curves(ticker, start_date, as_of, params, stop_loss_perc, hedge_ratio, capital)
+    fig = go.Figure()
+    fig.add_trace(chart_utils.line_trace(equity.index, equity['hedged'], 'Hedged', x_range=x_range))
+    fig.add_trace(chart_utils.line_trace(equity.index, equity['long_only'], 'Buy & Hold', x_range=x_range))
+    return chart_utils.apply_range(fig, x_range, selectable=True)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def load_hedge_frontier(ticker: str, start_date: str, as_of: str, params: tuple,
+                        stop_loss_perc: float, capital: float) -> pd.DataFrame:
+    """
+    KPI di tutti gli hedge ratio dello slider, calcolati insieme a partire dalle
+    posizioni della Fase 3: spostando lo slider non si ricalcola nulla.
+    """
+    data_df = load_indicator_data(ticker, start_date, as_of, *params[:3])
+    _, positions = load_positions(ticker, start_date, as_of, params, stop_loss_perc)
+    frontier = EventDrivenBacktester.compute_equity_frontier(data_df, positions, capital, FRONTIER_HEDGE_RATIOS)
+    return PerformanceAnalyzer.frontier_kpis(frontier)
 
-    # Nomi colonne per evitare errori
+@st.cache_data(show_spinner=False, max_entries=32)
+def load_stop_loss_sensitivity(ticker: str, start_date: str, as_of: str, params: tuple,
+                               hedge_ratio: float, capital: float) -> pd.DataFrame:
+    """
+    KPI di tutti i livelli dello slider dello Stop Loss: le macchine a stati
+    avanzano insieme in un solo passaggio sui prezzi.
+    """
+    data_df = load_indicator_data(ticker, start_date, as_of, *params[:3])
+    signal = load_signal(ticker, start_date, as_of, params)
+    sweep = EventDrivenBacktester().run_stop_loss_sweep(data_df, signal, capital, hedge_ratio, STOP_LOSS_LEVELS)
+    return PerformanceAnalyzer.batch_kpis(sweep['hedged'], sweep['positions'], sweep['hedge_only_returns'])
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def build_stop_loss_figure(ticker: str, start_date: str, as_of: str, params: tuple,
+                           stop_loss_perc: float, hedge_ratio: float, capital: float) -> go.Figure:
+    """Sharpe Ratio e Max Drawdown in funzione dello Stop Loss, con il valore selezionato evidenziato."""
+    kpis = load_stop_loss_sensitivity(ticker, start_date, as_of, params, hedge_ratio, capital)
+    levels = kpis.index.to_numpy() * 100
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=levels, y=kpis['Sharpe Ratio'], mode='lines', name='Sharpe Ratio'))
+    fig.add_trace(go.Scatter(x=levels, y=kpis['Max Drawdown'] * 100, mode='lines', name='Max Drawdown %',
+                             yaxis='y2', line=dict(color='firebrick')))
+    fig.add_vline(x=stop_loss_perc * 100, line=dict(color='grey', dash='dash'),
+                  annotation_text=f"Stop Loss {stop_loss_perc:.0%}")
+    fig.update_layout(xaxis_title="Stop Loss %", yaxis=dict(title="Sharpe Ratio"),
+                      yaxis2=dict(title="Max Drawdown %", overlaying='y', side='right'),
+                      legend=dict(orientation='h', y=1.12))
+    return fig
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def build_frontier_figure(ticker: str, start_date: str, as_of: str, params: tuple,
+                          stop_loss_perc: float, hedge_ratio: float, capital: float) -> go.Figure:
+    """Sharpe Ratio e Max Drawdown in funzione dell'hedge ratio, con il valore selezionato evidenziato."""
+    kpis = load_hedge_frontier(ticker, start_date, as_of, params, stop_loss_perc, capital)
+    ratios = kpis.index.to_numpy() * 100
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=ratios, y=kpis['Sharpe Ratio'], mode='lines', name='Sharpe Ratio'))
+    fig.add_trace(go.Scatter(x=ratios, y=kpis['Max Drawdown'] * 100, mode='lines', name='Max Drawdown %',
+                             yaxis='y2', line=dict(color='firebrick')))
+    fig.add_vline(x=hedge_ratio * 100, line=dict(color='grey', dash='dash'),
+                  annotation_text=f"Hedge {hedge_ratio:.0%}")
+    fig.update_layout(xaxis_title="Hedge %", yaxis=dict(title="Sharpe Ratio"),
+                      yaxis2=dict(title="Max Drawdown %", overlaying='y', side='right'),
+                      legend=dict(orientation='h', y=1.12))
+    return fig
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def load_live_signal(ticker: str, start_date: str, as_of: str, stop_loss_perc: float) -> tuple[pd.DataFrame, TradeLedger]:
+    """Dati recenti con indicatori e registro dei trade per la scheda del segnale attuale."""
+    data_df = load_indicator_data(ticker, start_date, as_of, OPTIMAL_PARAMS['fast_ma'],
+                                  OPTIMAL_PARAMS['slow_ma'], OPTIMAL_PARAMS['adx_period'])
+    return data_df, simulate_hedge_ledger(data_df, stop_loss_perc)
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def build_live_figures(ticker: str, start_date: str, as_of: str, stop_loss_perc: float) -> tuple[go.Figure, go.Figure, go.Figure]:
+    """Grafici della scheda del segnale attuale (segnali, medie mobili, ADX) sull'ultimo anno."""
+    data_df, ledger = load_live_signal(ticker, start_date, as_of, stop_loss_perc)
     col_fast = f"sma_{OPTIMAL_PARAMS['fast_ma']}"
     col_slow = f"sma_{OPTIMAL_PARAMS['slow_ma']}"
     col_adx = f"ADX_{OPTIMAL_PARAMS['adx_period']}"
+    data_last_year = data_df[data_df.index > data_df.index[-1] - pd.Timedelta(days=365)]
 
-    signal_condition = (df[col_fast] < df[col_slow]) & \
-                       (df[col_adx] > OPTIMAL_PARAMS['adx_threshold'])
-
-    for i in range(len(df)):
-        current_date = df.index[i]
-        current_price = df['adj_close'].iloc[i]
-
-        # Logica di ENTRATA
-        if signal_condition.iloc[i] and not in_position:
-            in_position = True
-            entry_price = current_price
-            entry_date = current_date
-            last_open_entry_date = current_date
-            last_open_entry_price = current_price
-
-        # Logica di USCITA
-        elif in_position:
-            # 1. STOP LOSS
-            if current_price > entry_price * (1 + stop_loss_perc):
-                trades.append({
-                    'entry_date': entry_date, 'exit_date': current_date,
-                    'entry_price': entry_price, 'exit_price': current_price,
-                    'exit_reason': 'Stop Loss'
-                })
-                in_position = False
-                last_open_entry_date = None
-            
-            # 2. FINE SEGNALE
-            elif not signal_condition.iloc[i]:
-                trades.append({
-                    'entry_date': entry_date, 'exit_date': current_date,
-                    'entry_price': entry_price, 'exit_price': current_price,
-                    'exit_reason': 'Segnale'
-                })
-                in_position = False
-                last_open_entry_date = None
-
-    trades_df = pd.DataFrame(trades)
+    # Il grafico dei segnali riusa il registro già calcolato, limitato all'ultimo anno
+    fig_signals = plot_differentiated_signals_on_price(data_df, ticker, stop_loss_perc=stop_loss_perc,
+                                                       ledger=ledger, last_days=365)
+
+    fig_price = go.Figure()
+    fig_price.add_trace(chart_utils.line_trace(data_last_year.index, data_last_year['adj_close'], 'Prezzo', line=dict(color='black', width=2)))
+    fig_price.add_trace(chart_utils.line_trace(data_last_year.index, data_last_year[col_fast], f"SMA({OPTIMAL_PARAMS['fast_ma']})"))
+    fig_price.add_trace(chart_utils.line_trace(data_last_year.index, data_last_year[col_slow], f"SMA({OPTIMAL_PARAMS['slow_ma']})"))
+
+    fig_adx = go.Figure()
+    fig_adx.add_trace(chart_utils.line_trace(data_last_year.index, data_last_year[col_adx], 'ADX'))
+    fig_adx.add_shape(type="line", x0=data_last_year.index[0], y0=OPTIMAL_PARAMS['adx_threshold'], x1=data_last_year.index[-1], y1=OPTIMAL_PARAMS['adx_threshold'], line=dict(color="Red", dash="dash"))
+    return fig_signals, fig_price, fig_adx
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def load_walk_forward(ticker: str, start_date: str, as_of: str, train_bars: int, test_bars: int,
+                      anchored: bool, rank_by: str, capital: float) -> dict | None:
+    """Analisi walk-forward (ottimizzazione per fold in parallelo) sui dati della fase 1."""
+    data_df = load_price_data(ticker, start_date, as_of)
+    analyzer = WalkForwardAnalyzer(data_df, train_bars=train_bars, test_bars=test_bars,
+                                   anchored=anchored, initial_capital=capital)
+    return analyzer.run(rank_by=rank_by)
+
+def kpi_table(kpis: dict, percent_keys=('Max Drawdown', 'Short-Only MaxDD')) -> pd.DataFrame:
+    """Tabella dei KPI già formattata come testo (una sola colonna di stringhe, compatibile con Arrow)."""
+    formatted = {}
+    for name, value in kpis.items():
+        if name in percent_keys:
+            formatted[name] = f"{value:.2%}"
+        elif isinstance(value, (int, np.integer)):
+            formatted[name] = f"{value:d}"
+        else:
+            formatted[name] = f"{value:,.2f}"
+    return pd.DataFrame.from_dict(formatted, orient='index', columns=['Valore'])
+
+# ==============================================================================
+# FUNZIONE DI PLOTTING AGGIORNATA
+# ==============================================================================
+def simulate_hedge_ledger(df: pd.DataFrame, stop_loss_perc: float = 0.05) -> TradeLedger:
+    """
+    Esegue una sola volta la simulazione entrata/Stop Loss/fine segnale sui
+    parametri ottimali e restituisce il registro dei trade e lo stato aperto.
+    """
+    col_fast = f"sma_{OPTIMAL_PARAMS['fast_ma']}"
+    col_slow = f"sma_{OPTIMAL_PARAMS['slow_ma']}"
+    col_adx = f"ADX_{OPTIMAL_PARAMS['adx_period']}"
+
+    signal_condition = ((df[col_fast] < df[col_slow]) &
+                        (df[col_adx] > OPTIMAL_PARAMS['adx_threshold'])).to_numpy()
+    return simulate_trades(df['adj_close'].to_numpy(), signal_condition, ~signal_condition, stop_loss_perc)
+
+def plot_differentiated_signals_on_price(df: pd.DataFrame, ticker: str, stop_loss_perc: float = 0.05,
+                                         ledger: TradeLedger | None = None, last_days: int | None = None,
+                                         x_range: tuple | None = None):
+    """
+    Crea un grafico del prezzo con segnali di entrata e uscite differenziate.
+    Stop Loss default: 5%
+
+    Se 'ledger' è fornito (calcolato su tutto 'df') i trade vengono letti dal
+    registro invece di rieseguire la simulazione; 'last_days' limita il grafico
+    agli ultimi N giorni. Il prezzo è ricampionato sulla finestra 'x_range'
+    passando sempre per le barre dei trade; i marker dei trade restano esatti.
+    """
+    if ledger is None:
+        ledger = simulate_hedge_ledger(df, stop_loss_perc)
+
+    trades = ledger.trades
+    trades_df = pd.DataFrame({
+        'entry_date': df.index[trades['entry_idx']], 'exit_date': df.index[trades['exit_idx']],
+        'entry_price': trades['entry_price'], 'exit_price': trades['exit_price'],
+        'exit_reason': np.where(trades['exit_reason'] == EXIT_STOP_LOSS, 'Stop Loss', 'Segnale')
+    })
+
+    # Trade aperto (se presente)
+    in_position = ledger.in_position
+    last_open_entry_date = df.index[ledger.entry_idx] if in_position else None
+    last_open_entry_price = ledger.entry_price if in_position else None
+
+    # Finestra visualizzata: stessa semantica di DataFrame.last('ND')
+    if last_days is not None and not df.empty:
+        cutoff = df.index[-1] - pd.Timedelta(days=last_days)
+        df = df[df.index > cutoff]
+        entries_df = trades_df[trades_df['entry_date'] > cutoff]
+        exits_df = trades_df[trades_df['exit_date'] > cutoff]
+    else:
+        entries_df = exits_df = trades_df
     
     # --- CREAZIONE GRAFICO ---
+    # Con molte barre l'intero grafico passa a WebGL: i marker restano sopra la linea
+    webgl = chart_utils.use_webgl(len(df))
+    trade_dates = [entries_df['entry_date'], exits_df['exit_date']]
+    if in_position:
+        trade_dates.append(pd.Series([last_open_entry_date]))
+    trade_bars = df.index.get_indexer(pd.concat(trade_dates))
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=df.index, y=df['adj_close'], mode='lines', name=f'Prezzo {ticker}', line=dict(color='lightgrey', width=1.5)))
+    fig.add_trace(chart_utils.line_trace(df.index, df['adj_close'], f'Prezzo {ticker}', x_range=x_range,
+                                         keep=trade_bars, webgl=webgl, line=dict(color='lightgrey', width=1.5)))
 
     # 1. Disegna Trade CHIUSI
-    if not trades_df.empty:
-        fig.add_trace(go.Scatter(
-            x=trades_df['entry_date'], y=trades_df['entry_price'], mode='markers', 
-            name='Entrata (Chiusa)', marker=dict(color='red', symbol='triangle-down', size=8, opacity=0.6)
+    if not entries_df.empty or not exits_df.empty:
+        fig.add_trace(chart_utils.marker_trace(
+            entries_df['entry_date'], entries_df['entry_price'], 'Entrata (Chiusa)', webgl=webgl,
+            marker=dict(color='red', symbol='triangle-down', size=8, opacity=0.6)
         ))
         
-        signal_exits = trades_df[trades_df['exit_reason'] == 'Segnale']
-        fig.add_trace(go.Scatter(
-            x=signal_exits['exit_date'], y=signal_exits['exit_price'], mode='markers', 
-            name='Uscita (Segnale)', marker=dict(color='lime', symbol='triangle-up', size=10)
+        signal_exits = exits_df[exits_df['exit_reason'] == 'Segnale']
+        fig.add_trace(chart_utils.marker_trace(
+            signal_exits['exit_date'], signal_exits['exit_price'], 'Uscita (Segnale)', webgl=webgl,
+            marker=dict(color='lime', symbol='triangle-up', size=10)
         ))
 
-        stop_loss_exits = trades_df[trades_df['exit_reason'] == 'Stop Loss']
-        fig.add_trace(go.Scatter(
-            x=stop_loss_exits['exit_date'], y=stop_loss_exits['exit_price'], mode='markers', 
-            name='Uscita (Stop Loss)', marker=dict(color='purple', symbol='x', size=10)
+        stop_loss_exits = exits_df[exits_df['exit_reason'] == 'Stop Loss']
+        fig.add_trace(chart_utils.marker_trace(
+            stop_loss_exits['exit_date'], stop_loss_exits['exit_price'], 'Uscita (Stop Loss)', webgl=webgl,
+            marker=dict(color='purple', symbol='x', size=10)
         ))
 
     # 2. Disegna Trade APERTO
     if in_position and last_open_entry_date is not None:
-        fig.add_trace(go.Scatter(
-            x=[last_open_entry_date], y=[last_open_entry_price], mode='markers',
-            name='ENTRATA CORRENTE (APERTA)', 
+        fig.add_trace(chart_utils.marker_trace(
+            [last_open_entry_date], [last_open_entry_price], 'ENTRATA CORRENTE (APERTA)', webgl=webgl,
             marker=dict(color='red', symbol='triangle-down', size=14, line=dict(width=2, color='white'))
         ))
         fig.add_annotation(
@@ -122,7 +377,33 @@ def plot_differentiated_signals_on_price(df: pd.DataFrame, ticker: str, stop_los
         )
 
     fig.update_layout(title='Prezzo e Segnali di Copertura (1 Anno)', legend_title='Legenda', template='plotly_dark')
-    return fig
+    return chart_utils.apply_range(fig, x_range)
+
+def show_zoomable_chart(build_figure, key: str):
+    """
+    Mostra un grafico ricampionato sulla finestra scelta dall'utente: trascinando
+    in orizzontale si seleziona una finestra, il grafico viene ricostruito con
+    tutta la risoluzione disponibile su quella finestra.
+
+    Args:
+        build_figure: Funzione x_range -> go.Figure (x_range None = tutto lo storico).
+        key (str): Chiave del grafico nella sessione.
+    """
+    range_key, seen_key = f"{key}_range", f"{key}_selection"
+    x_range = st.session_state.get(range_key)
+    event = st.plotly_chart(build_figure(x_range), use_container_width=True, key=key,
+                            on_select="rerun", selection_mode="box")
+    # Una selezione già applicata (o annullata con "Vista completa") non viene riapplicata
+    selected = chart_utils.range_from_selection(event)
+    if selected is not None and selected != st.session_state.get(seen_key):
+        st.session_state[seen_key] = selected
+        st.session_state[range_key] = selected
+        st.rerun()
+    if x_range is not None:
+        st.caption(f"Finestra: {x_range[0][:10]} → {x_range[1][:10]}. Trascina sul grafico per cambiarla.")
+        if st.button("Vista completa", key=f"{key}_reset"):
+            st.session_state.pop(range_key)
+            st.rerun()
 
 # ==============================================================================
 # FUNZIONI TAB
@@ -136,49 +417,18 @@ def render_live_signal_tab(ticker: str, run_signal: bool):
 
     with st.spinner("Recupero e analisi dati recenti..."):
         try:
-            api_key = st.secrets["EODHD_API_KEY"]
-            client = EODHDClient()
             live_start_date = (datetime.now() - timedelta(days=500)).strftime('%Y-%m-%d')
-            data_df = client.get_historical_data(api_key, ticker, live_start_date)
+            as_of = datetime.now().strftime('%Y-%m-%d')
+            stop_loss_perc = 0.05 # <--- AGGIORNATO A 5%
+            # Un'unica simulazione su tutto lo storico: stato attuale e grafici leggono lo stesso registro
+            data_df, ledger = load_live_signal(ticker, live_start_date, as_of, stop_loss_perc)
+            fig_signals, fig_price, fig_adx = build_live_figures(ticker, live_start_date, as_of, stop_loss_perc)
         except Exception as e:
             st.error(f"Errore nel recupero dei dati: {e}"); data_df = None
         
         if data_df is not None and not data_df.empty:
-            calc = IndicatorCalculator()
-            data_df = calc.add_moving_average(data_df, period=OPTIMAL_PARAMS['fast_ma'])
-            data_df = calc.add_moving_average(data_df, period=OPTIMAL_PARAMS['slow_ma'])
-            data_df = calc.add_adx(data_df, period=OPTIMAL_PARAMS['adx_period'])
-            data_df.dropna(inplace=True)
-            
-            # --- LOGICA SIMULAZIONE STATO ---
-            col_fast = f"sma_{OPTIMAL_PARAMS['fast_ma']}"
-            col_slow = f"sma_{OPTIMAL_PARAMS['slow_ma']}"
-            col_adx = f"ADX_{OPTIMAL_PARAMS['adx_period']}"
-
-            in_position = False
-            entry_price = 0.0
-            stop_loss_perc = 0.05 # <--- AGGIORNATO A 5%
-            exit_reason = ""
-
-            signal_condition_series = (data_df[col_fast] < data_df[col_slow]) & \
-                                      (data_df[col_adx] > OPTIMAL_PARAMS['adx_threshold'])
-
-            for i in range(len(data_df)):
-                current_price = data_df['adj_close'].iloc[i]
-                is_signal = signal_condition_series.iloc[i]
-
-                if is_signal and not in_position:
-                    in_position = True
-                    entry_price = current_price
-                    exit_reason = "" 
-                
-                elif in_position:
-                    if current_price > entry_price * (1 + stop_loss_perc):
-                        in_position = False
-                        exit_reason = "Stop Loss Scattato"
-                    elif not is_signal:
-                        in_position = False
-                        exit_reason = "Segnale Terminato"
+            in_position = ledger.in_position
+            exit_reason = EXIT_REASON_LABELS.get(ledger.last_exit_reason, "")
             
             # --- VISUALIZZAZIONE TESTO ---
             if in_position: 
@@ -192,25 +442,14 @@ def render_live_signal_tab(ticker: str, run_signal: bool):
             st.markdown("---")
             
             # --- VISUALIZZAZIONE GRAFICO ---
-            data_last_year = data_df.last('365D')
             st.subheader("Grafico Prezzo e Segnali di Copertura (1 Anno)")
-            
-            # Qui chiamiamo la funzione che usa il default 0.05
-            fig_signals = plot_differentiated_signals_on_price(data_last_year, ticker, stop_loss_perc=stop_loss_perc)
             st.plotly_chart(fig_signals, use_container_width=True)
             
             # Grafici ausiliari
             st.subheader("Grafico Prezzo e Medie Mobili (1 Anno)")
-            fig_price = go.Figure()
-            fig_price.add_trace(go.Scatter(x=data_last_year.index, y=data_last_year['adj_close'], mode='lines', name='Prezzo', line=dict(color='black', width=2)))
-            fig_price.add_trace(go.Scatter(x=data_last_year.index, y=data_last_year[col_fast], mode='lines', name=f"SMA({OPTIMAL_PARAMS['fast_ma']})"))
-            fig_price.add_trace(go.Scatter(x=data_last_year.index, y=data_last_year[col_slow], mode='lines', name=f"SMA({OPTIMAL_PARAMS['slow_ma']})"))
             st.plotly_chart(fig_price, use_container_width=True)
             
             st.subheader("Grafico ADX (1 Anno)")
-            fig_adx = go.Figure()
-            fig_adx.add_trace(go.Scatter(x=data_last_year.index, y=data_last_year[col_adx], mode='lines', name='ADX'))
-            fig_adx.add_shape(type="line", x0=data_last_year.index[0], y0=OPTIMAL_PARAMS['adx_threshold'], x1=data_last_year.index[-1], y1=OPTIMAL_PARAMS['adx_threshold'], line=dict(color="Red", dash="dash"))
             st.plotly_chart(fig_adx, use_container_width=True)
         else:
             st.warning("Non è stato possibile recuperare i dati recenti.")
@@ -222,60 +461,113 @@ def render_historical_backtest_tab(ticker, start_date, capital, hedge_ratio, sl_
         return
         
     with st.spinner("Esecuzione backtest..."):
+        # Chiave della cache: cambiando solo hedge ratio o capitale, dati, indicatori e posizioni vengono riusati
+        key = (ticker, start_date.strftime('%Y-%m-%d'), datetime.now().strftime('%Y-%m-%d'),
+               (OPTIMAL_PARAMS['fast_ma'], OPTIMAL_PARAMS['slow_ma'], OPTIMAL_PARAMS['adx_period'], OPTIMAL_PARAMS['adx_threshold']),
+               sl_perc, hedge_ratio, float(capital))
         try:
-            api_key = st.secrets["EODHD_API_KEY"]
-            client = EODHDClient()
-            data_df = client.get_historical_data(api_key, ticker, start_date.strftime('%Y-%m-%d'))
+            kpis_hedged, kpis_bh = load_kpis(*key)
         except Exception as e:
-            st.error(f"Errore dati: {e}"); data_df = None
-
-        if data_df is not None and not data_df.empty:
-            calc = IndicatorCalculator()
-            data_df = calc.add_moving_average(data_df, period=OPTIMAL_PARAMS['fast_ma'])
-            data_df = calc.add_moving_average(data_df, period=OPTIMAL_PARAMS['slow_ma'])
-            data_df = calc.add_adx(data_df, period=OPTIMAL_PARAMS['adx_period'])
-            data_df.dropna(inplace=True)
-            
-            col_fast = f"sma_{OPTIMAL_PARAMS['fast_ma']}"
-            col_slow = f"sma_{OPTIMAL_PARAMS['slow_ma']}"
-            col_adx = f"ADX_{OPTIMAL_PARAMS['adx_period']}"
+            st.error(f"Errore dati: {e}"); kpis_hedged = None
 
-            base_signal = np.where((data_df[col_fast] < data_df[col_slow]) & (data_df[col_adx] > OPTIMAL_PARAMS['adx_threshold']), -1, 0)
-            backtester = EventDrivenBacktester()
-            results = backtester.run_backtest(data_df, pd.Series(base_signal, index=data_df.index), capital, hedge_ratio, sl_perc)
-            
-            analyzer_hedged = PerformanceAnalyzer(results['hedged'], results['signal'], hedge_only_returns=results['hedge_only_returns'])
-            kpis_hedged = analyzer_hedged.calculate_kpis()
-            
-            positions_bh = pd.Series(1, index=results['long_only'].index)
-            analyzer_bh = PerformanceAnalyzer(results['long_only'], positions_bh)
-            kpis_bh = analyzer_bh.calculate_kpis()
-            
+        if kpis_hedged is not None:
             st.success("Backtest completato!")
-            
-            fig = go.Figure()
-            fig.add_trace(go.Scatter(x=results['hedged'].index, y=results['hedged'], mode='lines', name='Hedged'))
-            fig.add_trace(go.Scatter(x=results['long_only'].index, y=results['long_only'], mode='lines', name='Buy & Hold'))
-            st.plotly_chart(fig, use_container_width=True)
+            show_zoomable_chart(lambda x_range: build_equity_figure(*key, x_range=x_range), 'equity_chart')
             
             col1, col2 = st.columns(2)
             with col1:
                 st.markdown("##### Strategia Coperta")
-                kpi_df_hedged = pd.DataFrame.from_dict(kpis_hedged, orient='index', columns=['Valore'])
-                for col in ['Max Drawdown', 'Short-Only MaxDD']:
-                     if col in kpi_df_hedged.index:
-                        kpi_df_hedged.loc[col] = kpi_df_hedged.loc[col].apply(lambda x: f"{x:.2%}" if isinstance(x, (int, float)) else x)
-                st.table(kpi_df_hedged)
+                st.table(kpi_table(kpis_hedged))
             with col2:
                 st.markdown("##### Benchmark")
+                kpis_bh = dict(kpis_bh)
                 kpis_bh.pop('Short-Only MaxDD', None)
-                kpi_df_bh = pd.DataFrame.from_dict(kpis_bh, orient='index', columns=['Valore'])
-                if 'Max Drawdown' in kpi_df_bh.index:
-                     kpi_df_bh.loc['Max Drawdown'] = f"{kpi_df_bh.loc['Max Drawdown'].values[0]:.2%}"
-                st.table(kpi_df_bh)
+                st.table(kpi_table(kpis_bh))
+
+            col1, col2 = st.columns(2)
+            with col1:
+                st.markdown("##### Frontiera Hedge Ratio")
+                st.plotly_chart(build_frontier_figure(*key), use_container_width=True)
+            with col2:
+                st.markdown("##### Sensibilità Stop Loss")
+                st.plotly_chart(build_stop_loss_figure(*key), use_container_width=True)
         else:
             st.warning("Dati non disponibili.")
 
+def render_walk_forward_tab(ticker, start_date, capital, train_bars, test_bars, anchored, rank_by, run_analysis):
+    st.subheader("Analisi Walk-Forward (Fuori Campione)")
+    if not run_analysis:
+        st.info("Imposta le finestre nella sidebar e premi 'Esegui Walk-Forward'.")
+        return
+
+    with st.spinner("Ottimizzazione dei fold in corso..."):
+        try:
+            results = load_walk_forward(ticker, start_date.strftime('%Y-%m-%d'), datetime.now().strftime('%Y-%m-%d'),
+                                        train_bars, test_bars, anchored, rank_by, float(capital))
+        except Exception as e:
+            st.error(f"Errore dati: {e}"); results = None
+
+    if results is None or results['equity'].empty:
+        st.warning("Storico insufficiente per le finestre scelte.")
+        return
+
+    equity = results['equity']
+
+    def build_figure(x_range):
+        fig = go.Figure()
+        fig.add_trace(chart_utils.line_trace(equity.index, equity['hedged'], 'Hedged (OOS)', x_range=x_range))
+        fig.add_trace(chart_utils.line_trace(equity.index, equity['long_only'], 'Buy & Hold', x_range=x_range))
+        return chart_utils.apply_range(fig, x_range, selectable=True)
+    show_zoomable_chart(build_figure, 'walk_forward_chart')
+
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        st.markdown("##### KPI Fuori Campione")
+        st.table(kpi_table(results['kpis']))
+    with col2:
+        st.markdown("##### Parametri per Fold")
+        st.dataframe(results['folds'], use_container_width=True, hide_index=True)
+
+def render_results_store_tab(source: str, rank_by: str, max_stop_loss: float, top_n: int, heatmap_agg: str):
+    st.subheader("Archivio dei Risultati")
+    store = get_results_store()
+    datasets = store.datasets()
+    if datasets.empty:
+        st.info("L'archivio è vuoto: esegui un backtest o l'ottimizzatore (python optimizer.py).")
+        return
+
+    labels = {row.fingerprint: f"{row.ticker or 'n/d'} {row.start_date or ''} → {row.end_date or ''} ({row.runs} esecuzioni)"
+              for row in datasets.itertuples()}
+    fingerprint = st.selectbox("Serie di prezzi", list(labels), format_func=labels.get)
+    filters = {'stop_loss_perc': ('<=', max_stop_loss)}
+    if source != "Tutte":
+        filters['source'] = source
+
+    top = store.top(rank_by, top_n, fingerprint, filters)
+    st.markdown(f"##### Top {top_n} per {rank_by} (Stop Loss ≤ {max_stop_loss:.0%})")
+    if top.empty:
+        st.warning("Nessuna esecuzione soddisfa i filtri.")
+        return
+    st.dataframe(top, use_container_width=True, hide_index=True)
+
+    st.markdown(f"##### Heatmap fast_ma × slow_ma ({heatmap_agg} di {rank_by})")
+    grid = store.heatmap('fast_ma', 'slow_ma', rank_by, heatmap_agg, fingerprint, filters)
+    # I valori infiniti (nessun drawdown) renderebbero illeggibile la scala dei colori
+    grid = grid.replace([np.inf, -np.inf], np.nan)
+    fig = go.Figure(go.Heatmap(z=grid.to_numpy(), x=grid.columns.astype(str), y=grid.index.astype(str),
+                               colorscale='RdYlGn', colorbar=dict(title=rank_by)))
+    fig.update_layout(xaxis_title='fast_ma', yaxis_title='slow_ma', template='plotly_dark')
+    st.plotly_chart(fig, use_container_width=True)
+
+    # Curva di equity delle esecuzioni salvate dalla dashboard
+    run_id = st.selectbox("Curva di equity dell'esecuzione", top['run_id'].tolist())
+    equity = store.equity(int(run_id))
+    if equity is None:
+        st.caption("Curva di equity non salvata per questa esecuzione (solo KPI).")
+    else:
+        fig = go.Figure([chart_utils.line_trace(equity.index, equity[c], c) for c in equity.columns])
+        st.plotly_chart(fig, use_container_width=True)
+
 def render_methodology_tab():
     st.header("Metodologia")
     st.markdown("Questa app implementa una strategia di hedging su Bitcoin.")
@@ -286,12 +578,15 @@ def render_methodology_tab():
 # ==============================================================================
 st.title("🛡️ Kriterion Quant Hedging Backtester")
 st.sidebar.title("Navigazione")
-active_tab = st.sidebar.radio("Sezione:", ["Segnale Attuale", "Backtest Storico", "Metodologia"])
+active_tab = st.sidebar.radio("Sezione:", ["Segnale Attuale", "Backtest Storico", "Walk-Forward", "Archivio Risultati", "Metodologia"])
 
 if active_tab == "Segnale Attuale":
     st.sidebar.subheader("Controlli")
     ticker = st.sidebar.text_input("Ticker", "BTC-USD.CC")
+    # Dopo il primo click la scheda resta visibile nei rerun successivi (servita dalla cache)
     if st.sidebar.button("Aggiorna Segnale"):
+        st.session_state['live_signal_active'] = True
+    if st.session_state.get('live_signal_active', False):
         render_live_signal_tab(ticker, True)
 
 elif active_tab == "Backtest Storico":
@@ -303,8 +598,35 @@ elif active_tab == "Backtest Storico":
     
     # MODIFICATO IL DEFAULT DELLO SLIDER A 5
     sl = st.sidebar.slider("Stop Loss %", 0, 50, 5) / 100.0 # <--- DEFAULT 5%
+    # Dopo il primo click i risultati seguono i controlli: si ricalcolano solo le fasi invalidate
     if st.sidebar.button("Esegui Backtest", type="primary"):
+        st.session_state['backtest_active'] = True
+    if st.session_state.get('backtest_active', False):
         render_historical_backtest_tab(ticker, start_dt, cap, hedge, sl, True)
 
+elif active_tab == "Walk-Forward":
+    st.sidebar.subheader("Controlli")
+    ticker = st.sidebar.text_input("Ticker", "BTC-USD.CC", key="wf_tick")
+    start_dt = st.sidebar.date_input("Inizio", pd.to_datetime("2017-01-01"), key="wf_start")
+    cap = st.sidebar.number_input("Capitale", value=50000, key="wf_cap")
+    train_bars = st.sidebar.slider("Training (giorni)", 180, 1460, 730, step=30)
+    test_bars = st.sidebar.slider("Test (giorni)", 30, 365, 180, step=15)
+    anchored = st.sidebar.checkbox("Training ancorato", value=False)
+    rank_by = st.sidebar.selectbox("Ottimizza per", ["Return on MaxDD", "Sharpe Ratio", "Profit Factor"])
+    if st.sidebar.button("Esegui Walk-Forward", type="primary"):
+        st.session_state['walk_forward_active'] = True
+    render_walk_forward_tab(ticker, start_dt, cap, train_bars, test_bars, anchored, rank_by,
+                            st.session_state.get('walk_forward_active', False))
+
+elif active_tab == "Archivio Risultati":
+    st.sidebar.subheader("Filtri")
+    source = st.sidebar.selectbox("Origine", ["Tutte", "optimizer", "dashboard"])
+    rank_by = st.sidebar.selectbox("Classifica per", ["Return on MaxDD", "Sharpe Ratio", "Net Profit", "Profit Factor",
+                                                      "Max Drawdown"], key="store_rank")
+    max_sl = st.sidebar.slider("Stop Loss massimo %", 0, 50, 10, key="store_sl") / 100.0
+    top_n = st.sidebar.number_input("Numero di risultati", min_value=5, max_value=500, value=20, step=5)
+    heatmap_agg = st.sidebar.selectbox("Heatmap", ["max", "avg", "min", "count"])
+    render_results_store_tab(source, rank_by, max_sl, int(top_n), heatmap_agg)
+
 elif active_tab == "Metodologia":
     render_methodology_tab()
@@ -0,0 +1,219 @@
+# File: walk_forward.py
+# Modulo per il progetto KriterionQuant Hedging App
+
+import argparse
+import configparser
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from backtester import EventDrivenBacktester
+from performance_analyzer import PerformanceAnalyzer
+from optimizer import (ParameterOptimizer, evaluate_combinations, shared_features,
+                       _attach_worker, _rank_value, _WORKER)
+
+# Griglia ridotta attorno ai parametri in produzione: viene rieseguita su ogni fold
+WALK_FORWARD_GRID = {
+    'fast_ma': [15, 20, 25, 30],
+    'slow_ma': [40, 50, 60],
+    'adx_period': [14],
+    'adx_threshold': [10, 15, 20, 25],
+    'stop_loss_perc': [0.05, 0.10],
+    'hedge_ratio': [1.0]
+}
+
+
+def _optimize_fold(train: pd.DataFrame, tasks: list[tuple], rank_by: str,
+                   initial_capital: float) -> dict | None:
+    """Valuta l'intera griglia sul periodo di training e restituisce la combinazione migliore."""
+    best, best_value = None, -np.inf
+    for fast_ma, slow_ma, adx_period, combos in tasks:
+        for result in evaluate_combinations(train, fast_ma, slow_ma, adx_period, combos, initial_capital):
+            value = _rank_value(result, rank_by)
+            if best is None or value > best_value:
+                best, best_value = result, value
+    return best
+
+
+def _backtest_params(df: pd.DataFrame, params: dict, initial_capital: float) -> dict:
+    """Backtest di una singola combinazione su un periodo, con gli indicatori già presenti in 'df'."""
+    col_fast = f"sma_{params['fast_ma']}"
+    col_slow = f"sma_{params['slow_ma']}"
+    col_adx = f"ADX_{params['adx_period']}"
+    signal = pd.Series(np.where((df[col_fast] < df[col_slow]) & (df[col_adx] > params['adx_threshold']), -1, 0),
+                       index=df.index)
+    return EventDrivenBacktester().run_backtest(df, signal, initial_capital, params['hedge_ratio'],
+                                                params['stop_loss_perc'])
+
+
+def _run_fold(fold: tuple, tasks: list[tuple], rank_by: str) -> dict:
+    """
+    Esegue un fold nel processo worker: ottimizzazione sul training e backtest
+    fuori campione sul test, entrambi letti dalla matrice delle feature condivisa.
+    """
+    train_start, train_end, test_end = fold
+    data = _WORKER['data']
+    initial_capital = _WORKER['initial_capital']
+    train = data.iloc[train_start:train_end]
+    # Il test include l'ultima barra di training: la decisione presa al suo Close
+    # (con i nuovi parametri) determina la posizione della prima barra fuori campione
+    test = data.iloc[train_end - 1:test_end]
+
+    best = _optimize_fold(train, tasks, rank_by, initial_capital)
+    if best is None:
+        return {'fold': fold, 'params': None}
+    params = {key: best[key] for key in ('fast_ma', 'slow_ma', 'adx_period', 'adx_threshold',
+                                         'stop_loss_perc', 'hedge_ratio')}
+    bt = _backtest_params(test, params, initial_capital)
+    return {'fold': fold, 'params': params, 'in_sample': best.get(rank_by, np.nan), 'backtest': bt}
+
+
+class WalkForwardAnalyzer:
+    """
+    Analisi walk-forward della strategia di hedging.
+
+    Per ogni fold i parametri vengono ottimizzati sulla finestra di training
+    e applicati alla finestra di test successiva; le equity fuori campione
+    vengono poi concatenate in un'unica curva. Gli indicatori di tutta la
+    griglia sono calcolati una sola volta sull'intero storico (sono causali,
+    quindi ogni finestra ne legge una fetta) e i fold girano in parallelo.
+    """
+    def __init__(self, data: pd.DataFrame, train_bars: int = 730, test_bars: int = 180,
+                 anchored: bool = False, initial_capital: float = 50000,
+                 max_workers: int | None = None):
+        """
+        Args:
+            data (pd.DataFrame): Dati OHLCV come restituiti da EODHDClient.
+            train_bars (int): Lunghezza della finestra di training (barre).
+            test_bars (int): Lunghezza della finestra di test (barre); è anche il passo tra i fold.
+            anchored (bool): Se True il training parte sempre dall'inizio dello storico.
+            initial_capital (float): Capitale iniziale della curva fuori campione.
+            max_workers (int, optional): Numero di processi (default: numero di core).
+        """
+        self.optimizer = ParameterOptimizer(data, initial_capital=initial_capital, max_workers=max_workers)
+        self.train_bars = train_bars
+        self.test_bars = test_bars
+        self.anchored = anchored
+        self.initial_capital = initial_capital
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    def build_folds(self, n_bars: int) -> list[tuple]:
+        """Fold come tuple di posizioni (inizio training, fine training = inizio test, fine test)."""
+        folds = []
+        train_end = self.train_bars
+        while train_end < n_bars:
+            train_start = 0 if self.anchored else train_end - self.train_bars
+            folds.append((train_start, train_end, min(train_end + self.test_bars, n_bars)))
+            train_end += self.test_bars
+        return folds
+
+    def run(self, grid: dict = None, rank_by: str = 'Return on MaxDD') -> dict | None:
+        """
+        Esegue l'analisi walk-forward.
+
+        Args:
+            grid (dict, optional): Griglia dei parametri (default: WALK_FORWARD_GRID).
+            rank_by (str): KPI massimizzato sul training di ogni fold.
+
+        Returns:
+            dict: 'folds' (DataFrame con periodi, parametri scelti e KPI di ogni fold),
+                  'equity' (DataFrame con le curve 'hedged' e 'long_only' fuori campione),
+                  'kpis' (KPI della curva fuori campione concatenata).
+                  None se lo storico non basta per almeno un fold.
+        """
+        grid = grid or WALK_FORWARD_GRID
+        # Eliminiamo il warm-up degli indicatori più lenti: tutti i fold partono da dati completi
+        features = self.optimizer.build_features(grid).dropna()
+        folds = self.build_folds(len(features))
+        if not folds:
+            print("Storico insufficiente per il walk-forward con le finestre richieste.")
+            return None
+        tasks = ParameterOptimizer.build_tasks(grid)
+
+        with shared_features(features, self.initial_capital) as init_args:
+            with ProcessPoolExecutor(max_workers=min(self.max_workers, len(folds)),
+                                     initializer=_attach_worker, initargs=init_args) as executor:
+                outcomes = list(executor.map(_run_fold, folds, [tasks] * len(folds),
+                                             [rank_by] * len(folds)))
+
+        return self._stitch(features.index, outcomes, rank_by)
+
+    def _stitch(self, index: pd.DatetimeIndex, outcomes: list[dict], rank_by: str) -> dict:
+        """Concatena i rendimenti fuori campione dei fold in un'unica curva di equity."""
+        rows, returns_hedged, returns_bh, signals, hedge_returns = [], [], [], [], []
+        for number, outcome in enumerate(outcomes, start=1):
+            train_start, train_end, test_end = outcome['fold']
+            row = {'Fold': number, 'Train Start': index[train_start].date(),
+                   'Train End': index[train_end - 1].date(), 'Test Start': index[train_end].date(),
+                   'Test End': index[test_end - 1].date()}
+            if outcome['params'] is None:
+                rows.append(row)
+                continue
+            bt = outcome['backtest']
+            # Ogni fold riparte dal capitale iniziale: concateniamo i rendimenti, non i livelli.
+            # La prima barra è l'ultima del training e serve solo da punto di partenza.
+            returns_hedged.append(bt['hedged'].pct_change().iloc[1:])
+            returns_bh.append(bt['long_only'].pct_change().iloc[1:])
+            signals.append(bt['positions'].iloc[1:])
+            hedge_returns.append(bt['hedge_only_returns'].iloc[1:])
+            row.update(outcome['params'])
+            row[f'In-Sample {rank_by}'] = outcome['in_sample']
+            row['OOS Return'] = bt['hedged'].iloc[-1] / bt['hedged'].iloc[0] - 1
+            row['OOS B&H Return'] = bt['long_only'].iloc[-1] / bt['long_only'].iloc[0] - 1
+            rows.append(row)
+
+        if not returns_hedged:
+            return {'folds': pd.DataFrame(rows), 'equity': pd.DataFrame(), 'kpis': {}}
+
+        equity = pd.DataFrame({
+            'hedged': (1 + pd.concat(returns_hedged)).cumprod() * self.initial_capital,
+            'long_only': (1 + pd.concat(returns_bh)).cumprod() * self.initial_capital
+        })
+        kpis = PerformanceAnalyzer(equity['hedged'], pd.concat(signals),
+                                   hedge_only_returns=pd.concat(hedge_returns)).calculate_kpis()
+        return {'folds': pd.DataFrame(rows), 'equity': equity, 'kpis': kpis}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analisi walk-forward della strategia di hedging.")
+    parser.add_argument('--ticker', default='BTC-USD.CC')
+    parser.add_argument('--start', default='2017-01-01', help="Data di inizio (YYYY-MM-DD)")
+    parser.add_argument('--capital', type=float, default=50000)
+    parser.add_argument('--train', type=int, default=730, help="Barre della finestra di training")
+    parser.add_argument('--test', type=int, default=180, help="Barre della finestra di test")
+    parser.add_argument('--anchored', action='store_true', help="Training ancorato all'inizio dello storico")
+    parser.add_argument('--rank-by', default='Return on MaxDD')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default=None, help="File CSV in cui salvare la curva fuori campione")
+    args = parser.parse_args()
+
+    from data_handler import EODHDClient
+
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    api_key = config.get('EODHD', 'api_key')
+
+    data_df = EODHDClient(cache_dir='data_cache').get_historical_data(api_key, args.ticker, args.start)
+    if data_df is None or data_df.empty:
+        print(f"Dati non disponibili per {args.ticker}.")
+        return
+
+    analyzer = WalkForwardAnalyzer(data_df, train_bars=args.train, test_bars=args.test,
+                                   anchored=args.anchored, initial_capital=args.capital,
+                                   max_workers=args.workers)
+    results = analyzer.run(rank_by=args.rank_by)
+    if results is None:
+        return
+    print(results['folds'].to_string(index=False))
+    print("\nKPI fuori campione:")
+    for name, value in results['kpis'].items():
+        print(f"  {name}: {value}")
+    if args.output:
+        results['equity'].to_csv(args.output)
+        print(f"Curva fuori campione salvata in {args.output}")
+
+
+if __name__ == '__main__':
+    main()